@@ -0,0 +1,292 @@
+"""
+Benchmark suite for the renamer on reproducible synthetic trees.
+
+Times the naming rules, a dry run (plan_tree), an apply run (rename_tree,
+planned up front and streamed) and merge_dirs, and writes entries/sec, peak
+memory and syscall counts to a JSON file. Compare two result files (e.g. from two commits) with --compare.
+
+    python benchmarks/bench_renamer.py --files 50000 --out before.json
+    python benchmarks/bench_renamer.py --files 50000 --out after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import file_renamer
+import rename_rules
+from synthetic import SyscallCounter, make_tree, name_corpus
+
+
+def quiet(msg):
+    pass
+
+
+def _measure(setup, run, with_memory: bool):
+    """
+    Call run(setup()) once for time and syscalls, then (with_memory) once more
+    on a fresh setup under tracemalloc for peak memory. run returns the
+    number of entries it processed.
+    """
+    arg = setup()
+    with SyscallCounter() as counter:
+        start = time.perf_counter()
+        entries = run(arg)
+        seconds = time.perf_counter() - start
+    result = {
+        "entries": entries,
+        "seconds": round(seconds, 6),
+        "entries_per_sec": round(entries / seconds, 1) if seconds > 0 else None,
+        "syscalls": dict(counter.counts),
+        "syscalls_total": counter.total,
+    }
+    if with_memory:
+        arg = setup()
+        tracemalloc.start()
+        run(arg)
+        result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+_LEGACY_SUFFIX_RE = r"\s+\(\d+\)$"
+
+
+def legacy_folder_name_rule(name: str) -> str:
+    """The hard-coded folder rule from before the rule engine, kept as the throughput baseline."""
+    if not name:
+        return name
+    name = re.sub(_LEGACY_SUFFIX_RE, "", name)
+    match = re.match(r"^(\d+\.)\s+(.*)", name)
+    if match:
+        return match.group(1) + match.group(2).upper()
+    return name.upper()
+
+
+def legacy_file_name_rule(name: str) -> str:
+    """The hard-coded file rule from before the rule engine, kept as the throughput baseline."""
+    if not name:
+        return name
+    p = Path(name)
+    stem, suffix = p.stem, p.suffix
+    if not stem:
+        return name
+    return re.sub(_LEGACY_SUFFIX_RE, "", stem).lower().title() + suffix
+
+
+def bench_rules(args, scratch: Path):
+    """The active (compiled, cached) rules next to the old hard-coded functions on the same corpus."""
+    corpus = name_corpus(args.rule_names, seed=args.seed, suffix_fraction=args.suffix_fraction)
+
+    def run(arg):
+        rule, names = arg
+        for name in names:
+            rule(name)
+        return len(names)
+
+    results = {}
+    for kind, legacy in (("file", legacy_file_name_rule), ("folder", legacy_folder_name_rule)):
+        # Compiled afresh for every measurement, so each run starts with a cold cache
+        def compiled(kind=kind):
+            return getattr(rename_rules.compile_rules(file_renamer.active_rules().ruleset), kind), corpus
+
+        results[f"{kind}_name_rule"] = _measure(compiled, run, args.memory)
+        results[f"{kind}_name_rule_legacy"] = _measure(lambda legacy=legacy: (legacy, corpus), run, args.memory)
+    return results
+
+
+def _tree_setup(args, scratch: Path, name: str):
+    counter = [0]
+
+    def setup():
+        counter[0] += 1
+        root = scratch / f"{name}_{counter[0]}"
+        make_tree(root, args.files, args.depth, args.fanout, args.suffix_fraction, args.collision_fraction, args.seed)
+        return root
+
+    return setup
+
+
+def bench_dry_run(args, scratch: Path):
+    def run(root):
+        plan = file_renamer.plan_tree(root, log_callback=quiet, log_level=file_renamer.LOG_SUMMARY)
+        return plan.visited_dirs + plan.visited_files
+
+    return _measure(_tree_setup(args, scratch, "dry"), run, args.memory)
+
+
+# Documented budget for a retained plan (see README): bytes per planned operation
+PLAN_BYTES_PER_OP_TARGET = 400
+
+
+def bench_plan_memory(args, scratch: Path):
+    """Memory held by a finished plan (not the peak while walking), per operation and per entry."""
+    root = _tree_setup(args, scratch, "plan_memory")()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    plan = file_renamer.plan_tree(root, log_callback=quiet, log_level=file_renamer.LOG_SUMMARY)
+    seconds = time.perf_counter() - start
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    entries = plan.visited_dirs + plan.visited_files
+    operations = plan.operation_count
+    per_op = retained / operations if operations else 0.0
+    return {
+        "entries": entries,
+        "operations": operations,
+        "seconds": round(seconds, 6),
+        "entries_per_sec": round(entries / seconds, 1) if seconds > 0 else None,
+        "syscalls": {},
+        "syscalls_total": 0,
+        "retained_bytes": retained,
+        "bytes_per_entry": round(retained / entries, 1) if entries else 0.0,
+        "bytes_per_operation": round(per_op, 1),
+        "bytes_per_operation_target": PLAN_BYTES_PER_OP_TARGET,
+        "within_target": per_op <= PLAN_BYTES_PER_OP_TARGET,
+    }
+
+
+def bench_apply(args, scratch: Path):
+    def run(root):
+        stats = file_renamer.rename_tree(root, dry_run=False, log_callback=quiet, log_level=file_renamer.LOG_SUMMARY,
+                                         workers=args.workers)
+        return stats.plan.visited_dirs + stats.plan.visited_files
+
+    return _measure(_tree_setup(args, scratch, "apply"), run, args.memory)
+
+
+def bench_apply_stream(args, scratch: Path):
+    def run(root):
+        stats = file_renamer.rename_tree(root, dry_run=False, log_callback=quiet, log_level=file_renamer.LOG_SUMMARY,
+                                         workers=args.workers, stream=True)
+        return stats.plan.visited_dirs + stats.plan.visited_files
+
+    return _measure(_tree_setup(args, scratch, "stream"), run, args.memory)
+
+
+def bench_merge(args, scratch: Path):
+    counter = [0]
+
+    def setup():
+        # Same folder skeleton, different files: a realistic "PHOTOS" + "Photos (1)"
+        # merge where every folder collides but most files don't
+        counter[0] += 1
+        dst = scratch / f"merge_{counter[0]}" / "dst"
+        src = scratch / f"merge_{counter[0]}" / "src"
+        make_tree(dst, args.files // 2, args.depth, args.fanout, 0.0, 0.0, args.seed)
+        entries = make_tree(src, args.files // 2, args.depth, args.fanout, 0.0, 0.0, args.seed,
+                            file_seed=args.seed + 1)
+        return src, dst, entries
+
+    def run(arg):
+        src, dst, entries = arg
+        file_renamer.merge_dirs(src, dst, dry_run=False, log_callback=quiet, log_level=file_renamer.LOG_SUMMARY)
+        return entries
+
+    return _measure(setup, run, args.memory)
+
+
+BENCHMARKS = {
+    "rules": bench_rules,
+    "dry_run": bench_dry_run,
+    "plan_memory": bench_plan_memory,
+    "apply": bench_apply,
+    "apply_stream": bench_apply_stream,
+    "merge": bench_merge,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(results: dict, prefix: str = ""):
+    """Yield (name, metrics) for every leaf benchmark result."""
+    for name, value in results.items():
+        if "entries" in value:
+            yield prefix + name, value
+        else:
+            yield from _flatten(value, prefix + name + ".")
+
+
+def compare(old: dict, new: dict):
+    old_results = dict(_flatten(old["results"]))
+    print(f"\nCompared with {old.get('commit') or 'baseline'}:")
+    print(f"{'benchmark':<28}{'entries/s old':>15}{'entries/s new':>15}{'change':>9}{'syscalls old':>14}{'syscalls new':>14}")
+    for name, metrics in _flatten(new["results"]):
+        before = old_results.get(name)
+        if before is None or not before.get("entries_per_sec") or not metrics.get("entries_per_sec"):
+            continue
+        change = (metrics["entries_per_sec"] / before["entries_per_sec"] - 1) * 100
+        print(f"{name:<28}{before['entries_per_sec']:>15,.0f}{metrics['entries_per_sec']:>15,.0f}{change:>+8.1f}%"
+              f"{before['syscalls_total']:>14,}{metrics['syscalls_total']:>14,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10000, help="Files per synthetic tree")
+    parser.add_argument("--depth", type=int, default=3, help="Folder levels")
+    parser.add_argument("--fanout", type=int, default=5, help="Subfolders per folder")
+    parser.add_argument("--suffix-fraction", type=float, default=0.1, help="Share of names with a ' (n)' suffix")
+    parser.add_argument("--collision-fraction", type=float, default=0.05,
+                        help="Share of files with a sibling that normalizes to the same name")
+    parser.add_argument("--rule-names", type=int, default=200000, help="Names fed to the rule benchmarks")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="workers for the apply benchmark")
+    parser.add_argument("--only", choices=list(BENCHMARKS), action="append", help="Run only these benchmarks")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="Skip the extra tracemalloc pass that measures peak memory")
+    parser.add_argument("--dir", default=None, help="Scratch directory (default: system temp)")
+    parser.add_argument("--out", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", metavar="OLD.json", help="Print a comparison against an earlier result file")
+    args = parser.parse_args()
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "only", "dir")},
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for name in args.only or BENCHMARKS:
+            print(f"Running {name}...", flush=True)
+            report["results"][name] = BENCHMARKS[name](args, Path(tmp))
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for name, metrics in _flatten(report["results"]):
+        memory = metrics.get("peak_memory_bytes")
+        memory_text = f", peak {memory / 1e6:.1f} MB" if memory is not None else ""
+        if "bytes_per_operation" in metrics:
+            memory_text += (f", plan {metrics['bytes_per_operation']:,.0f} B/op "
+                            f"(target {metrics['bytes_per_operation_target']}: "
+                            f"{'ok' if metrics['within_target'] else 'OVER'})")
+        print(f"{name:<28}{metrics['entries_per_sec'] or 0:>12,.0f} entries/s, "
+              f"{metrics['syscalls_total']:,} syscalls{memory_text}")
+    print(f"Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compare the two rename paths of apply_plan() on the filesystem holding --dir:
+the classic src -> __tmp__ -> final hop, and the single rename used when the
+probed filesystem doesn't need the hop.
+
+    python benchmarks/bench_temp_hop.py --files 20000 --dir /mnt/share/scratch
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import file_renamer
+from fs_probe import capabilities_for
+from synthetic import SyscallCounter
+
+
+def make_files(root: Path, count: int):
+    # Mix of suffix removals, case changes and a few collisions
+    for i in range(count):
+        if i % 10 == 0:
+            name = f"report {i // 10} (1).PDF"
+        elif i % 10 == 1:
+            name = f"Report {i // 10}.PDF"
+        else:
+            name = f"photo_{i}.jpg"
+        (root / name).write_bytes(b"")
+
+
+def run(base: Path, count: int, always_temp: bool):
+    with tempfile.TemporaryDirectory(dir=base) as tmp:
+        root = Path(tmp)
+        make_files(root, count)
+        plan = file_renamer.plan_tree(root, log_callback=lambda m: None, log_level=file_renamer.LOG_SUMMARY)
+        with SyscallCounter() as counter:
+            start = time.perf_counter()
+            stats = file_renamer.apply_plan(plan, log_callback=lambda m: None, log_level=file_renamer.LOG_SUMMARY,
+                                            always_temp=always_temp)
+            elapsed = time.perf_counter() - start
+    rename_calls = counter.counts["rename"] + counter.counts["replace"]
+    return {"renames": stats.actions, "rename_syscalls": rename_calls, "seconds": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--dir", default=tempfile.gettempdir(), help="Scratch directory on the filesystem to test")
+    args = parser.parse_args()
+
+    base = Path(args.dir)
+    print(f"Filesystem at {base}: {capabilities_for(base)}")
+    for label, always_temp in (("temp hop", True), ("probed", False)):
+        result = run(base, args.files, always_temp)
+        print(f"{label:>9}: {result['renames']} renames, {result['rename_syscalls']} rename syscalls, "
+              f"{result['seconds']:.3f} s ({result['renames'] / max(result['seconds'], 1e-9):,.0f} renames/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Helpers shared by the benchmarks: reproducible synthetic trees and a
+counter for filesystem syscalls made through the os module.
+"""
+import os
+import random
+from collections import Counter
+from pathlib import Path
+from typing import List
+
+WORDS = ["report", "photo", "invoice", "scan", "holiday", "budget", "draft", "final", "meeting", "notes",
+         "contract", "summary", "image", "backup", "letter", "plan", "minutes", "offer", "slide", "data"]
+EXTENSIONS = [".pdf", ".PDF", ".jpg", ".JPG", ".docx", ".xlsx", ".txt", ".png", ".mp3", ".zip"]
+
+# os functions the renamer reaches (directly, via pathlib, os.path or shutil)
+COUNTED_SYSCALLS = ("stat", "lstat", "scandir", "rename", "replace", "unlink", "rmdir", "mkdir")
+
+
+def _random_case(rng: random.Random, text: str) -> str:
+    style = rng.random()
+    if style < 0.3:
+        return text.upper()
+    if style < 0.6:
+        return text.lower()
+    return "".join(c.upper() if rng.random() < 0.5 else c for c in text)
+
+
+def random_name(rng: random.Random, suffix_fraction: float, folder: bool = False) -> str:
+    stem = " ".join(_random_case(rng, rng.choice(WORDS)) for _ in range(rng.randint(1, 3)))
+    stem += f" {rng.randint(1, 9999)}"
+    if rng.random() < suffix_fraction:
+        stem += f" ({rng.randint(1, 5)})"
+    return stem if folder else stem + rng.choice(EXTENSIONS)
+
+
+def name_corpus(count: int, seed: int = 1, suffix_fraction: float = 0.1) -> List[str]:
+    """Reproducible list of file-like names (with repeats, like real shares)."""
+    rng = random.Random(seed)
+    unique = [random_name(rng, suffix_fraction) for _ in range(max(1, count // 10))]
+    unique += ["Thumbs.db", "desktop.ini", ".DS_Store"]
+    return [rng.choice(unique) for _ in range(count)]
+
+
+def make_tree(root: Path, files: int = 10000, depth: int = 3, fanout: int = 5, suffix_fraction: float = 0.1,
+              collision_fraction: float = 0.05, seed: int = 1, file_seed: int = None) -> int:
+    """
+    Create a reproducible tree under root and return the number of entries.
+
+    depth levels of folders with fanout subfolders each; files are spread
+    randomly over all folders. suffix_fraction of names get a ' (n)' suffix,
+    collision_fraction of files get a sibling that normalizes to the same
+    target (different case and/or a ' (n)' suffix). file_seed (default: seed)
+    varies the files while keeping the same folder skeleton.
+    """
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+
+    dirs = [root]
+    level = [root]
+    for _ in range(depth):
+        next_level = []
+        for parent in level:
+            names = set()
+            while len(names) < fanout:
+                names.add(random_name(rng, suffix_fraction, folder=True))
+            for name in sorted(names):
+                path = parent / name
+                path.mkdir()
+                next_level.append(path)
+        dirs.extend(next_level)
+        level = next_level
+
+    entries = len(dirs) - 1
+    if file_seed is not None:
+        rng = random.Random(file_seed)
+    created = 0
+    while created < files:
+        parent = rng.choice(dirs)
+        name = random_name(rng, suffix_fraction)
+        path = parent / name
+        if path.exists():
+            continue
+        path.write_bytes(b"x" * rng.randint(0, 64))
+        created += 1
+        if created < files and rng.random() < collision_fraction:
+            stem, ext = os.path.splitext(name)
+            twin = parent / f"{_random_case(rng, stem)} ({rng.randint(1, 5)}){ext}"
+            if not twin.exists():
+                twin.write_bytes(b"y")
+                created += 1
+    return entries + created
+
+
+class SyscallCounter:
+    """Counts calls to COUNTED_SYSCALLS on the os module while active (not thread-aware)."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self._saved = {}
+
+    def __enter__(self):
+        for name in COUNTED_SYSCALLS:
+            original = getattr(os, name)
+            self._saved[name] = original
+
+            def counted(*args, _name=name, _original=original, **kwargs):
+                self.counts[_name] += 1
+                return _original(*args, **kwargs)
+
+            setattr(os, name, counted)
+        return self
+
+    def __exit__(self, *exc):
+        for name, original in self._saved.items():
+            setattr(os, name, original)
+        self._saved.clear()
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import sqlite3
+import stat
+import threading
+from pathlib import Path
+from typing import Optional
+
+# Files are hashed in chunks of this size, never read whole
+HASH_CHUNK = 1 << 20
+
+# Hash cache rows written before the next commit
+COMMIT_EVERY = 256
+
+
+def hash_file(path, chunk_size: int = HASH_CHUNK) -> str:
+    """blake2b digest of a file, read chunk by chunk."""
+    digest = hashlib.blake2b()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+class HashCache:
+    """
+    On-disk digests keyed by file path, size and mtime. A file whose size and
+    mtime are unchanged is not read again; any change makes the row stale and
+    it is replaced on the next lookup.
+
+    Shared by the apply threads of a run (one connection behind a lock).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes "
+            "(path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, digest TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def lookup(self, path: str, size: int, mtime_ns: int) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, digest FROM hashes WHERE path = ?", (path,)).fetchone()
+            if row is None or row[0] != size or row[1] != mtime_ns:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[2]
+
+    def store(self, path: str, size: int, mtime_ns: int, digest: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO hashes (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+                               (path, size, mtime_ns, digest))
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._conn.commit()
+                self._pending = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+class ContentDedupe:
+    """
+    Decides whether a file about to overwrite another one is a redundant copy
+    of it: same size first (no reads), then the same chunked hash.
+
+    Without cache_path digests are only kept for the run. With it they are
+    kept in a HashCache, opened lazily so the object can be handed to the
+    processes of a multi-root run (each opens its own connection).
+    """
+
+    def __init__(self, cache_path: Optional[Path] = None):
+        self.cache_path = Path(cache_path) if cache_path is not None else None
+        self._cache: Optional[HashCache] = None
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"cache_path": self.cache_path}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _digest(self, path: Path, st: os.stat_result, stats) -> str:
+        key = (os.fspath(path), st.st_size, st.st_mtime_ns)
+        if self.cache_path is None:
+            digest = self._memory.get(key)
+        else:
+            with self._lock:
+                if self._cache is None:
+                    self._cache = HashCache(self.cache_path)
+            digest = self._cache.lookup(*key)
+        if digest is None:
+            digest = hash_file(path)
+            stats.bytes_hashed += st.st_size
+            if self.cache_path is None:
+                self._memory[key] = digest
+            else:
+                self._cache.store(*key, digest)
+        return digest
+
+    def identical(self, src: Path, dst: Path, stats) -> bool:
+        """
+        Whether regular files src and dst hold the same bytes. Links, other
+        file types, unreadable files and two names of the same file are never
+        identical. Hashed bytes are counted in stats.bytes_hashed.
+        """
+        try:
+            src_st = os.stat(src, follow_symlinks=False)
+            dst_st = os.stat(dst, follow_symlinks=False)
+            if not (stat.S_ISREG(src_st.st_mode) and stat.S_ISREG(dst_st.st_mode)):
+                return False
+            if src_st.st_size != dst_st.st_size or os.path.samestat(src_st, dst_st):
+                return False
+            if self._digest(dst, dst_st, stats) != self._digest(src, src_st, stats):
+                return False
+            # Changed while being hashed: don't trust the digests
+            return (os.stat(src, follow_symlinks=False).st_mtime_ns == src_st.st_mtime_ns
+                    and os.stat(dst, follow_symlinks=False).st_mtime_ns == dst_st.st_mtime_ns)
+        except OSError:
+            return False
+
+    def summary(self) -> str:
+        if self._cache is None:
+            return ""
+        return f"Hash cache: {self._cache.hits} hits, {self._cache.misses} misses"
+
+    def close(self):
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
@@ -1,260 +1,2384 @@
 import argparse
+import errno
+import heapq
+import itertools
+import json
+import multiprocessing
 import os
 import re
 import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
 import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, fields
 from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
 
+from content_dedupe import ContentDedupe
+from fs_probe import FsCapabilities, capabilities_for, case_sensitivity
+from path_filter import PathFilter, parse_filters
+from progress import ProgressTracker
+from run_control import STOP_CANCELLED, Cancelled, RunControl
+from rename_index import RenameIndex
+from rename_journal import RenameJournal, find_tmp_entries, load_journal, original_name
+from rename_rules import DEFAULT_RULES, CompiledRules, RuleSet, compile_rules, parse_rules, read_config
 
 
 # ---------------------------
 # Logging helper
 # ---------------------------
 
+LOG_SUMMARY = 0   # header, errors and final counters only
+LOG_CHANGES = 1   # plus one line per change
+LOG_VERBOSE = 2   # every folder, every checked entry, every rename step
+
+LOG_LEVELS = {"summary": LOG_SUMMARY, "changes": LOG_CHANGES, "verbose": LOG_VERBOSE}
+
+
 def default_logger(msg: str):
     print(msg)
 
 
+def format_change(action: str, kind: str, src: Path, dst_name: str) -> str:
+    """Compact one-line description of a change, used at LOG_CHANGES."""
+    return f"{action:<9} {kind:<6} {src} -> {dst_name}"
+
+
 # ---------------------------
 # Naming rules
 # ---------------------------
 
+_SUFFIX_RE = re.compile(r"\s+\(\d+\)$")
+
+# Active naming rules for this process, compiled once (see rename_rules.py and set_rules())
+_rules: CompiledRules = compile_rules(DEFAULT_RULES)
+
+
+def set_rules(ruleset: Optional[RuleSet] = None) -> CompiledRules:
+    """Compile ruleset (the default rules when None) and make it the active naming rules."""
+    global _rules
+    _rules = compile_rules(ruleset)
+    return _rules
+
+
+def active_rules() -> CompiledRules:
+    return _rules
+
+
 def clean_number_suffix(text: str) -> str:
     """Remove trailing ' (number)' from a string."""
-    return re.sub(r"\s+\(\d+\)$", "", text)
+    return _SUFFIX_RE.sub("", text)
 
 
 def folder_name_rule(name: str) -> str:
-    """Folders: remove trailing (number), then ALL CAPS."""
-    if not name:
-        return name
-    
-    name = clean_number_suffix(name)
-    
-    # Check for "Number. Space Rest" (e.g. "2. foldername")
-    match = re.match(r"^(\d+\.)\s+(.*)", name)
-    if match:
-        return match.group(1) + match.group(2).upper()
-
-    return name.upper()
+    """
+    Folders (default rules): remove trailing (number), then ALL CAPS,
+    keeping a "2. " style prefix as written.
+    """
+    return _rules.folder(name)
 
 
 def file_name_rule(name: str) -> str:
     """
-    Files:
+    Files (default rules):
     1) remove trailing ' (number)' from stem (before extension)
-    2) lowercase stem
-    3) uppercase only the first character of stem
-    4) keep extension exactly as-is
+    2) title-case the stem
+    3) keep extension exactly as-is
     """
-    if not name:
-        return name
+    return _rules.file(name)
+
+
+def rules_fingerprint() -> str:
+    """Hash of the active rule settings; changes whenever the rules are edited."""
+    return _rules.fingerprint
+
+
+# ---------------------------
+# Run counters
+# ---------------------------
+
+SLOWEST_DIRS_KEPT = 10
+
+
+class LatencyHistogram:
+    """Power-of-two histogram of operation latencies (bucket k holds < 2**k microseconds)."""
+
+    __slots__ = ("buckets", "count", "total")
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds: float):
+        bucket = int(seconds * 1_000_000).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+
+    def add(self, other: "LatencyHistogram"):
+        for bucket, n in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + n
+        self.count += other.count
+        self.total += other.total
 
-    p = Path(name)
-    stem = p.stem
-    suffix = p.suffix  # preserve extension casing
+    def percentile(self, p: float) -> float:
+        """Upper bound (seconds) of the bucket holding the p-th percentile."""
+        if not self.count:
+            return 0.0
+        wanted = p / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= wanted:
+                return (1 << bucket) / 1_000_000
+        return (1 << max(self.buckets)) / 1_000_000
 
-    if not stem:
-        return name
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_s": self.total / self.count if self.count else 0.0,
+            "p50_s": self.percentile(50),
+            "p99_s": self.percentile(99),
+            # "<N us": count
+            "buckets": {f"<{1 << b}us": self.buckets[b] for b in sorted(self.buckets)},
+        }
 
-    stem = clean_number_suffix(stem)
-    stem = stem.lower()
-    stem = stem.title()
 
-    return stem + suffix
+def _merge_slowest(a: List[tuple], b: List[tuple]) -> List[tuple]:
+    """The SLOWEST_DIRS_KEPT slowest of two note_slow() heaps, as a heap again."""
+    merged = heapq.nlargest(SLOWEST_DIRS_KEPT, a + b)
+    heapq.heapify(merged)
+    return merged
+
+
+@dataclass
+class RunStats:
+    """
+    Counters and timings of a run. Partial stats (per batch, per thread) are
+    combined with add(). rename_tree() returns the total, with the plan it
+    used attached as .plan.
+
+    Phase times are exclusive: listing is directory listing only, planning
+    is rule evaluation, renaming excludes merges and (in sequential runs)
+    log output, logging is time spent handing lines to the log callback.
+    With workers > 1 renaming and merging are summed over threads.
+    """
+    actions: int = 0
+    entries_scanned: int = 0
+    renames: int = 0
+    overwrites: int = 0
+    merges: int = 0
+    errors: int = 0
+    bytes_merged: int = 0      # size of files moved one by one during merges
+    # exists()/is_dir()/is_file() checks answered from a directory listing instead of the filesystem
+    syscalls_avoided: int = 0
+    skipped: int = 0  # plan-file operations whose source no longer exists
+    pruned_dirs: int = 0  # subfolders never listed (excluded or beyond the max depth)
+    filtered: int = 0  # entries left alone because of include/exclude patterns
+    deduped: int = 0       # files dropped because the target already held the same bytes
+    bytes_saved: int = 0   # size of those files, not moved or rewritten
+    bytes_hashed: int = 0  # bytes read to compare contents (cached digests excluded)
+    collision_groups: int = 0  # targets several entries were heading for, each settled in one decision
+    dropped: int = 0           # entries deleted because another entry of their collision group won
+    merge_bulk: int = 0        # merge: folders moved whole with one rename
+    merge_individual: int = 0  # merge: files moved one by one
+    direct_renames: int = 0    # renames done in one step (filesystem didn't need the temp hop)
+    temp_hops: int = 0         # renames done via __tmp__ name
+    stopped: str = ""          # why the run stopped before the end of the plan (run_control.STOP_*), "" if it didn't
+
+    time_listing: float = 0.0
+    time_planning: float = 0.0
+    time_renaming: float = 0.0
+    time_merging: float = 0.0
+    time_logging: float = 0.0
+    time_total: float = 0.0
+
+    # (seconds, path) min-heaps of the slowest directories, at most SLOWEST_DIRS_KEPT each
+    slowest_listing: List[tuple] = field(default_factory=list)
+    slowest_apply: List[tuple] = field(default_factory=list)
+    latency: Dict[str, LatencyHistogram] = field(default_factory=dict)
+
+    plan: Optional["RenamePlan"] = field(default=None, repr=False, compare=False)
+
+    def add(self, other: "RunStats"):
+        for f in fields(self):
+            value = getattr(other, f.name)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                setattr(self, f.name, getattr(self, f.name) + value)
+            elif isinstance(value, str) and value and not getattr(self, f.name):
+                setattr(self, f.name, value)
+        self.slowest_listing = _merge_slowest(self.slowest_listing, other.slowest_listing)
+        self.slowest_apply = _merge_slowest(self.slowest_apply, other.slowest_apply)
+        for name, histogram in other.latency.items():
+            self.histogram(name).add(histogram)
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        histogram = self.latency.get(name)
+        if histogram is None:
+            histogram = self.latency[name] = LatencyHistogram()
+        return histogram
+
+    def note_slow(self, kind: str, seconds: float, path: Path):
+        """Keep path if it is among the slowest seen for kind ("listing" or "apply")."""
+        attr = "slowest_" + kind
+        slowest = getattr(self, attr)
+        if len(slowest) < SLOWEST_DIRS_KEPT:
+            heapq.heappush(slowest, (seconds, str(path)))
+        elif seconds > slowest[0][0]:
+            heapq.heapreplace(slowest, (seconds, str(path)))
+
+    def to_dict(self) -> dict:
+        data = {f.name: getattr(self, f.name) for f in fields(self)
+                if f.name not in ("slowest_listing", "slowest_apply", "latency", "plan")}
+        data["slowest_listing"] = [{"path": p, "seconds": s} for s, p in sorted(self.slowest_listing, reverse=True)]
+        data["slowest_apply"] = [{"path": p, "seconds": s} for s, p in sorted(self.slowest_apply, reverse=True)]
+        data["latency"] = {name: h.to_dict() for name, h in self.latency.items()}
+        return data
+
+    def summary_lines(self) -> List[str]:
+        lines = [
+            f"Entries scanned: {self.entries_scanned}",
+            f"Changes: {self.renames} renamed, {self.overwrites} overwritten, {self.merges} merged, {self.errors} errors",
+            f"Time: listing {self.time_listing:.2f}s | planning {self.time_planning:.2f}s | "
+            f"renaming {self.time_renaming:.2f}s | merging {self.time_merging:.2f}s | "
+            f"logging {self.time_logging:.2f}s | total {self.time_total:.2f}s",
+        ]
+        if self.stopped:
+            lines.append(f"Stopped early: {self.stopped}")
+        if self.bytes_merged:
+            lines.append(f"Bytes moved during merges: {self.bytes_merged}")
+        if self.collision_groups or self.dropped:
+            lines.append(f"Collisions: {self.collision_groups} groups, {self.dropped} losing entries dropped")
+        if self.deduped or self.bytes_hashed:
+            lines.append(f"Dedupe: {self.deduped} identical files dropped, {self.bytes_saved} bytes saved, "
+                         f"{self.bytes_hashed} bytes hashed")
+        if self.pruned_dirs or self.filtered:
+            lines.append(f"Filters: {self.pruned_dirs} subfolders pruned, {self.filtered} entries left alone")
+        for name in sorted(self.latency):
+            h = self.latency[name]
+            lines.append(f"Latency {name}: n={h.count} p50<{h.percentile(50) * 1000:.2f}ms "
+                         f"p99<{h.percentile(99) * 1000:.2f}ms")
+        if self.slowest_apply or self.slowest_listing:
+            seconds, path = max(self.slowest_apply + self.slowest_listing)
+            lines.append(f"Slowest folder: {path} ({seconds:.2f}s)")
+        return lines
+
+
+class _TimedLog:
+    """Wraps a log callback and adds up the time spent inside it."""
+
+    __slots__ = ("callback", "seconds")
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.seconds = 0.0
+
+    def __call__(self, msg):
+        start = time.perf_counter()
+        self.callback(msg)
+        self.seconds += time.perf_counter() - start
 
 
 # ---------------------------
-# Overwrite / merge helpers
+# Traversal
 # ---------------------------
 
-def remove_path(target: Path):
-    """Remove file or directory tree."""
-    if not target.exists():
+@dataclass
+class DirListing:
+    """One directory as seen by scan_tree(): child names split by type."""
+    path: Path
+    files: List[str]
+    dirs: List[str]
+    descend: List[str] = field(default_factory=list)  # subfolders that were walked (no symlinks)
+    mtime_ns: Optional[int] = None
+    cached: bool = False  # skipped thanks to the index: files/dirs are empty
+    dev: Optional[int] = None  # st_dev, to look up filesystem capabilities without another stat
+    list_seconds: float = 0.0  # time spent listing (and stat'ing) the directory
+    skip: FrozenSet[str] = frozenset()  # names left alone by the path filter (still part of the listing)
+    pruned: int = 0  # subfolders the path filter kept out of descend
+
+    def names(self, strict: bool = False) -> Optional["NameMap"]:
+        """
+        key(name) -> is_dir (see NameMap), used for collision checks without
+        stat calls. While the case sensitivity of the filesystem is unknown
+        names are casefolded, or with strict None is returned so the caller
+        asks the filesystem instead.
+        """
+        case_sensitive = case_sensitivity(self.path, itertools.chain(self.files, self.dirs), self.dev)
+        if case_sensitive is None and strict:
+            return None
+        names = NameMap(os.path.normcase if case_sensitive else str.casefold)
+        key = names.key
+        names.update((key(n), False) for n in self.files)
+        names.update((key(n), True) for n in self.dirs)
+        return names
+
+
+class NameMap(dict):
+    """
+    Listing of one directory as key(name) -> is_dir. key maps names the way
+    the filesystem compares them: casefold() where it is case-insensitive
+    (e.g. "Photos" and "PHOTOS" are one entry on SMB mounts and macOS), plain
+    normcase() where it is case-sensitive.
+    """
+    __slots__ = ("key",)
+
+    def __init__(self, key, *args):
+        super().__init__(*args)
+        self.key = key
+
+
+def list_dir(path: str):
+    """Return (files, dirs, dirs_to_descend) for path, or None if it can't be listed."""
+    files, dirs, descend = [], [], []
+    try:
+        it = os.scandir(path)
+    except OSError:
+        return None
+    with it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                files.append(entry.name)
+                continue
+            dirs.append(entry.name)
+            # Like os.walk: list symlinked folders but don't follow them
+            try:
+                if not entry.is_symlink():
+                    descend.append(entry.name)
+            except OSError:
+                pass
+    return files, dirs, descend
+
+
+def _visit_dir(path: str, index, path_filter: Optional[PathFilter] = None, rel: str = "") -> Optional[DirListing]:
+    start = time.perf_counter()
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    listing = None
+    if index is not None:
+        subdirs = index.lookup(path, st.st_mtime_ns)
+        if subdirs is not None:
+            listing = DirListing(Path(path), [], [], subdirs, st.st_mtime_ns, cached=True, dev=st.st_dev)
+    if listing is None:
+        entries = list_dir(path)
+        if entries is None:
+            return None
+        files, dirs, descend = entries
+        listing = DirListing(Path(path), files, dirs, descend, st.st_mtime_ns, dev=st.st_dev)
+    if path_filter is not None:
+        path_filter.apply(listing, rel)
+    listing.list_seconds = time.perf_counter() - start
+    return listing
+
+
+def _checkpoint(control: Optional[RunControl]):
+    if control is not None:
+        control.checkpoint()
+
+
+def scan_tree(root: Path, index=None, control: Optional[RunControl] = None, path_filter: Optional[PathFilter] = None,
+              rel: str = "", topdown: bool = False):
+    """
+    Bottom-up walk built on os.scandir (children are yielded before their parent).
+    With topdown a directory is yielded before its subfolders instead, and
+    the walk only keeps the subfolders still to visit of each ancestor, not
+    its whole listing. Entry types come from the DirEntry objects, so nothing downstream has to
+    stat an entry again just to know whether it is a file or a folder.
+
+    With an index (see rename_index.RenameIndex), directories recorded as
+    unchanged are not listed; they are yielded with cached=True and the walk
+    continues into their recorded subfolders.
+
+    control is an optional run_control.RunControl: the walk waits while it is
+    paused and raises Cancelled before listing the next directory once it is
+    cancelled.
+
+    path_filter (a path_filter.PathFilter) marks entries to leave alone and
+    keeps excluded or too deep folders from being listed at all. rel is the
+    path of root below the tree the filter's patterns and depth refer to.
+    """
+    _checkpoint(control)
+    listing = _visit_dir(str(root), index, path_filter, rel)
+    if listing is None:
         return
-    if target.is_dir():
+    if topdown:
+        yield listing
+    # (path, subfolders left to visit, rel, listing still to yield bottom-up)
+    stack = [(str(listing.path), iter(listing.descend), rel, None if topdown else listing)]
+
+    while stack:
+        path, pending, rel, listing = stack[-1]
+        child = next(pending, None)
+        if child is not None:
+            _checkpoint(control)
+            child_rel = rel + "/" + child if rel else child
+            child_listing = _visit_dir(os.path.join(path, child), index, path_filter, child_rel)
+            if child_listing is not None:
+                if topdown:
+                    yield child_listing
+                stack.append((str(child_listing.path), iter(child_listing.descend), child_rel,
+                              None if topdown else child_listing))
+            continue
+
+        stack.pop()
+        if not topdown:
+            yield listing
+
+
+# Threads used to list the tree ahead of a run that reports progress
+PRESCAN_WORKERS = 4
+
+
+@dataclass
+class TreeScan:
+    """Every listing of a tree, bottom-up (scan_tree order), kept in memory."""
+    root: Path
+    listings: List[DirListing] = field(default_factory=list)
+
+    @property
+    def entries(self) -> int:
+        """Entries the naming rules will be checked against (cached directories don't count)."""
+        return sum(len(l.files) + len(l.dirs) for l in self.listings)
+
+
+def prescan_tree(root: Path, workers: int = PRESCAN_WORKERS, index=None, control: Optional[RunControl] = None,
+                 progress: Optional[ProgressTracker] = None, path_filter: Optional[PathFilter] = None) -> TreeScan:
+    """
+    List the whole tree up front, one thread per top-level subfolder, so a
+    run knows its total before it starts. The listings are returned in the
+    order scan_tree() yields them; plan_tree(listings=...) plans from them
+    without listing anything again.
+
+    An index (an SQLite connection) can't be shared between threads, so with
+    one the scan runs on the calling thread. Raises Cancelled if control is cancelled.
+    """
+    scan = TreeScan(root)
+    _checkpoint(control)
+    top = _visit_dir(str(root), index, path_filter)
+    if top is None:
+        return scan
+
+    def scan_subtree(name):
+        listings = []
+        for listing in scan_tree(Path(os.path.join(str(root), name)), index, control, path_filter, name):
+            listings.append(listing)
+            if progress is not None:
+                progress.advance(len(listing.files) + len(listing.dirs))
+        return listings
+
+    if workers > 1 and index is None and len(top.descend) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(scan_subtree, name) for name in top.descend]
+            try:
+                for future in futures:
+                    scan.listings.extend(future.result())
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+    else:
+        for name in top.descend:
+            scan.listings.extend(scan_subtree(name))
+
+    scan.listings.append(top)
+    if progress is not None:
+        progress.advance(len(top.files) + len(top.dirs))
+        progress.finish()
+    return scan
+
+
+# ---------------------------
+# Overwrite / merge helpers
+# ---------------------------
+
+def remove_path(target: Path, is_dir: Optional[bool] = None):
+    """Remove file or directory tree. Pass is_dir when the type is already known."""
+    if is_dir is None:
+        if not target.exists():
+            return
+        is_dir = target.is_dir()
+    if is_dir:
         shutil.rmtree(target)
     else:
         target.unlink()
 
 
-def merge_dirs(src_dir: Path, dst_dir: Path, dry_run: bool, log_callback=default_logger):
+def _scan_types(path: Path) -> NameMap:
+    """NameMap of every entry of path (empty if it can't be listed)."""
+    listing = list_dir(str(path))
+    if listing is None:
+        return NameMap(os.path.normcase)
+    return DirListing(path, listing[0], listing[1]).names()
+
+
+def _move(src: Path, dst: Path):
+    """Rename src to dst (replacing a file at dst); copy only across filesystems."""
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(str(src), str(dst))
+
+
+def merge_dirs(src_dir: Path, dst_dir: Path, dry_run: bool, log_callback=default_logger,
+               stats: Optional[RunStats] = None, log_level: int = LOG_VERBOSE,
+               dedupe: Optional[ContentDedupe] = None):
     """
     Merge src_dir into dst_dir, overwriting collisions.
     After merge, src_dir will be removed.
+
+    Children without a counterpart in dst_dir are moved with a single rename,
+    whole subtrees included; only folders present on both sides are merged
+    recursively. With dedupe, a file colliding with an identical file is
+    deleted instead of replacing it.
     """
-    log_callback(f"      MERGE: {src_dir.name} -> {dst_dir.name}")
+    if stats is None:
+        stats = RunStats()
+    verbose = log_level >= LOG_VERBOSE
+
+    if verbose:
+        log_callback(f"      MERGE: {src_dir.name} -> {dst_dir.name}")
 
     if dry_run:
-        log_callback("      DRY RUN: would merge directories (with overwrites)")
+        if verbose:
+            log_callback("      DRY RUN: would merge directories (with overwrites)")
         return
 
     dst_dir.mkdir(exist_ok=True)
 
-    for item in src_dir.iterdir():
-        dst_item = dst_dir / item.name
+    # One listing of each side instead of exists()/is_dir() per item
+    dst_names = _scan_types(dst_dir)
+    with os.scandir(src_dir) as it:
+        entries = [(entry, entry.is_dir()) for entry in it]
 
-        if item.is_dir():
-            if dst_item.exists() and dst_item.is_file():
-                log_callback(f"        OVERWRITE: removing file {dst_item.name} to replace with folder")
-                remove_path(dst_item)
-            dst_item.mkdir(exist_ok=True)
-            merge_dirs(item, dst_item, dry_run=False, log_callback=log_callback)
+    for entry, is_dir in entries:
+        name = entry.name
+        item = src_dir / name
+        dst_item = dst_dir / name
+        existing = dst_names.get(dst_names.key(name))
+        stats.syscalls_avoided += 2
+
+        if is_dir and existing:
+            # Folder on both sides: the only case that needs descending
+            merge_dirs(item, dst_item, dry_run=False, log_callback=log_callback, stats=stats, log_level=log_level,
+                       dedupe=dedupe)
             # item should be removed by recursion
-        else:
-            if dst_item.exists():
-                log_callback(f"        OVERWRITE: {dst_item.name}")
-                remove_path(dst_item)
+            continue
 
-            # Move file into destination
-            shutil.move(str(item), str(dst_item))
+        if existing is False and not is_dir and dedupe is not None and _drop_duplicate(item, dst_item, dedupe, stats):
+            if verbose:
+                log_callback(f"        IDENTICAL: {dst_item.name} (duplicate dropped)")
+            continue
+
+        if existing is not None:
+            if verbose:
+                if is_dir:
+                    log_callback(f"        OVERWRITE: removing file {dst_item.name} to replace with folder")
+                else:
+                    log_callback(f"        OVERWRITE: {dst_item.name}")
+            # os.replace() already swaps a file for a file; anything else has to go first
+            if is_dir or existing:
+                remove_path(dst_item, is_dir=existing)
+
+        if not is_dir:
+            try:
+                stats.bytes_merged += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                pass
+        _move(item, dst_item)
+        if is_dir:
+            stats.merge_bulk += 1
+        else:
+            stats.merge_individual += 1
 
     # Remove the now-empty source directory
-    if src_dir.exists():
-        try:
-            src_dir.rmdir()
-        except OSError:
-            # If something is still there, force remove
-            shutil.rmtree(src_dir)
+    try:
+        src_dir.rmdir()
+    except FileNotFoundError:
+        pass
+    except OSError:
+        # If something is still there, force remove
+        shutil.rmtree(src_dir)
+
+
+def _drop_duplicate(src: Path, dst: Path, dedupe: ContentDedupe, stats: RunStats) -> bool:
+    """Delete file src if dst already holds the same bytes; returns whether it did."""
+    if not dedupe.identical(src, dst, stats):
+        return False
+    size = src.stat().st_size
+    os.remove(src)
+    stats.deduped += 1
+    stats.bytes_saved += size
+    return True
 
 
-def forced_temp_rename_with_overwrite(src: Path, final_dst: Path, dry_run: bool, kind: str, log_callback=default_logger) -> bool:
+def _tmp_to_final(tmp_path: Path, final_dst: Path, kind: str, target_is_dir: Optional[bool], log_callback,
+                  stats: RunStats, log_level: int, journal=None, src_name: str = "",
+                  replace_overwrites: bool = False, dedupe: Optional[ContentDedupe] = None) -> str:
     """
-    Always do:
+    Step 2 of a rename: move tmp_path to final_dst, overwriting or merging if
+    final_dst exists (target_is_dir: None = free, else its type).
+    With replace_overwrites a file replaces a file in a single os.replace().
+    Returns the action taken.
+    """
+    verbose = log_level >= LOG_VERBOSE
+    if target_is_dir is None:
+        tmp_path.rename(final_dst)
+        return ACTION_RENAME
+
+    if verbose:
+        log_callback(f"      TARGET EXISTS -> OVERWRITE ({kind})")
+    stats.syscalls_avoided += 3
+
+    if kind == "FOLDER":
+        # Merge tmp folder into existing final folder
+        if target_is_dir:
+            if journal is not None:
+                journal.record_step("merge", tmp_path.parent, src_name)
+            start = time.perf_counter()
+            merge_dirs(tmp_path, final_dst, dry_run=False, log_callback=log_callback, stats=stats, log_level=log_level,
+                       dedupe=dedupe)
+            elapsed = time.perf_counter() - start
+            stats.time_merging += elapsed
+            stats.histogram("merge").record(elapsed)
+            return ACTION_MERGE
+        if verbose:
+            log_callback("      OVERWRITE: removing file to replace with folder")
+        remove_path(final_dst, is_dir=False)
+    elif replace_overwrites and not target_is_dir:
+        os.replace(tmp_path, final_dst)
+        return ACTION_OVERWRITE
+    else:
+        # File overwrite: remove existing and rename
+        remove_path(final_dst, is_dir=target_is_dir)
+    tmp_path.rename(final_dst)
+    return ACTION_OVERWRITE
+
+
+def forced_temp_rename_with_overwrite(src: Path, final_dst: Path, dry_run: bool, kind: str, log_callback=default_logger,
+                                      names: Optional[NameMap] = None, stats: Optional[RunStats] = None,
+                                      log_level: int = LOG_VERBOSE, journal=None,
+                                      caps: Optional[FsCapabilities] = None,
+                                      dedupe: Optional[ContentDedupe] = None) -> bool:
+    """
+    Always do (unless caps says the filesystem doesn't need it, see below):
       src -> __tmp__UUID__src -> final_dst
     If final_dst exists:
       - FILE: delete final_dst then rename
       - FOLDER: merge tmp_dir into final_dst (overwriting) then remove tmp_dir
+
+    names is the live listing of src.parent (a NameMap). When
+    given, collision checks are answered from it and it is kept up to date;
+    otherwise the filesystem is asked. journal (a RenameJournal) gets a record
+    before the temp rename and after the final one.
+
+    caps are the probed capabilities of the filesystem (fs_probe). The temp
+    hop only exists so case-only renames work on case-insensitive
+    filesystems; with caps, every other rename is done in a single step.
+    Without caps the temp hop is always used.
+
+    dedupe (a content_dedupe.ContentDedupe) compares a FILE with the file it
+    would overwrite; when they are identical src is deleted and final_dst
+    left untouched. It is also used for the files of a merge.
     """
     if src.name == final_dst.name:
         # log_callback(f"      = No change needed ({kind})") # Optional: reduce noise
         return False
 
-    tmp_name = f"__tmp__{uuid.uuid4().hex}__{src.name}"
-    tmp_path = src.parent / tmp_name
+    if stats is None:
+        stats = RunStats()
+    verbose = log_level >= LOG_VERBOSE
 
-    log_callback(f"      FROM: {src.name}")
-    log_callback(f"      TMP:  {tmp_name}")
-    log_callback(f"      TO:   {final_dst.name}")
+    key = names.key if names is not None else os.path.normcase
+    src_key = key(src.name)
+    dst_key = key(final_dst.name)
+    case_only = src.name.casefold() == final_dst.name.casefold()
+    use_tmp = caps is None or (case_only and not caps.case_sensitive)
+
+    if use_tmp:
+        tmp_name = f"__tmp__{uuid.uuid4().hex}__{src.name}"
+        tmp_path = src.parent / tmp_name
+    else:
+        tmp_name = "(none, direct rename)"
+        tmp_path = src
+
+    if verbose:
+        log_callback(f"      FROM: {src.name}")
+        log_callback(f"      TMP:  {tmp_name}")
+        log_callback(f"      TO:   {final_dst.name}")
 
     if dry_run:
-        if final_dst.exists():
-            log_callback(f"      NOTE: target exists -> would OVERWRITE ({kind})")
-        log_callback(f"      DRY RUN: would rename {kind} via temp")
+        exists = final_dst.exists()
+        if verbose:
+            if exists:
+                log_callback(f"      NOTE: target exists -> would OVERWRITE ({kind})")
+            log_callback(f"      DRY RUN: would rename {kind} via temp")
+        elif log_level >= LOG_CHANGES:
+            log_callback(format_change(ACTION_OVERWRITE if exists else ACTION_RENAME, kind, src, final_dst.name))
         return True
 
+    start = time.perf_counter()
     try:
+        if dedupe is not None and kind == "FILE" and src_key != dst_key:
+            if names is not None:
+                target_is_dir = names.get(dst_key)
+            else:
+                target_is_dir = final_dst.is_dir() if os.path.lexists(final_dst) else None
+            if target_is_dir is False and _drop_duplicate(src, final_dst, dedupe, stats):
+                if names is not None:
+                    names.pop(src_key, None)
+                if verbose:
+                    log_callback("      ✔ IDENTICAL to target, duplicate dropped")
+                elif log_level >= LOG_CHANGES:
+                    log_callback(format_change("IDENTICAL", kind, src, final_dst.name))
+                return True
+
         # Step 1: src -> tmp
-        src.rename(tmp_path)
+        if use_tmp:
+            if journal is not None:
+                journal.record_op(src.parent, src.name, tmp_name, final_dst.name, kind)
+            src.rename(tmp_path)
+            stats.temp_hops += 1
+        else:
+            stats.direct_renames += 1
+        if names is not None:
+            names.pop(src_key, None)
 
         # Step 2: tmp -> final (with overwrite rules)
-        if final_dst.exists():
-            log_callback(f"      TARGET EXISTS -> OVERWRITE ({kind})")
-
-            if tmp_path.is_dir():
-                # Merge tmp folder into existing final folder
-                if not final_dst.is_dir():
-                    log_callback("      OVERWRITE: removing file to replace with folder")
-                    remove_path(final_dst)
-                    tmp_path.rename(final_dst)
-                else:
-                    merge_dirs(tmp_path, final_dst, dry_run=False, log_callback=log_callback)
-            else:
-                # File overwrite: remove existing and rename
-                remove_path(final_dst)
-                tmp_path.rename(final_dst)
+        if names is not None:
+            target_is_dir = names.get(dst_key)
+            stats.syscalls_avoided += 1
         else:
-            tmp_path.rename(final_dst)
+            target_is_dir = final_dst.is_dir() if final_dst.exists() else None
 
-        log_callback(f"      ✔ RENAMED {kind}")
+        action = _tmp_to_final(tmp_path, final_dst, kind, target_is_dir, log_callback, stats, log_level,
+                               journal, src.name, caps is not None and caps.replace_overwrites, dedupe)
+        if journal is not None:
+            journal.record_step("final", src.parent, src.name)
+        stats.histogram("rename").record(time.perf_counter() - start)
+        if action == ACTION_MERGE:
+            stats.merges += 1
+        elif action == ACTION_OVERWRITE:
+            stats.overwrites += 1
+        else:
+            stats.renames += 1
+
+        if names is not None:
+            names[dst_key] = kind == "FOLDER"
+        if verbose:
+            log_callback(f"      ✔ RENAMED {kind}")
+        elif log_level >= LOG_CHANGES:
+            log_callback(format_change(action, kind, src, final_dst.name))
         return True
 
+    # Errors are reported at every log level
     except PermissionError as e:
-        log_callback(f"      ✖ PERMISSION ERROR: {e}")
-        # attempt to rollback if tmp exists
-        try:
-            if tmp_path.exists() and not src.exists():
-                tmp_path.rename(src)
-        except Exception:
-            pass
+        log_callback(f"      ✖ PERMISSION ERROR: {src}: {e}")
     except OSError as e:
-        log_callback(f"      ✖ OS ERROR: {e}")
-        # attempt to rollback if tmp exists
-        try:
-            if tmp_path.exists() and not src.exists():
-                tmp_path.rename(src)
-        except Exception:
-            pass
+        log_callback(f"      ✖ OS ERROR: {src}: {e}")
+    stats.errors += 1
+
+    # attempt to rollback if tmp exists
+    try:
+        if use_tmp and tmp_path.exists() and not src.exists():
+            tmp_path.rename(src)
+            if names is not None:
+                names[src_key] = kind == "FOLDER"
+    except Exception:
+        pass
 
     return False
 
 
 # ---------------------------
-# Core logic
+# Rename plan
 # ---------------------------
 
-def rename_tree(root: Path, dry_run: bool, log_callback=default_logger):
-    if not root.exists():
-        raise FileNotFoundError(f"Path not found: {root}")
+ACTION_RENAME = "RENAME"
+ACTION_OVERWRITE = "OVERWRITE"
+ACTION_MERGE = "MERGE"
+ACTION_DROP = "DROP"  # delete src: another entry of its collision group takes dst
+
+
+KINDS = ("FILE", "FOLDER")
+ACTIONS = (ACTION_RENAME, ACTION_OVERWRITE, ACTION_MERGE, ACTION_DROP)
+_KIND_CODES = {kind: i for i, kind in enumerate(KINDS)}
+_ACTION_CODES = {action: i for i, action in enumerate(ACTIONS)}
+
+
+class RenameOp:
+    """
+    A single planned rename inside one directory: the directory's path
+    (shared by all ops of the batch) plus the two names. src and dst are
+    built on demand.
+    """
+    __slots__ = ("kind", "parent", "src_name", "dst_name", "action")
+
+    def __init__(self, kind: str, parent: Path, src_name: str, dst_name: str, action: str):
+        self.kind = kind      # "FILE" or "FOLDER"
+        self.parent = parent
+        self.src_name = src_name
+        self.dst_name = dst_name
+        self.action = action  # ACTION_RENAME / ACTION_OVERWRITE / ACTION_MERGE
+
+    @property
+    def src(self) -> Path:
+        return self.parent / self.src_name
+
+    @property
+    def dst(self) -> Path:
+        return self.parent / self.dst_name
+
+    def __eq__(self, other):
+        if not isinstance(other, RenameOp):
+            return NotImplemented
+        return (self.kind, self.parent, self.src_name, self.dst_name, self.action) == \
+               (other.kind, other.parent, other.src_name, other.dst_name, other.action)
+
+    def __repr__(self):
+        return f"RenameOp({self.kind}, {self.src!s} -> {self.dst_name}, {self.action})"
+
+
+class DirBatch:
+    """
+    All planned renames for the direct children of one directory.
+
+    Plans for multi-million-entry trees are mostly made of these, so they are
+    stored column-wise: interned source and target names in two lists and
+    one byte each for kind and action, with the directory path held once.
+    ops builds RenameOp views (and their paths) only when asked.
+    """
+    __slots__ = ("path", "dev", "src_names", "dst_names", "kinds", "actions", "listing")
+
+    def __init__(self, path: Path, ops=(), listing=None, dev: Optional[int] = None):
+        self.path = path
+        self.dev = dev  # st_dev of path if known
+        self.src_names: List[str] = []
+        self.dst_names: List[str] = []
+        self.kinds = bytearray()
+        self.actions = bytearray()
+        # (files, dirs) of path at planning time, for collision checks during apply. None for
+        # batches read back from a plan file or journal: apply then checks the filesystem instead.
+        self.listing = listing
+        for op in ops:
+            self.add(op.kind, op.src_name, op.dst_name, op.action)
+
+    def add(self, kind: str, src_name: str, dst_name: str, action: str):
+        self.src_names.append(sys.intern(src_name))
+        self.dst_names.append(sys.intern(dst_name))
+        self.kinds.append(_KIND_CODES[kind])
+        self.actions.append(_ACTION_CODES[action])
+
+    def __len__(self) -> int:
+        return len(self.src_names)
+
+    def records(self):
+        """Yield (kind, src_name, dst_name, action) without building paths."""
+        for i, src_name in enumerate(self.src_names):
+            yield KINDS[self.kinds[i]], src_name, self.dst_names[i], ACTIONS[self.actions[i]]
+
+    @property
+    def ops(self) -> List[RenameOp]:
+        return [RenameOp(kind, self.path, src, dst, action) for kind, src, dst, action in self.records()]
+
+    @property
+    def names(self) -> Optional[NameMap]:
+        """NameMap of path at planning time, or None if unknown."""
+        if self.listing is None:
+            return None
+        return DirListing(self.path, *self.listing, dev=self.dev).names(strict=True)
+
+
+@dataclass
+class RenamePlan:
+    """
+    Result of a planning pass over a tree.
+
+    Batches are stored bottom-up (children before parents), which is the
+    order they must be applied in. dir_mtimes records every visited
+    directory so a later apply can tell whether the tree changed since.
+    """
+    root: Path
+    batches: List[DirBatch] = field(default_factory=list)
+    dir_mtimes: Dict[str, int] = field(default_factory=dict)
+    visited_dirs: int = 0
+    visited_files: int = 0
+    skipped_dirs: int = 0   # unchanged directories skipped via the index
+    syscalls_avoided: int = 0
+    stats: RunStats = field(default_factory=RunStats)  # scanning counters and listing times
+    path_filter: Optional[PathFilter] = None  # include/exclude patterns and max depth of the walk
+
+    @property
+    def operation_count(self) -> int:
+        return sum(len(b) for b in self.batches)
+
+    def iter_ops(self):
+        for batch in self.batches:
+            yield from batch.ops
+
+    def is_stale(self) -> bool:
+        """True if any visited directory was modified or removed since planning."""
+        for path, mtime_ns in self.dir_mtimes.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime_ns:
+                    return True
+            except OSError:
+                return True
+        return False
+
+
+def plan_entry(batch: DirBatch, names: NameMap, src_name: str, dst_name: str,
+               kind: str, log_callback, log_level: int, protected: Optional[Set[str]] = None) -> bool:
+    """
+    Plan one entry against the simulated listing of its directory.
+    names (a NameMap) is updated as if the rename happened, so later entries
+    in the same directory see earlier planned targets.
+    protected holds the names.key() of entries left alone by the path filter; an entry
+    that would replace one of them is left alone too (returns False).
+    """
+    if src_name == dst_name:
+        return True
+
+    key = names.key
+    if protected and key(dst_name) in protected:
+        if log_level >= LOG_VERBOSE:
+            log_callback(f"      LEFT ALONE: target {dst_name} is excluded by the filters")
+        return False
+    is_dir = kind == "FOLDER"
+    names.pop(key(src_name), None)
+    existing = names.get(key(dst_name))
+    if existing is None:
+        action = ACTION_RENAME
+    elif is_dir and existing:
+        action = ACTION_MERGE
+    else:
+        action = ACTION_OVERWRITE
+    names[key(dst_name)] = is_dir
+
+    batch.add(kind, src_name, dst_name, action)
+
+    if log_level >= LOG_VERBOSE:
+        log_callback(f"      FROM: {src_name}")
+        log_callback(f"      TO:   {dst_name}")
+        if action != ACTION_RENAME:
+            log_callback(f"      NOTE: target exists -> would {action} ({kind})")
+    elif log_level >= LOG_CHANGES:
+        log_callback(format_change(action, kind, batch.path / src_name, dst_name))
+    return True
+
+
+_COPY_NUMBER_RE = re.compile(r"\((\d+)\)")
+
+
+def _collision_rank(name: str) -> Tuple[int, str]:
+    """Order inside a collision group: by the last '(n)' in the name (none = 0), then by name."""
+    numbers = _COPY_NUMBER_RE.findall(name)
+    return (int(numbers[-1]) if numbers else 0, name)
+
+
+def _plan_group(batch: DirBatch, names: NameMap, group: List[Tuple[str, str, str]], log_callback,
+                log_level: int, protected: Optional[Set[str]], stats: RunStats):
+    """
+    Plan entries (kind, src_name, dst_name) that all end up with the same name
+    in one decision that doesn't depend on listing order:
+
+    - folders win over files; they are merged into the target from the
+      lowest to the highest rank (see _collision_rank()), so on conflicts
+      inside them the highest-ranked copy wins;
+    - otherwise the highest-ranked file is renamed onto the target and the
+      other files are dropped (planned as DROP, one delete each) instead of
+      overwriting the target one after another.
+
+    An entry that already has the target name loses to every entry of the
+    group, as with a single overwrite.
+    """
+    key = names.key(group[0][2])
+    if protected and key in protected:
+        for kind, src_name, dst_name in group:
+            plan_entry(batch, names, src_name, dst_name, kind, log_callback, log_level, protected)
+        stats.filtered += len(group)
+        return
+    stats.collision_groups += 1
+    # On case-insensitive filesystems a case-only source may itself hold the target name
+    in_place = key in names and all(names.key(src_name) != key for _, src_name, _ in group)
+    group = sorted(group, key=lambda entry: _collision_rank(entry[1]))
+    folders = [entry for entry in group if entry[0] == "FOLDER"]
+    if folders:
+        kept = folders
+        dropped = [entry for entry in group if entry[0] == "FILE"]
+    else:
+        kept, dropped = group[-1:], group[:-1]
+
+    if log_level >= LOG_CHANGES:
+        kind, _, dst_name = kept[-1]
+        order = "merged in this order" if len(kept) > 1 else "wins"
+        losers = [src_name for _, src_name, _ in dropped] + ([dst_name] if in_place else [])
+        line = f"{'GROUP':<9} {kind:<6} {batch.path / dst_name} <- {', '.join(e[1] for e in kept)} {order}"
+        log_callback(line + (f" over {', '.join(losers)}" if losers else ""))
+
+    for kind, src_name, dst_name in kept:
+        plan_entry(batch, names, src_name, dst_name, kind, log_callback, log_level)
+    for kind, src_name, dst_name in dropped:
+        if names.key(src_name) == key:
+            continue  # same entry as the target: replaced by the winner's overwrite
+        names.pop(names.key(src_name), None)
+        batch.add(kind, src_name, dst_name, ACTION_DROP)
+        if log_level >= LOG_VERBOSE:
+            log_callback(f"      DROP: {src_name} (loses to the entry renamed to {dst_name})")
+        elif log_level >= LOG_CHANGES:
+            log_callback(format_change(ACTION_DROP, kind, batch.path / src_name, dst_name))
+
+
+def _add_to_listing(batch: DirBatch, names: NameMap, keys):
+    """Add the entries of names under keys, as planned so far, to batch's (partial) listing."""
+    files, dirs = batch.listing
+    for key in keys:
+        is_dir = names.get(key)
+        if is_dir is not None:
+            (dirs if is_dir else files).append(key)
 
-    log_callback("=" * 78)
-    log_callback(f"ROOT: {root}")
-    log_callback(f"MODE: {'DRY RUN' if dry_run else 'APPLY (OVERWRITE ENABLED)'}")
-    log_callback("RULES: folders -> ALL CAPS + remove ' (n)' | files -> clean '(n)', stem lower, first char upper")
-    log_callback("NOTE: if target exists -> OVERWRITE (folders are MERGED with overwrites)")
-    log_callback("=" * 78)
 
-    visited_dirs = 0
-    visited_files = 0
-    actions = 0
+def iter_plan(plan: RenamePlan, log_callback=default_logger, log_level: int = LOG_VERBOSE, index=None,
+              keep_mtimes: bool = True, listings=None, control: Optional[RunControl] = None,
+              progress: Optional[ProgressTracker] = None, chunk: Optional[int] = None):
+    """
+    Walk plan.root and yield one DirBatch per directory that needs renames,
+    bottom-up, as soon as that directory's subtree has been checked. Counters
+    on plan are updated along the way but batches are not stored, so a
+    consumer can stream them (see write_plan_file()).
+
+    The walk is top-down: a directory is planned when it is listed, so only
+    its batch is kept while its subfolders are walked, not its listing.
+
+    listings (from prescan_tree()) replaces the walk. progress is advanced
+    by the number of entries checked in each directory. plan.path_filter
+    limits which entries are renamed and which folders are walked.
+
+    With chunk, a directory of more than chunk entries has its file renames
+    yielded as soon as about chunk of them are planned (a collision group is
+    never split), before its subfolders are walked; only its folder renames
+    wait for the subtree. Its batches carry just the listing entries their
+    own operations look at, not a copy of the whole directory.
+    """
+    verbose = log_level >= LOG_VERBOSE
+    root = plan.root
+    if not root.exists():
+        raise FileNotFoundError(f"Path not found: {root}")
 
     # Bottom-up traversal is critical for renaming folders safely
-    for current_root, dirnames, filenames in os.walk(root, topdown=False):
-        current_root = Path(current_root)
-        visited_dirs += 1
+    stats = plan.stats
+    listing_latency = stats.histogram("list")
+    file_rule, folder_rule = _rules.file, _rules.folder
+    topdown = listings is None
+    if topdown:
+        listings = scan_tree(root, index, control, plan.path_filter, topdown=True)
+    # Top-down, batches wait here until the walk has left their directory
+    held: List[DirBatch] = []
+    for listing in listings:
+        _checkpoint(control)
+        current_root, dirnames, filenames = listing.path, listing.dirs, listing.files
+        while held and held[-1].path not in current_root.parents:
+            yield held.pop()
+        stats.time_listing += listing.list_seconds
+        listing_latency.record(listing.list_seconds)
+        stats.note_slow("listing", listing.list_seconds, current_root)
+        if keep_mtimes:
+            plan.dir_mtimes[str(current_root)] = listing.mtime_ns
+        stats.pruned_dirs += listing.pruned
+        if listing.cached:
+            plan.skipped_dirs += 1
+            continue
+        plan.visited_dirs += 1
+        stats.entries_scanned += len(filenames) + len(dirnames)
+        chunked = chunk is not None and len(filenames) + len(dirnames) > chunk
+        if chunked:
+            # Batches of a wide directory only carry the entries their own ops look at
+            batch = DirBatch(current_root, listing=([], []), dev=listing.dev)
+            file_batch = DirBatch(current_root, listing=([], []), dev=listing.dev)
+        else:
+            batch = file_batch = DirBatch(current_root, listing=(filenames, dirnames), dev=listing.dev)
+        planned = 0
+        names = listing.names()
+        skip = listing.skip
+        protected = {names.key(n) for n in skip} if skip else None
 
-        log_callback(f"\n📂 Visiting folder:")
-        log_callback(f"   {current_root}")
+        if verbose:
+            log_callback(f"\n📂 Visiting folder:")
+            log_callback(f"   {current_root}")
 
         # Files first
-        if filenames:
+        plan.visited_files += len(filenames)
+        if filenames and verbose:
             log_callback("   📄 Files:")
+        # Entries are grouped by their target first, so entries ending up with the
+        # same name are settled together whatever order the listing came in
+        targets: Dict[str, List[Tuple[str, str, str]]] = {}
         for fname in filenames:
-            visited_files += 1
-            src = current_root / fname
-            desired = current_root / file_name_rule(fname)
-
-            log_callback(f"    - Checking file: {fname}")
-            if forced_temp_rename_with_overwrite(src, desired, dry_run, "FILE", log_callback):
-                actions += 1
+            if skip and fname in skip:
+                stats.filtered += 1
+                continue
+            if verbose:
+                log_callback(f"    - Checking file: {fname}")
+            new_name = file_rule(fname)
+            if new_name != fname:
+                targets.setdefault(names.key(new_name), []).append(("FILE", fname, new_name))
 
         # Then folders
-        if dirnames:
+        if dirnames and verbose:
             log_callback("   📁 Subfolders:")
         for dname in dirnames:
-            src = current_root / dname
-            desired = current_root / folder_name_rule(dname)
+            if skip and dname in skip:
+                stats.filtered += 1
+                continue
+            if verbose:
+                log_callback(f"    - Checking folder: {dname}")
+            new_name = folder_rule(dname)
+            if new_name != dname:
+                targets.setdefault(names.key(new_name), []).append(("FOLDER", dname, new_name))
 
-            log_callback(f"    - Checking folder: {dname}")
-            if forced_temp_rename_with_overwrite(src, desired, dry_run, "FOLDER", log_callback):
-                actions += 1
+        for key, group in targets.items():
+            target = batch
+            if chunked:
+                # File renames don't touch the subtree, so they go out in chunks right away;
+                # folders (and files replacing a folder) wait for the subtree like any batch
+                if not names.get(key) and all(kind == "FILE" for kind, _, _ in group):
+                    if len(file_batch) >= chunk:
+                        planned += len(file_batch)
+                        yield file_batch
+                        file_batch = DirBatch(current_root, listing=([], []), dev=listing.dev)
+                    target = file_batch
+                _add_to_listing(target, names, [key] + [names.key(src_name) for _, src_name, _ in group])
+            if len(group) > 1:
+                _plan_group(target, names, group, log_callback, log_level, protected, stats)
+            elif not plan_entry(target, names, group[0][1], group[0][2], group[0][0], log_callback, log_level,
+                                protected):
+                stats.filtered += 1
+        if progress is not None:
+            progress.advance(len(filenames) + len(dirnames))
+
+        if chunked and len(file_batch):
+            planned += len(file_batch)
+            yield file_batch
+        planned += len(batch)
+        # Each planned op would have needed an exists() check on the target
+        plan.syscalls_avoided += planned
+        if len(batch):
+            if topdown:
+                held.append(batch)
+            else:
+                yield batch
+        elif not planned and index is not None:
+            index.record(str(current_root), listing.mtime_ns, listing.descend)
 
+    while held:
+        yield held.pop()
+    if index is not None:
+        index.commit()
+    if progress is not None:
+        progress.finish()
+
+
+def plan_tree(root: Path, log_callback=default_logger, log_level: int = LOG_VERBOSE, index=None,
+              listings=None, control: Optional[RunControl] = None,
+              progress: Optional[ProgressTracker] = None, path_filter: Optional[PathFilter] = None) -> RenamePlan:
+    """
+    Walk the tree once and build the list of renames without touching anything.
+    The returned plan can be handed to apply_plan() as-is.
+    With an index, unchanged directories are skipped and directories that
+    need no renames are recorded for the next run.
+    Pass listings from prescan_tree() to plan without walking the tree again
+    (scanned with the same path_filter).
+    """
+    plan = RenamePlan(root=root, path_filter=path_filter)
+    plan.batches.extend(iter_plan(plan, log_callback, log_level, index, listings=listings, control=control,
+                                  progress=progress))
+    return plan
+
+
+def _winner_in_place(src: Path, dst: Path, names: Optional[NameMap], stats: RunStats) -> bool:
+    """
+    Whether a DROP of src can go ahead: dst (where the winner of its
+    collision group went) exists and is a different entry. When it doesn't,
+    the winner failed and src is renamed instead, so no copy is lost.
+    """
+    key = names.key if names is not None else os.path.normcase
+    dst_key = key(dst.name)
+    if key(src.name) == dst_key:
+        return False
+    if names is not None:
+        stats.syscalls_avoided += 1
+        return dst_key in names
+    return os.path.lexists(dst)
+
+
+def _drop_loser(src: Path, kind: str, dst_name: str, log_callback, names: Optional[NameMap],
+                stats: RunStats, log_level: int) -> bool:
+    """Apply a DROP: delete src, which lost its collision group to the entry now named dst_name."""
+    try:
+        remove_path(src, is_dir=kind == "FOLDER")
+    except OSError as e:
+        log_callback(f"      ✖ OS ERROR: {src}: {e}")
+        stats.errors += 1
+        return False
+    if names is not None:
+        names.pop(names.key(src.name), None)
+    stats.dropped += 1
+    if log_level >= LOG_VERBOSE:
+        log_callback(f"      ✔ DROPPED {kind} {src.name} (lost to {dst_name})")
+    elif log_level >= LOG_CHANGES:
+        log_callback(format_change(ACTION_DROP, kind, src, dst_name))
+    return True
+
+
+def apply_batch(batch: DirBatch, log_callback, log_level: int = LOG_VERBOSE, journal=None,
+                always_temp: bool = False, progress: Optional[ProgressTracker] = None,
+                control: Optional[RunControl] = None, dedupe: Optional[ContentDedupe] = None) -> RunStats:
+    """
+    Apply one directory's renames. A cancelled control stops the batch
+    between two entries; the batch is then left without its journal "done"
+    record so a resume finishes it.
+    """
+    stats = RunStats()
+    start = time.perf_counter()
+    log_callback = _TimedLog(log_callback)
+    caps = None if always_temp else capabilities_for(batch.path, batch.dev)
+    if journal is not None:
+        journal.begin_dir(batch.path)
+    names = batch.names
+    if log_level >= LOG_VERBOSE:
+        log_callback(f"\n📂 Applying in folder:")
+        log_callback(f"   {batch.path}")
+    for kind, src_name, dst_name, action in batch.records():
+        if control is not None and not control.proceed():
+            stats.stopped = STOP_CANCELLED
+            break
+        if progress is not None:
+            progress.advance()
+        src = batch.path / src_name
+        # Without a fresh listing the plan may be outdated: only rename what is still there
+        if names is None and not os.path.lexists(src):
+            log_callback(f"      ✖ SKIPPED (source missing): {src}")
+            stats.skipped += 1
+            continue
+        if action == ACTION_DROP and _winner_in_place(src, batch.path / dst_name, names, stats):
+            if _drop_loser(src, kind, dst_name, log_callback, names, stats, log_level):
+                stats.actions += 1
+            continue
+        if forced_temp_rename_with_overwrite(src, batch.path / dst_name, False, kind, log_callback, names=names,
+                                             stats=stats, log_level=log_level, journal=journal, caps=caps,
+                                             dedupe=dedupe):
+            stats.actions += 1
+    if journal is not None and not stats.stopped:
+        journal.done_dir(batch.path)
+    elapsed = time.perf_counter() - start
+    stats.time_logging += log_callback.seconds
+    stats.note_slow("apply", elapsed, batch.path)
+    stats.time_renaming += max(0.0, elapsed - stats.time_merging - log_callback.seconds)
+    return stats
+
+
+def _apply_plan_parallel(plan: RenamePlan, log_callback, workers: int, log_level: int, journal=None,
+                         always_temp: bool = False, progress: Optional[ProgressTracker] = None,
+                         control: Optional[RunControl] = None, dedupe: Optional[ContentDedupe] = None) -> RunStats:
+    """
+    Run batches on a thread pool. A batch only starts once every batch below
+    its directory has finished, so folders are still renamed after their
+    children. Log lines are buffered per batch and emitted in plan order.
+    """
+    batches = plan.batches
+    index = {batch.path: i for i, batch in enumerate(batches)}
+
+    # Link every batch to the nearest batch above it and count what each one waits for
+    parent_of: List[Optional[int]] = [None] * len(batches)
+    pending = [0] * len(batches)
+    for i, batch in enumerate(batches):
+        for ancestor in batch.path.parents:
+            j = index.get(ancestor)
+            if j is not None:
+                parent_of[i] = j
+                pending[j] += 1
+                break
+            if ancestor == plan.root:
+                break
+
+    logs: List[Optional[list]] = [None] * len(batches)
+    next_to_emit = 0
+    stats = RunStats()
+    log_callback = _TimedLog(log_callback)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+
+        def submit(i):
+            if not stats.stopped and control is not None:
+                stats.stopped = control.stop_reason()
+            if stats.stopped:
+                return
+            lines = []
+            running[pool.submit(apply_batch, batches[i], lines.append, log_level, journal, always_temp,
+                                progress, control, dedupe)] = (i, lines)
+
+        for i in range(len(batches)):
+            if pending[i] == 0:
+                submit(i)
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i, lines = running.pop(future)
+                stats.add(future.result())
+                logs[i] = lines
+                parent = parent_of[i]
+                if parent is not None:
+                    pending[parent] -= 1
+                    if pending[parent] == 0:
+                        submit(parent)
+
+            while next_to_emit < len(batches) and logs[next_to_emit] is not None:
+                for line in logs[next_to_emit]:
+                    log_callback(line)
+                logs[next_to_emit] = []
+                next_to_emit += 1
+
+    # After an early stop, batches that never ran leave gaps: emit what did run
+    for lines in logs[next_to_emit:]:
+        for line in lines or ():
+            log_callback(line)
+
+    stats.time_logging += log_callback.seconds
+    return stats
+
+
+def apply_plan(plan: RenamePlan, log_callback=default_logger, workers: int = 1,
+               log_level: int = LOG_VERBOSE, journal=None, always_temp: bool = False,
+               progress: Optional[ProgressTracker] = None, control: Optional[RunControl] = None,
+               dedupe: Optional[ContentDedupe] = None) -> RunStats:
+    """
+    Execute a plan produced by plan_tree(). Returns the counters of the run
+    (stats.actions is the number of completed renames).
+    With workers > 1, sibling directories are processed concurrently, which
+    mostly pays off on high-latency network shares.
+    Each filesystem is probed once and the temp-name hop is skipped where it
+    isn't needed; always_temp forces the hop for every rename.
+    progress is advanced once per operation.
+
+    With a control (run_control.RunControl) the run can be paused and
+    cancelled between entries, and no further directory is started once its
+    time budget is used up; stats.stopped then says why it ended early.
+    With dedupe (a content_dedupe.ContentDedupe) files that would overwrite
+    an identical file are deleted instead.
+    """
+    if workers > 1 and len(plan.batches) > 1:
+        stats = _apply_plan_parallel(plan, log_callback, workers, log_level, journal, always_temp, progress,
+                                     control, dedupe)
+    else:
+        stats = RunStats()
+        for batch in plan.batches:
+            if control is not None:
+                stats.stopped = control.stop_reason()
+            if stats.stopped:
+                break
+            stats.add(apply_batch(batch, log_callback, log_level, journal, always_temp, progress, control, dedupe))
+    if progress is not None:
+        progress.finish()
+    return stats
+
+
+# Planned operations the streaming planner may run ahead of the renamer
+STREAM_WINDOW = 10000
+
+# Operations per batch the streaming planner cuts very wide directories into
+STREAM_CHUNK = 1000
+
+
+def apply_stream(batches, root: Path, log_callback=default_logger, workers: int = 1, log_level: int = LOG_VERBOSE,
+                 always_temp: bool = False, progress: Optional[ProgressTracker] = None,
+                 control: Optional[RunControl] = None, window: int = STREAM_WINDOW,
+                 dedupe: Optional[ContentDedupe] = None) -> RunStats:
+    """
+    Apply batches as they come out of iter_plan(), while the tree is still
+    being walked, and drop each one once it is done.
+
+    Every directory keeps a count of unfinished batches below it; a batch
+    starts as soon as that count is zero, so a folder is renamed right after
+    its subtree instead of after the whole walk. The planner is held back
+    once window operations are waiting or running, which bounds memory
+    whatever the fan-out; plan with iter_plan(chunk=...) so a very wide
+    directory doesn't come as one batch larger than the window. Batches of
+    the same directory run one after the other, in plan order, and each
+    still waits for the subtree below it. Log lines are
+    emitted in plan order, as in apply_plan().
+    """
+    if workers <= 1:
+        stats = RunStats()
+        for batch in batches:
+            if control is not None:
+                stats.stopped = control.stop_reason()
+            if stats.stopped:
+                break
+            stats.add(apply_batch(batch, log_callback, log_level, None, always_temp, progress, control, dedupe))
+        if progress is not None:
+            progress.finish()
+        return stats
+
+    stats = RunStats()
+    log_callback = _TimedLog(log_callback)
+    below: Dict[Path, int] = {}       # directory -> unfinished batches in its subtree
+    waiting: Dict[Path, tuple] = {}   # directory -> (seq, batch) held back until its subtree is done
+    chained: Dict[Path, deque] = {}   # directory -> its next batches, while one is waiting or running
+    logs: Dict[int, list] = {}        # seq -> buffered lines of a finished batch
+    next_to_emit = 0
+    queued_ops = 0
+
+    def ancestors(path: Path):
+        if path == root:
+            return
+        for ancestor in path.parents:
+            yield ancestor
+            if ancestor == root:
+                break
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+
+        def submit(seq, batch):
+            lines = []
+            future = pool.submit(apply_batch, batch, lines.append, log_level, None, always_temp, progress, control,
+                                 dedupe)
+            running[future] = (seq, batch, lines)
+
+        def start(seq, batch):
+            if below.get(batch.path):
+                waiting[batch.path] = (seq, batch)
+            else:
+                submit(seq, batch)
+
+        def reap(timeout):
+            nonlocal next_to_emit, queued_ops
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                seq, batch, lines = running.pop(future)
+                stats.add(future.result())
+                logs[seq] = lines
+                queued_ops -= len(batch)
+                for ancestor in ancestors(batch.path):
+                    below[ancestor] -= 1
+                    if below[ancestor] == 0:
+                        del below[ancestor]
+                        held = waiting.pop(ancestor, None)
+                        if held is not None and not stats.stopped:
+                            submit(*held)
+                later = chained[batch.path]
+                if later and not stats.stopped:
+                    start(*later.popleft())
+                else:
+                    del chained[batch.path]
+            while next_to_emit in logs:
+                for line in logs.pop(next_to_emit):
+                    log_callback(line)
+                next_to_emit += 1
+
+        for seq, batch in enumerate(batches):
+            if not stats.stopped and control is not None:
+                stats.stopped = control.stop_reason()
+            if stats.stopped:
+                break
+            for ancestor in ancestors(batch.path):
+                below[ancestor] = below.get(ancestor, 0) + 1
+            if batch.path in chained:
+                chained[batch.path].append((seq, batch))
+            else:
+                chained[batch.path] = deque()
+                start(seq, batch)
+            queued_ops += len(batch)
+            while queued_ops > window and running:
+                reap(None)
+            if running:
+                reap(0)
+
+        while running:
+            reap(None)
+
+    # Batches that never ran (early stop) leave gaps: emit what did run
+    for seq in sorted(logs):
+        for line in logs[seq]:
+            log_callback(line)
+
+    if progress is not None:
+        progress.finish()
+    stats.time_logging += log_callback.seconds
+    return stats
+
+
+# ---------------------------
+# Plan files
+# ---------------------------
+
+PLAN_FILE_VERSION = 1
+
+
+def write_plan_file(plan: RenamePlan, out_path: Path, log_callback=default_logger, log_level: int = LOG_VERBOSE,
+                    index=None, control: Optional[RunControl] = None) -> int:
+    """
+    Plan plan.root and stream every operation to out_path as JSON lines while
+    the tree is walked; batches are dropped once written, so memory does not
+    grow with the size of the plan. Returns the number of operations written.
+
+    Layout: one "header" record, one "op" record per rename, one "end"
+    record (a missing end record means the file is incomplete).
+    """
+    count = 0
+    with open(out_path, "w", encoding="utf-8") as f:
+        header = {"type": "header", "version": PLAN_FILE_VERSION, "root": str(plan.root), "rules": rules_fingerprint()}
+        f.write(json.dumps(header) + "\n")
+        for batch in iter_plan(plan, log_callback, log_level, index, keep_mtimes=False, control=control):
+            directory = str(batch.path)
+            for kind, src_name, dst_name, action in batch.records():
+                record = {"type": "op", "dir": directory, "src": src_name, "dst": dst_name,
+                          "kind": kind, "action": action}
+                f.write(json.dumps(record) + "\n")
+            count += len(batch)
+        end = {"type": "end", "operations": count, "visited_dirs": plan.visited_dirs,
+               "visited_files": plan.visited_files}
+        f.write(json.dumps(end) + "\n")
+    return count
+
+
+def read_plan_header(path: Path) -> dict:
+    """Return the header record of a plan file, checking that the file is complete."""
+    with open(path, "rb") as f:
+        first = f.readline()
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 4096))
+        last = f.read().rstrip(b"\n").rsplit(b"\n", 1)[-1]
+    try:
+        header = json.loads(first)
+        end = json.loads(last)
+    except ValueError:
+        raise ValueError(f"Not a plan file: {path}")
+    if header.get("type") != "header" or header.get("version") != PLAN_FILE_VERSION:
+        raise ValueError(f"Not a plan file (or unsupported version): {path}")
+    if end.get("type") != "end":
+        raise ValueError(f"Plan file is incomplete (no end record): {path}")
+    return header
+
+
+def iter_plan_file(path: Path):
+    """Yield the DirBatches stored in a plan file, in file order."""
+    batch = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get("type") != "op":
+                continue
+            directory = Path(record["dir"])
+            if batch is None or batch.path != directory:
+                if batch is not None:
+                    yield batch
+                batch = DirBatch(directory)
+            batch.add(record["kind"], record["src"], record["dst"], record["action"])
+    if batch is not None:
+        yield batch
+
+
+def apply_plan_file(path: Path, log_callback=default_logger, workers: int = 1,
+                    log_level: int = LOG_VERBOSE, control: Optional[RunControl] = None,
+                    dedupe: Optional[ContentDedupe] = None) -> RunStats:
+    """
+    Execute a plan file written by write_plan_file() without walking the tree
+    or evaluating the naming rules again. Operations whose source is gone
+    are skipped and counted in stats.skipped.
+    """
+    header = read_plan_header(path)
+    root = Path(header["root"])
+
+    _log_header(root, f"APPLY PLAN FILE {path}", log_callback)
+    if header.get("rules") != rules_fingerprint():
+        log_callback("NOTE: plan was made with different naming rules; applying it as written")
+
+    if workers > 1:
+        plan = RenamePlan(root=root, batches=list(iter_plan_file(path)))
+        stats = apply_plan(plan, log_callback, workers=workers, log_level=log_level, control=control, dedupe=dedupe)
+    else:
+        stats = RunStats()
+        for batch in iter_plan_file(path):
+            if control is not None:
+                stats.stopped = control.stop_reason()
+            if stats.stopped:
+                break
+            stats.add(apply_batch(batch, log_callback, log_level, control=control, dedupe=dedupe))
+
+    log_callback("\n" + "=" * 78)
+    log_callback(f"Completed operations: {stats.actions}")
+    log_callback(f"Skipped (source missing): {stats.skipped}")
+    if stats.stopped:
+        log_callback(f"Stopped early: {stats.stopped}; applying the same plan file again skips what is done")
+    log_callback("=" * 78)
+    return stats
+
+
+# ---------------------------
+# Journal recovery
+# ---------------------------
+
+def recover_tmp_entries(directory: Path, tmp_targets: Dict[str, str], log_callback=default_logger,
+                        log_level: int = LOG_VERBOSE) -> RunStats:
+    """
+    Finish renames that stopped between their two steps in directory.
+
+    tmp_targets maps a temp name to its final name (from the journal, or from
+    the planned op for the encoded original name). Each __tmp__ entry is moved
+    on to its final name with the usual overwrite/merge rules; if that fails
+    or no target is known, it is rolled back to its original name.
+    """
+    stats = RunStats()
+    for tmp_name, is_dir in find_tmp_entries(directory):
+        tmp_path = directory / tmp_name
+        src_name = original_name(tmp_name)
+        kind = "FOLDER" if is_dir else "FILE"
+        dst_name = tmp_targets.get(tmp_name)
+        try:
+            if dst_name is None:
+                raise OSError("final name unknown")
+            final_dst = directory / dst_name
+            target_is_dir = final_dst.is_dir() if os.path.lexists(final_dst) else None
+            _tmp_to_final(tmp_path, final_dst, kind, target_is_dir, log_callback, stats, log_level)
+            stats.actions += 1
+            log_callback(f"      RECOVERED {kind}: {tmp_path} -> {dst_name}")
+        except OSError as e:
+            try:
+                if not os.path.lexists(directory / src_name):
+                    tmp_path.rename(directory / src_name)
+                    log_callback(f"      ROLLED BACK {kind}: {tmp_path} -> {src_name} ({e})")
+                    continue
+            except OSError:
+                pass
+            log_callback(f"      ✖ COULD NOT RECOVER {kind}: {tmp_path}: {e}")
+    return stats
+
+
+def resume_from_journal(journal_path: Path, log_callback=default_logger, workers: int = 1,
+                        log_level: int = LOG_VERBOSE, control: Optional[RunControl] = None,
+                        dedupe: Optional[ContentDedupe] = None) -> RunStats:
+    """
+    Continue an interrupted apply run from its journal.
+
+    Only directories whose batch had begun but not finished are listed, to
+    sweep up their __tmp__ entries. Finished directories are skipped and the
+    remaining batches come from the plan stored in the journal, so the tree
+    is not walked again. Progress keeps being appended to the same journal,
+    so a run stopped by control (see apply_plan()) can be resumed again.
+    """
+    state = load_journal(journal_path)
+    _log_header(state.root, f"RESUME FROM JOURNAL {journal_path}", log_callback)
+    if state.finished:
+        log_callback("Journal says the run already completed; nothing to do.")
+        return RunStats()
+
+    planned_targets = {directory: {src: dst for _, src, dst, _ in ops} for directory, ops in state.plan}
+    stats = RunStats()
+
+    for directory in sorted(state.in_flight):
+        targets = {tmp: dst for (d, tmp), dst in state.tmp_targets.items() if d == directory}
+        for tmp_name, _ in find_tmp_entries(Path(directory)):
+            if tmp_name not in targets:
+                dst = planned_targets.get(directory, {}).get(original_name(tmp_name))
+                if dst is not None:
+                    targets[tmp_name] = dst
+        stats.add(recover_tmp_entries(Path(directory), targets, log_callback, log_level))
+
+    remaining = []
+    for directory, ops in state.plan:
+        if directory in state.done:
+            continue
+        path = Path(directory)
+        batch = DirBatch(path)
+        for kind, src, dst, action in ops:
+            batch.add(kind, src, dst, action)
+        remaining.append(batch)
+    log_callback(f"Resuming: {len(state.done)} folders already done, {len(remaining)} left")
+
+    journal = RenameJournal(journal_path)
+    try:
+        # Batches without a listing re-check each source, so renames finished before the crash are skipped
+        stats.add(apply_plan(RenamePlan(root=state.root, batches=remaining), log_callback,
+                             workers=workers, log_level=log_level, journal=journal, control=control,
+                             dedupe=dedupe))
+        if not stats.stopped:
+            journal.finish()
+    finally:
+        journal.close()
+
+    log_callback("\n" + "=" * 78)
+    log_callback(f"Completed operations: {stats.actions}")
+    log_callback(f"Already done before the interruption: {stats.skipped}")
+    if stats.stopped:
+        log_callback(f"Stopped early: {stats.stopped}; continue with --resume {journal_path}")
+    log_callback("=" * 78)
+    return stats
+
+
+# ---------------------------
+# Core logic
+# ---------------------------
+
+def _log_header(root: Path, mode: str, log_callback):
+    log_callback("=" * 78)
+    log_callback(f"ROOT: {root}")
+    log_callback(f"MODE: {mode}")
+    if _rules.ruleset == DEFAULT_RULES:
+        log_callback("RULES: folders -> ALL CAPS + remove ' (n)' | files -> clean '(n)', stem lower, first char upper")
+    else:
+        log_callback(f"RULES (custom): {_rules.ruleset.describe()}")
+    log_callback("NOTE: if target exists -> OVERWRITE (folders are MERGED with overwrites)")
+    log_callback("=" * 78)
+
+
+def export_plan(root: Path, out_path: Path, log_callback=default_logger, log_level: int = LOG_CHANGES,
+                index=None, control: Optional[RunControl] = None,
+                path_filter: Optional[PathFilter] = None) -> RenamePlan:
+    """
+    Dry run that streams the plan to out_path for review and a later apply_plan_file().
+    Paths are written absolute, so the file can be applied from any working directory.
+    """
+    if not root.exists():
+        raise FileNotFoundError(f"Path not found: {root}")
+    root = root.resolve()
+
+    _log_header(root, f"PLAN TO FILE {out_path}", log_callback)
+    plan = RenamePlan(root=root, path_filter=path_filter)
+    count = write_plan_file(plan, out_path, log_callback, log_level, index, control)
+
+    log_callback("\n" + "=" * 78)
+    log_callback(f"Visited folders: {plan.visited_dirs}")
+    log_callback(f"Visited files:   {plan.visited_files}")
+    if index is not None:
+        log_callback(index.summary())
+    log_callback(f"Planned operations: {count} (written to {out_path})")
+    log_callback("=" * 78)
+    return plan
+
+
+def count_planned(stats: RunStats, records):
+    """Count planned (kind, src_name, dst_name, action) records by action."""
+    for _, _, _, action in records:
+        stats.actions += 1
+        if action == ACTION_MERGE:
+            stats.merges += 1
+        elif action == ACTION_OVERWRITE:
+            stats.overwrites += 1
+        elif action == ACTION_DROP:
+            stats.dropped += 1
+        else:
+            stats.renames += 1
+
+
+def rename_tree(root: Path, dry_run: bool, log_callback=default_logger, plan: Optional[RenamePlan] = None,
+                workers: int = 1, log_level: int = LOG_VERBOSE, index=None, journal=None,
+                always_temp: bool = False, progress=None, control: Optional[RunControl] = None,
+                stream: bool = False, path_filter: Optional[PathFilter] = None,
+                dedupe: Optional[ContentDedupe] = None) -> RunStats:
+    """
+    Plan and (unless dry_run) apply the renames for root.
+    Pass a plan from an earlier dry run to apply it without walking the tree again.
+    workers > 1 applies renames in sibling directories concurrently.
+    log_level is one of LOG_SUMMARY / LOG_CHANGES / LOG_VERBOSE; lines above it are never formatted.
+    index is an optional rename_index.RenameIndex used to skip unchanged directories.
+    journal is an optional rename_journal.RenameJournal; with it an interrupted
+    apply can be finished by resume_from_journal().
+    always_temp disables the single-step rename on filesystems that allow it.
+
+    progress is an optional callback taking a progress.Progress, called a few
+    times per second from the running thread. With it the tree is first
+    counted by prescan_tree() (the planning pass reuses those listings), so
+    every phase has a total and an ETA.
+    control is an optional run_control.RunControl. Cancelling it during the
+    scan or planning raises Cancelled before anything is renamed; during the
+    apply pass the run stops between entries (or, when its time budget is
+    used up, between directories) and stats.stopped says why. With a journal
+    the rest can then be done with resume_from_journal().
+    stream renames while the tree is walked (see apply_stream()) instead of
+    planning everything first; the plan is not kept, so it can't be combined
+    with plan or journal.
+    path_filter (a path_filter.PathFilter) leaves matching entries alone and
+    prunes excluded folders from the walk; a saved plan keeps its own filter.
+    dedupe (a content_dedupe.ContentDedupe) deletes files that would
+    overwrite an identical file instead of replacing it; dry runs don't
+    compare contents.
+
+    Returns the RunStats of the run (for a dry run: the planned operations);
+    the plan that was used is attached as stats.plan.
+    """
+    if not root.exists():
+        raise FileNotFoundError(f"Path not found: {root}")
+    if stream and (plan is not None or journal is not None):
+        raise ValueError("stream can't be combined with a saved plan or a journal")
+
+    start = time.perf_counter()
+    stats = RunStats()
+    timed_log = _TimedLog(log_callback)
+    _log_header(root, 'DRY RUN' if dry_run else 'APPLY (OVERWRITE ENABLED)', timed_log)
+    # When applying, changes are reported once by the apply pass
+    plan_level = log_level if dry_run or log_level >= LOG_VERBOSE else LOG_SUMMARY
+
+    if stream:
+        plan = RenamePlan(root=root, path_filter=path_filter)
+        batches = iter_plan(plan, timed_log, plan_level, index, keep_mtimes=False, control=control,
+                            chunk=STREAM_CHUNK)
+        if dry_run:
+            for batch in batches:
+                count_planned(stats, batch.records())
+        else:
+            apply_progress = ProgressTracker(progress, "apply") if progress is not None else None
+            stats.add(apply_stream(batches, root, log_callback, workers, log_level, always_temp, apply_progress,
+                                   control, dedupe=dedupe))
+        stats.add(plan.stats)
+        # Planning overlaps renaming here; count what is left of the wall time
+        stats.time_planning = max(0.0, time.perf_counter() - start - stats.time_listing - stats.time_renaming
+                                  - stats.time_merging - stats.time_logging - timed_log.seconds)
+    else:
+        if plan is None:
+            listings = plan_progress = None
+            if progress is not None:
+                scan = prescan_tree(root, max(workers, PRESCAN_WORKERS), index, control,
+                                    ProgressTracker(progress, "scan"), path_filter)
+                listings = scan.listings
+                plan_progress = ProgressTracker(progress, "plan", scan.entries)
+                del scan
+            plan = plan_tree(root, timed_log, plan_level, index=index, listings=listings, control=control,
+                             progress=plan_progress, path_filter=path_filter)
+            listings = None  # batches keep what apply needs
+            stats.add(plan.stats)
+            stats.time_planning = max(0.0, time.perf_counter() - start - plan.stats.time_listing - timed_log.seconds)
+        else:
+            timed_log(f"Reusing plan from previous dry run ({plan.operation_count} operations)")
+
+        if dry_run:
+            for batch in plan.batches:
+                count_planned(stats, batch.records())
+        else:
+            if journal is not None:
+                journal.write_plan(root, plan.batches)
+            apply_progress = None
+            if progress is not None:
+                apply_progress = ProgressTracker(progress, "apply", plan.operation_count)
+            stats.add(apply_plan(plan, log_callback, workers=workers, log_level=log_level, journal=journal,
+                                 always_temp=always_temp, progress=apply_progress, control=control, dedupe=dedupe))
+            if journal is not None and not stats.stopped:
+                journal.finish()
+    stats.plan = plan
+    stats.syscalls_avoided += plan.syscalls_avoided
+
+    stats.time_logging += timed_log.seconds
+    stats.time_total = time.perf_counter() - start
+
+    log_callback("\n" + "=" * 78)
+    log_callback(f"Visited folders: {plan.visited_dirs}")
+    log_callback(f"Visited files:   {plan.visited_files}")
+    if plan.skipped_dirs:
+        log_callback(f"Skipped folders (unchanged): {plan.skipped_dirs}")
+    if index is not None:
+        log_callback(index.summary())
+    log_callback(f"{'Planned' if dry_run else 'Completed'} operations: {stats.actions}")
+    log_callback(f"Metadata syscalls avoided: {stats.syscalls_avoided}")
+    if stats.direct_renames or stats.temp_hops:
+        log_callback(f"Renames: {stats.direct_renames} direct, {stats.temp_hops} via temp name")
+    if stats.merge_bulk or stats.merge_individual:
+        log_callback(f"Merged: {stats.merge_bulk} folders moved in bulk, {stats.merge_individual} files moved individually")
+    for line in stats.summary_lines():
+        log_callback(line)
+    if dedupe is not None and dedupe.summary():
+        log_callback(dedupe.summary())
+    if stats.stopped and journal is not None:
+        log_callback(f"The rest of the plan is kept in {journal.path}; continue with --resume {journal.path}")
+    log_callback("=" * 78)
+
+    return stats
+
+
+def write_stats_json(stats, path: Path):
+    """
+    Write stats.to_dict() (a RunStats, or the tree_watch.WatchStats of a
+    watch run) to path as JSON, for dashboards and run-to-run comparisons.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(stats.to_dict(), f, indent=2)
+
+
+# ---------------------------
+# Multiple roots
+# ---------------------------
+
+def read_roots_file(path: Path) -> List[str]:
+    """Roots listed one per line; blank lines and lines starting with '#' are ignored."""
+    roots = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                roots.append(line)
+    return roots
+
+
+def find_overlapping_roots(roots: List[str]) -> List[Tuple[str, str]]:
+    """(outer, inner) for every root that is the same folder as, or lies inside, another root."""
+    keyed = sorted((Path(os.path.normcase(os.path.realpath(root))).parts, root) for root in roots)
+    overlaps = []
+    outer = None
+    for parts, root in keyed:
+        # Sorted by path components, everything inside a folder directly follows it
+        if outer is not None and parts[:len(outer[0])] == outer[0]:
+            overlaps.append((outer[1], root))
+        else:
+            outer = (parts, root)
+    return overlaps
+
+
+@dataclass
+class RootResult:
+    """Outcome of one root in a multi-root run."""
+    root: str
+    log_path: str
+    stats: Optional[RunStats] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+
+def _root_log_name(root: str, taken: set) -> str:
+    name = re.sub(r"[^\w.-]+", "_", root).strip("_") or "root"
+    candidate, n = name, 1
+    while candidate.lower() in taken:
+        n += 1
+        candidate = f"{name}_{n}"
+    taken.add(candidate.lower())
+    return candidate + ".log"
+
+
+# Seconds between checks of the parent's control while roots run in processes
+ROOT_CANCEL_POLL_SECONDS = 0.2
+
+# In run_roots() pool processes: event the parent sets to cancel, and the control of the running root
+_roots_cancelled = None
+_root_control: Optional[RunControl] = None
+
+
+def _init_root_process(cancelled):
+    """Pool process initializer: once cancelled is set, the running root stops and queued ones don't start."""
+    global _roots_cancelled
+    _roots_cancelled = cancelled
+
+    def watch():
+        cancelled.wait()
+        if _root_control is not None:
+            _root_control.cancel()
+
+    threading.Thread(target=watch, daemon=True).start()
+
+
+def _run_root(root: str, log_path: str, options: dict, control: Optional[RunControl] = None,
+              rules: Optional[RuleSet] = None) -> Optional[RootResult]:
+    """
+    Run rename_tree() for one root with its log going to log_path. Runs in a
+    pool process; returns None if the run was cancelled before the root started.
+    """
+    global _root_control
+    if rules is not None:
+        set_rules(rules)
+    if control is None:
+        if _roots_cancelled is not None and _roots_cancelled.is_set():
+            return None
+        # Own process: Ctrl+C reaches every process of the group, each stops at a safe point
+        control = _root_control = RunControl()
+        if _roots_cancelled is not None and _roots_cancelled.is_set():
+            control.cancel()
+        signal.signal(signal.SIGINT, lambda signum, frame: control.cancel())
+    result = RootResult(root, log_path)
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log_file:
+        def log(msg):
+            log_file.write(msg + "\n")
+
+        try:
+            stats = rename_tree(Path(root), log_callback=log, control=control, **options)
+            stats.plan = None  # stays in this process
+            result.stats = stats
+        except Cancelled:
+            result.error = "cancelled before anything was renamed"
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+            log(f"ERROR: {result.error}")
+        finally:
+            if options.get("dedupe") is not None:
+                options["dedupe"].close()  # commits this process's hash cache rows
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def run_roots(roots: List[str], options: dict, root_workers: int = 1, log_dir: Optional[Path] = None,
+              log_callback=default_logger, control: Optional[RunControl] = None) -> List[RootResult]:
+    """
+    Run rename_tree(**options) for every root, up to root_workers roots at a
+    time in separate processes. Roots must not overlap (see
+    find_overlapping_roots()).
+
+    Each root logs to its own file in log_dir. Without log_dir the logs go
+    to temp files that are copied to log_callback in one block as each root
+    finishes, so lines of different roots never interleave. Returns one
+    RootResult per root, in the order given.
+
+    Cancelling control stops the running roots at their next safe point;
+    roots that haven't started are reported as "not started (cancelled)".
+    """
+    keep_logs = log_dir is not None
+    if not keep_logs:
+        log_dir = Path(tempfile.mkdtemp(prefix="FileRenamer_roots_"))
+    taken = set()
+    log_paths = [str(log_dir / _root_log_name(root, taken)) for root in roots]
+    results: List[Optional[RootResult]] = [None] * len(roots)
+
+    def finished(i, result):
+        results[i] = result
+        if keep_logs:
+            log_callback(f"Finished {result.root} (log: {result.log_path})")
+            return
+        log_callback(f"\n##### {result.root} #####")
+        with open(result.log_path, encoding="utf-8") as f:
+            for line in f:
+                log_callback(line.rstrip("\n"))
+        os.remove(result.log_path)
+
+    try:
+        if root_workers <= 1:
+            for i, root in enumerate(roots):
+                if control is not None and control.cancelled:
+                    break
+                finished(i, _run_root(root, log_paths[i], options, control))
+        else:
+            cancelled = multiprocessing.Event()
+            with ProcessPoolExecutor(max_workers=root_workers, initializer=_init_root_process,
+                                     initargs=(cancelled,)) as pool:
+                # Pool processes start with the default rules (spawn), so hand them the active ones
+                rules = _rules.ruleset
+                futures = {pool.submit(_run_root, root, log_paths[i], options, None, rules): i
+                           for i, root in enumerate(roots)}
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, timeout=ROOT_CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result = None if future.cancelled() else future.result()
+                        if result is not None:
+                            finished(futures[future], result)
+                    if control is not None and control.cancelled and not cancelled.is_set():
+                        # Queued roots never start, running ones stop at their next safe point
+                        cancelled.set()
+                        pool.shutdown(wait=False, cancel_futures=True)
+                    # Futures cancelled by the shutdown are never reported done by wait()
+                    pending = {future for future in pending if not future.cancelled()}
+    finally:
+        if not keep_logs:
+            shutil.rmtree(log_dir, ignore_errors=True)
+
+    for i, root in enumerate(roots):
+        if results[i] is None:
+            results[i] = RootResult(root, log_paths[i], error="not started (cancelled)")
+    return results
+
+
+def log_roots_report(results: List[RootResult], log_callback=default_logger) -> RunStats:
+    """Print one line per root plus the totals; returns the combined stats."""
+    total = RunStats()
     log_callback("\n" + "=" * 78)
-    log_callback(f"Visited folders: {visited_dirs}")
-    log_callback(f"Visited files:   {visited_files}")
-    log_callback(f"{'Planned' if dry_run else 'Completed'} operations: {actions}")
+    log_callback(f"{'ROOT':<40} {'RESULT':<10} {'CHANGES':>8} {'ERRORS':>7} {'TIME':>8}")
+    for result in results:
+        if result.stats is not None:
+            total.add(result.stats)
+            status = "stopped" if result.stats.stopped else "ok"
+            log_callback(f"{result.root:<40} {status:<10} {result.stats.actions:>8} {result.stats.errors:>7} "
+                         f"{result.seconds:>7.1f}s")
+        else:
+            log_callback(f"{result.root:<40} {'FAILED':<10} {'-':>8} {'-':>7} {result.seconds:>7.1f}s")
+            log_callback(f"    {result.error}")
+    failed = sum(1 for r in results if r.stats is None)
+    log_callback(f"Roots: {len(results)} ({failed} failed) | changes: {total.actions} | errors: {total.errors}")
     log_callback("=" * 78)
+    return total
+
+
+def write_roots_json(results: List[RootResult], total: RunStats, path: Path):
+    report = {
+        "roots": [{"root": r.root, "log": r.log_path, "seconds": r.seconds, "error": r.error,
+                   "stats": r.stats.to_dict() if r.stats is not None else None} for r in results],
+        "total": total.to_dict(),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
 
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Recursive renamer: folders ALL CAPS, files first-char caps (rest lowercase), remove '(n)', overwrite enabled."
+        description="Recursive renamer: folders ALL CAPS, files first-char caps (rest lowercase), remove '(n)', "
+                    "overwrite enabled. --rules replaces these naming rules."
     )
-    parser.add_argument("root", help="Root path (Z:\\... or \\\\server\\share\\...)")
+    parser.add_argument("root", nargs="*", help="Root path(s) (Z:\\... or \\\\server\\share\\...)")
+    parser.add_argument("--roots-file", metavar="FILE",
+                        help="Also process the roots listed in FILE (one per line, '#' starts a comment)")
+    parser.add_argument("--root-workers", type=int, default=1,
+                        help="With several roots: process up to N roots at once, each in its own process (default 1)")
+    parser.add_argument("--log-dir", metavar="DIR",
+                        help="With several roots: write one log file per root here instead of printing them")
     parser.add_argument("--apply", action="store_true", help="Apply changes (default is dry run)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Rename in up to N directories at once (helps on SMB/UNC shares, default 1)")
+    parser.add_argument("--log-level", choices=list(LOG_LEVELS), default="changes",
+                        help="summary: counters only | changes: one line per change (default) | verbose: every entry")
+    parser.add_argument("--index", metavar="PATH",
+                        help="SQLite file remembering already-normalized folders so reruns skip them (must be outside root)")
+    parser.add_argument("--plan-out", metavar="PLAN.jsonl",
+                        help="Dry run that streams every planned operation to this file for review")
+    parser.add_argument("--apply-plan", metavar="PLAN.jsonl",
+                        help="Apply a plan file written by --plan-out without walking the tree again")
+    parser.add_argument("--journal", metavar="JOURNAL",
+                        help="With --apply: write a crash-safe journal so an interrupted run can be resumed")
+    parser.add_argument("--always-temp", action="store_true",
+                        help="Rename every entry via a temp name, even where the filesystem doesn't need it")
+    parser.add_argument("--resume", metavar="JOURNAL",
+                        help="Finish an interrupted --apply run from its journal (no root needed)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Rename while the tree is still being scanned, with bounded memory (no plan is kept; "
+                             "not with --journal)")
+    parser.add_argument("--time-budget", type=float, metavar="SECONDS",
+                        help="With --journal, --resume or --apply-plan: start no new folder after this many seconds; "
+                             "running the same command again (--resume for a journal) continues where it stopped")
+    parser.add_argument("--rules", metavar="RULES.json",
+                        help="Naming rules to use instead of the built-in ones (casing, '(n)' stripping, numbered "
+                             "prefixes, extensions, per-extension overrides; see README)")
+    parser.add_argument("--include", action="append", default=[], metavar="PATTERN",
+                        help="Only rename entries matching PATTERN (glob on the name, glob with '/' on the path "
+                             "below the root, or 're:REGEX'); repeatable")
+    parser.add_argument("--exclude", action="append", default=[], metavar="PATTERN",
+                        help="Leave entries matching PATTERN alone and don't walk matching folders at all "
+                             "(e.g. .git, node_modules); same syntax as --include, repeatable")
+    parser.add_argument("--max-depth", type=int, metavar="N",
+                        help="Rename at most N levels below the root (1 = only its direct entries)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Linux: after one full pass keep running and normalize entries as they are created or "
+                             "moved into the tree (stop with Ctrl+C)")
+    parser.add_argument("--settle", type=float, default=2.0, metavar="SECONDS",
+                        help="With --watch: rename a new entry only after it has been quiet this long (default 2)")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="When a file would overwrite a file with the same contents (size, then hash), delete the "
+                             "duplicate instead of replacing the target")
+    parser.add_argument("--hash-cache", metavar="PATH",
+                        help="With --dedupe: SQLite file keeping file hashes by path, size and mtime between runs "
+                             "(must be outside root)")
+    parser.add_argument("--stats-json", metavar="PATH",
+                        help="Write counters, phase timings and latency histograms of the run to this JSON file "
+                             "(per root and in total with several roots)")
     args = parser.parse_args()
 
-    rename_tree(Path(args.root), dry_run=not args.apply)
+    if args.workers < 1 or args.root_workers < 1:
+        parser.error("--workers and --root-workers must be at least 1")
+    if args.max_depth is not None and args.max_depth < 1:
+        parser.error("--max-depth must be at least 1")
+    if args.time_budget is not None and not (args.journal or args.resume or args.apply_plan):
+        parser.error("--time-budget needs --journal, --resume or --apply-plan to continue where the run stopped")
+    if args.hash_cache and not args.dedupe:
+        parser.error("--hash-cache is only used together with --dedupe")
+    args.dedupe = ContentDedupe(Path(args.hash_cache).resolve() if args.hash_cache else None) if args.dedupe else None
+    log_level = LOG_LEVELS[args.log_level]
+    filters = {}
+    if args.rules:
+        try:
+            config = read_config(Path(args.rules))
+            set_rules(parse_rules(config))
+            filters = config.get("filters", {})
+        except (OSError, ValueError) as e:
+            parser.error(f"--rules: {e}")
+    # Patterns given on the command line add to those of the rules file, --max-depth replaces its limit
+    filters = dict(filters, include=filters.get("include", []) + args.include,
+                   exclude=filters.get("exclude", []) + args.exclude)
+    if args.max_depth is not None:
+        filters["max_depth"] = args.max_depth
+    try:
+        args.path_filter = parse_filters(filters)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # First Ctrl+C stops at the next safe point, a second one interrupts right away
+    control = RunControl(args.time_budget)
+
+    def stop_gracefully(signum, frame):
+        print("\nStopping after the current entry (press Ctrl+C again to abort)...")
+        control.cancel()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    signal.signal(signal.SIGINT, stop_gracefully)
+
+    roots = list(args.root)
+    if args.roots_file:
+        roots += read_roots_file(Path(args.roots_file))
+    if len(roots) > 1 or args.roots_file:
+        _main_roots(parser, args, roots, log_level, control)
+        return
+    args.root = roots[0] if roots else None
+    if (args.resume or args.apply_plan) and (args.include or args.exclude or args.max_depth is not None):
+        parser.error("--include, --exclude and --max-depth apply when planning, not to --resume or --apply-plan")
+
+    if args.watch and (args.resume or args.apply_plan):
+        parser.error("--watch needs a root, not --resume or --apply-plan")
+
+    if args.resume:
+        if args.root or args.apply_plan or args.plan_out or args.journal:
+            parser.error("--resume takes no root, --apply-plan, --plan-out or --journal")
+        try:
+            stats = resume_from_journal(Path(args.resume), workers=args.workers, log_level=log_level,
+                                        control=control, dedupe=args.dedupe)
+        finally:
+            if args.dedupe is not None:
+                args.dedupe.close()
+        if args.stats_json:
+            write_stats_json(stats, Path(args.stats_json))
+        return
+
+    if args.apply_plan:
+        if args.root or args.plan_out or args.index:
+            parser.error("--apply-plan takes no root, --plan-out or --index (the root is stored in the plan)")
+        try:
+            stats = apply_plan_file(Path(args.apply_plan), workers=args.workers, log_level=log_level,
+                                    control=control, dedupe=args.dedupe)
+        finally:
+            if args.dedupe is not None:
+                args.dedupe.close()
+        if args.stats_json:
+            write_stats_json(stats, Path(args.stats_json))
+        return
+
+    if not args.root:
+        parser.error("root is required")
+    if args.plan_out and args.apply:
+        parser.error("--plan-out only plans; apply the file afterwards with --apply-plan")
+    if args.journal and not args.apply:
+        parser.error("--journal is only used together with --apply")
+    if args.dedupe is not None and not args.apply:
+        parser.error("--dedupe only changes what --apply does (a dry run doesn't compare contents)")
+    if args.stream and (args.journal or args.plan_out):
+        parser.error("--stream keeps no plan, so it can't be combined with --journal or --plan-out")
+    if args.watch and (args.journal or args.plan_out or args.index or args.stream or args.time_budget is not None):
+        parser.error("--watch can't be combined with --journal, --plan-out, --index, --stream or --time-budget")
+
+    # Plan files, journals and the index record absolute paths, whatever the working directory
+    root = Path(args.root).resolve()
+    for option, value in (("--plan-out", args.plan_out), ("--journal", args.journal),
+                          ("--stats-json", args.stats_json), ("--hash-cache", args.hash_cache)):
+        if value and root in Path(value).resolve().parents:
+            parser.error(f"{option} must be written outside the tree being renamed")
+    index = None
+    if args.index:
+        index_path = Path(args.index).resolve()
+        if root in index_path.parents:
+            parser.error("--index must be stored outside the tree being renamed")
+        fingerprint = rules_fingerprint()
+        if args.path_filter is not None:
+            # Folders recorded as done under one filter may hold entries another filter would rename
+            fingerprint += ":" + args.path_filter.fingerprint
+        index = RenameIndex(index_path, fingerprint)
+
+    if args.watch:
+        _main_watch(parser, args, root, log_level, control)
+        return
+
+    journal = RenameJournal(Path(args.journal)) if args.journal else None
+
+    try:
+        if args.plan_out:
+            stats = export_plan(root, Path(args.plan_out), log_level=log_level, index=index, control=control,
+                                path_filter=args.path_filter).stats
+        else:
+            stats = rename_tree(root, dry_run=not args.apply, workers=args.workers, log_level=log_level, index=index,
+                                journal=journal, always_temp=args.always_temp, control=control, stream=args.stream,
+                                path_filter=args.path_filter, dedupe=args.dedupe)
+        if args.stats_json:
+            write_stats_json(stats, Path(args.stats_json))
+    except Cancelled:
+        print("Cancelled before anything was renamed.")
+    finally:
+        if index is not None:
+            index.close()
+        if journal is not None:
+            journal.close()
+        if args.dedupe is not None:
+            args.dedupe.close()
+
+
+def _main_watch(parser, args, root: Path, log_level: int, control: RunControl):
+    """main() for --watch: run until Ctrl+C, then print (and optionally save) the counters."""
+    from tree_watch import watch_tree  # tree_watch builds on this module
+
+    if args.settle < 0:
+        parser.error("--settle can't be negative")
+    try:
+        stats = watch_tree(root, dry_run=not args.apply, log_level=log_level, always_temp=args.always_temp,
+                           path_filter=args.path_filter, control=control, settle=args.settle, workers=args.workers,
+                           dedupe=args.dedupe)
+    except Cancelled:
+        print("Cancelled before anything was renamed.")
+        return
+    except OSError as e:
+        parser.error(f"--watch: {e}")
+    finally:
+        if args.dedupe is not None:
+            args.dedupe.close()
+    if args.stats_json:
+        write_stats_json(stats, Path(args.stats_json))
+
+
+def _main_roots(parser, args, roots: List[str], log_level: int, control: RunControl):
+    """main() for several roots: validate them, run them and print the combined report."""
+    single_root_only = ("index", "plan_out", "apply_plan", "journal", "resume", "time_budget", "watch")
+    used = [f"--{name.replace('_', '-')}" for name in single_root_only if getattr(args, name)]
+    if used:
+        parser.error(f"{', '.join(used)} can only be used with a single root")
+    if args.dedupe is not None and not args.apply:
+        parser.error("--dedupe only changes what --apply does (a dry run doesn't compare contents)")
+    if not roots:
+        parser.error("the roots file lists no roots")
+    overlaps = find_overlapping_roots(roots)
+    if overlaps:
+        parser.error("overlapping roots: " + "; ".join(f"{inner} is inside {outer}" for outer, inner in overlaps))
+    missing = [root for root in roots if not os.path.isdir(root)]
+    if missing:
+        parser.error("root not found: " + ", ".join(missing))
+    for option, value in (("--stats-json", args.stats_json), ("--log-dir", args.log_dir),
+                          ("--hash-cache", args.hash_cache)):
+        if value and any(Path(os.path.realpath(root)) in Path(os.path.realpath(value)).parents for root in roots):
+            parser.error(f"{option} must be outside every root")
+
+    log_dir = None
+    if args.log_dir:
+        log_dir = Path(args.log_dir)
+        log_dir.mkdir(parents=True, exist_ok=True)
+    options = {"dry_run": not args.apply, "workers": args.workers, "log_level": log_level,
+               "always_temp": args.always_temp, "stream": args.stream, "path_filter": args.path_filter,
+               "dedupe": args.dedupe}
+    results = run_roots(roots, options, args.root_workers, log_dir, control=control)
+    total = log_roots_report(results)
+    if args.stats_json:
+        write_roots_json(results, total, Path(args.stats_json))
+    if any(result.error for result in results):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Optional
+
+
+class FsCapabilities(NamedTuple):
+    """What a filesystem lets the renamer skip."""
+    case_sensitive: bool       # "a" and "A" are different entries
+    replace_overwrites: bool   # os.replace() swaps an existing file in one call
+
+
+# Used when a filesystem can't be probed (e.g. read-only): behave like the original two-step rename
+CONSERVATIVE = FsCapabilities(case_sensitive=False, replace_overwrites=False)
+
+_cache: Dict[int, FsCapabilities] = {}
+_case_cache: Dict[int, bool] = {}
+_lock = threading.Lock()
+
+
+def probe_directory(directory: Path) -> FsCapabilities:
+    """
+    Probe the filesystem holding directory by creating and renaming two
+    scratch files in it. Costs a handful of syscalls, so callers should go
+    through capabilities_for(), which caches the answer per device.
+    """
+    token = uuid.uuid4().hex
+    lower = Path(directory) / f".__probe__{token}__a"
+    upper = Path(directory) / f".__probe__{token}__A"
+    other = Path(directory) / f".__probe__{token}__b"
+    try:
+        lower.touch(exist_ok=False)
+    except OSError:
+        return CONSERVATIVE
+
+    try:
+        case_sensitive = not os.path.lexists(upper)
+        try:
+            other.touch(exist_ok=False)
+            os.replace(other, lower)
+            replace_overwrites = not os.path.lexists(other)
+        except OSError:
+            replace_overwrites = False
+        return FsCapabilities(case_sensitive, replace_overwrites)
+    finally:
+        for path in (other, lower):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+def capabilities_for(directory: Path, dev: Optional[int] = None) -> FsCapabilities:
+    """
+    Capabilities of the filesystem holding directory, probed once per device
+    (st_dev) for the lifetime of the process. Pass dev if it is already known.
+    """
+    if dev is None:
+        try:
+            dev = os.stat(directory).st_dev
+        except OSError:
+            return CONSERVATIVE
+    caps = _cache.get(dev)
+    if caps is not None:
+        return caps
+    with _lock:
+        caps = _cache.get(dev)
+        if caps is None:
+            caps = probe_directory(directory)
+            _cache[dev] = caps
+    return caps
+
+
+def case_sensitivity(directory: Path, names: Iterable[str], dev: Optional[int] = None) -> Optional[bool]:
+    """
+    Whether the filesystem holding directory is case-sensitive, found without
+    writing anything (so it is safe during a dry run): one of the listed names
+    is looked up with its case swapped. Cached per device like
+    capabilities_for(). None while it can't be told, e.g. no listed name has
+    letters.
+    """
+    if dev is None:
+        try:
+            dev = os.stat(directory).st_dev
+        except OSError:
+            return None
+    known = _case_cache.get(dev)
+    if known is not None:
+        return known
+    caps = _cache.get(dev)
+    if caps is not None and caps is not CONSERVATIVE:
+        return caps.case_sensitive
+    listed = set(names)
+    for name in listed:
+        swapped = name.swapcase()
+        if swapped == name or swapped.swapcase() != name:
+            continue
+        # Two entries that only differ in case can only exist on a case-sensitive filesystem
+        case_sensitive = swapped in listed or not os.path.lexists(os.path.join(directory, swapped))
+        with _lock:
+            _case_cache[dev] = case_sensitive
+        return case_sensitive
+    return None
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+        _case_cache.clear()
@@ -1,27 +1,206 @@
 import customtkinter as ctk
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, ttk
 import threading
 from pathlib import Path
 import file_renamer
+from content_dedupe import ContentDedupe
+from path_filter import PathFilter, split_patterns
+from log_sink import BufferedLogSink
+from preview_model import PlanPreview, plan_mismatch
+from progress import format_progress
+from run_control import RunControl
 
 # Configure appearance
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("blue")
 
+LOG_FLUSH_MS = 100      # how often queued log lines are pushed into the textbox
+MAX_LOG_LINES = 5000    # lines kept in the textbox, older ones go to a log file
+
+LOG_LEVEL_CHOICES = {
+    "Summary": file_renamer.LOG_SUMMARY,
+    "Changes only": file_renamer.LOG_CHANGES,
+    "Verbose": file_renamer.LOG_VERBOSE,
+}
+
+PREVIEW_COLUMNS = (("apply", "Apply", 50), ("folder", "Folder", 220), ("old", "Old name", 220),
+                   ("new", "New name", 220), ("action", "Action", 90), ("collision", "Collision", 70))
+
+
+class PreviewTable(ctk.CTkFrame):
+    """
+    Dry-run plan as a table. Only the rows that fit on screen exist as
+    Treeview items; scrolling just swaps their values, so it stays fast with
+    a million planned operations. Click a header to sort, use the check boxes
+    to filter by action, and Space or double-click to (de)select a row.
+    """
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+        self.model = None
+        self.offset = 0
+        self.visible = 20
+
+        self.toolbar = ctk.CTkFrame(self, fg_color="transparent")
+        self.toolbar.pack(side="top", fill="x")
+        self.action_vars = {}
+        for action in file_renamer.ACTIONS:
+            var = ctk.BooleanVar(value=True)
+            ctk.CTkCheckBox(self.toolbar, text=action.title(), variable=var, command=self.apply_filter,
+                            width=100).pack(side="left", padx=5, pady=5)
+            self.action_vars[action] = var
+        ctk.CTkButton(self.toolbar, text="Deselect shown", width=110,
+                      command=lambda: self.select_shown(False)).pack(side="right", padx=5, pady=5)
+        ctk.CTkButton(self.toolbar, text="Select shown", width=110,
+                      command=lambda: self.select_shown(True)).pack(side="right", padx=5, pady=5)
+        self.label_count = ctk.CTkLabel(self.toolbar, text="Run a dry run to preview the changes.")
+        self.label_count.pack(side="left", padx=10)
+
+        self.table_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.table_frame.pack(side="top", fill="both", expand=True)
+        self.tree = ttk.Treeview(self.table_frame, columns=[c[0] for c in PREVIEW_COLUMNS], show="headings",
+                                 selectmode="browse")
+        for column, title, width in PREVIEW_COLUMNS:
+            self.tree.heading(column, text=title, command=lambda c=column: self.sort_by(c))
+            self.tree.column(column, width=width, stretch=column in ("folder", "old", "new"))
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scrollbar = ctk.CTkScrollbar(self.table_frame, command=self.on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll_to(self.offset - e.delta // 120 * 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll_to(self.offset - 3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_to(self.offset + 3))
+        self.tree.bind("<space>", self.toggle_focused)
+        self.tree.bind("<Double-1>", self.toggle_focused)
+        self.tree.bind("<Up>", lambda e: self.move_focus(-1))
+        self.tree.bind("<Down>", lambda e: self.move_focus(1))
+        self.tree.bind("<Prior>", lambda e: self.move_focus(-self.visible))
+        self.tree.bind("<Next>", lambda e: self.move_focus(self.visible))
+
+    def set_plan(self, plan):
+        """Show plan (None clears the table)."""
+        self.model = PlanPreview(plan) if plan is not None else None
+        for var in self.action_vars.values():
+            var.set(True)
+        self.offset = 0
+        self.refresh()
+
+    def selected_plan(self):
+        return self.model.selected_plan() if self.model is not None else None
+
+    def refresh(self):
+        """Put the rows at offset into the Treeview items (the only rows that exist)."""
+        self.tree.delete(*self.tree.get_children())
+        model = self.model
+        if model is None:
+            self.label_count.configure(text="Run a dry run to preview the changes.")
+            self.scrollbar.set(0, 1)
+            return
+        total = len(model.view)
+        for i, (selected, folder, old, new, action, collision) in enumerate(model.rows(self.offset, self.visible)):
+            self.tree.insert("", "end", iid=str(self.offset + i),
+                             values=("✔" if selected else "", folder, old, new, action, "⚠" if collision else ""))
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible) / total))
+        else:
+            self.scrollbar.set(0, 1)
+        self.label_count.configure(text=f"{total} shown | {model.selected_count} of {len(model)} selected")
+
+    def scroll_to(self, offset):
+        if self.model is None:
+            return
+        offset = max(0, min(offset, len(self.model.view) - self.visible))
+        if offset != self.offset:
+            self.offset = offset
+            self.refresh()
+
+    def on_scroll(self, *args):
+        if self.model is None:
+            return
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.model.view)))
+        elif args[0] == "scroll":
+            step = self.visible if args[2] == "pages" else 1
+            self.scroll_to(self.offset + int(args[1]) * step)
+
+    def on_resize(self, event):
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        visible = max(1, (event.height - row_height) // row_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.refresh()
+
+    def sort_by(self, column):
+        if self.model is None or column == "apply":
+            return
+        descending = self.model.sort_column == column and not self.model.descending
+        self.model.sort(column, descending)
+        self.offset = 0
+        self.refresh()
+
+    def apply_filter(self):
+        if self.model is None:
+            return
+        self.model.filter(a for a, var in self.action_vars.items() if var.get())
+        self.offset = 0
+        self.refresh()
+
+    def select_shown(self, selected):
+        if self.model is not None:
+            self.model.select_shown(selected)
+            self.refresh()
+
+    def focused_position(self):
+        focus = self.tree.focus()
+        return int(focus) if focus else None
+
+    def toggle_focused(self, event=None):
+        position = self.focused_position()
+        if self.model is None or position is None:
+            return "break"
+        self.model.toggle(position)
+        self.refresh()
+        self.tree.focus(str(position))
+        self.tree.selection_set(str(position))
+        return "break"
+
+    def move_focus(self, step):
+        """Keyboard navigation past the rendered rows scrolls the window."""
+        position = self.focused_position()
+        if self.model is None or not len(self.model.view):
+            return "break"
+        position = max(0, min(len(self.model.view) - 1, (position if position is not None else self.offset) + step))
+        if position < self.offset:
+            self.scroll_to(position)
+        elif position >= self.offset + self.visible:
+            self.scroll_to(position - self.visible + 1)
+        self.tree.focus(str(position))
+        self.tree.selection_set(str(position))
+        return "break"
+
+
 class FileRenamerApp(ctk.CTk):
     def __init__(self):
         super().__init__()
 
         self.title("File Renamer GUI")
-        self.geometry("800x600")
+        self.geometry("1000x750")
 
         self.selected_folder = None
         self.is_running = False
+        self.last_plan = None  # plan from the most recent dry run, reused by Apply
+        self.last_stats = None  # RunStats of the most recent run, shown in the summary panel
+        self.log_sink = BufferedLogSink(max_lines=MAX_LOG_LINES)
+        self.control = RunControl()  # pause / cancel of the current run
+        self.closing = False
+        self.progress_update = None  # latest progress.Progress from the worker, drawn by flush_log()
+        self.shown_progress = None
 
         # Layout configuration
         self.grid_columnconfigure(0, weight=1)
-        self.grid_rowconfigure(2, weight=1) # Log area expands
+        self.grid_rowconfigure(3, weight=1) # Log area expands
 
         # 1. Header & Selection
         self.header_frame = ctk.CTkFrame(self)
@@ -44,21 +223,92 @@ class FileRenamerApp(ctk.CTk):
         self.switch_mode = ctk.CTkSegmentedButton(self.controls_frame, values=["Dry Run", "Apply Changes"], variable=self.mode_var, command=self.on_mode_change)
         self.switch_mode.pack(side="left", padx=10, pady=10)
 
+        self.label_workers = ctk.CTkLabel(self.controls_frame, text="Workers:")
+        self.label_workers.pack(side="left", padx=(20, 5), pady=10)
+
+        self.workers_var = ctk.StringVar(value="1")
+        self.menu_workers = ctk.CTkOptionMenu(self.controls_frame, values=["1", "2", "4", "8", "16"], variable=self.workers_var, width=70)
+        self.menu_workers.pack(side="left", padx=5, pady=10)
+
+        self.label_log_level = ctk.CTkLabel(self.controls_frame, text="Log:")
+        self.label_log_level.pack(side="left", padx=(20, 5), pady=10)
+
+        self.log_level_var = ctk.StringVar(value="Verbose")
+        self.menu_log_level = ctk.CTkOptionMenu(self.controls_frame, values=list(LOG_LEVEL_CHOICES), variable=self.log_level_var, width=130)
+        self.menu_log_level.pack(side="left", padx=5, pady=10)
+
+        # Apply only: a file that would overwrite an identical copy is deleted instead
+        self.dedupe_var = ctk.BooleanVar(value=False)
+        self.check_dedupe = ctk.CTkCheckBox(self.controls_frame, text="Skip identical files", variable=self.dedupe_var)
+        self.check_dedupe.pack(side="left", padx=(20, 5), pady=10)
+
         self.btn_run = ctk.CTkButton(self.controls_frame, text="RUN RENAMER", command=self.run_process, fg_color="green", state="disabled")
         self.btn_run.pack(side="right", padx=10, pady=10)
 
-        # 3. Log Area
-        self.textbox_log = ctk.CTkTextbox(self, width=760)
-        self.textbox_log.grid(row=2, column=0, padx=20, pady=(0, 20), sticky="nsew")
+        self.btn_cancel = ctk.CTkButton(self.controls_frame, text="Cancel", command=self.cancel_run, width=80, state="disabled")
+        self.btn_cancel.pack(side="right", padx=5, pady=10)
+
+        self.btn_pause = ctk.CTkButton(self.controls_frame, text="Pause", command=self.toggle_pause, width=80, state="disabled")
+        self.btn_pause.pack(side="right", padx=5, pady=10)
+
+        # 3. Filters: patterns separated by ';' (see README), empty = everything
+        self.filter_frame = ctk.CTkFrame(self)
+        self.filter_frame.grid(row=2, column=0, padx=20, pady=(0, 20), sticky="ew")
+
+        self.label_exclude = ctk.CTkLabel(self.filter_frame, text="Exclude:")
+        self.label_exclude.pack(side="left", padx=(10, 5), pady=10)
+        self.entry_exclude = ctk.CTkEntry(self.filter_frame, placeholder_text=".git; node_modules; *.bak")
+        self.entry_exclude.pack(side="left", padx=5, pady=10, fill="x", expand=True)
+
+        self.label_include = ctk.CTkLabel(self.filter_frame, text="Include:")
+        self.label_include.pack(side="left", padx=(20, 5), pady=10)
+        self.entry_include = ctk.CTkEntry(self.filter_frame, placeholder_text="everything")
+        self.entry_include.pack(side="left", padx=5, pady=10, fill="x", expand=True)
+
+        self.label_depth = ctk.CTkLabel(self.filter_frame, text="Max depth:")
+        self.label_depth.pack(side="left", padx=(20, 5), pady=10)
+        self.entry_depth = ctk.CTkEntry(self.filter_frame, placeholder_text="any", width=60)
+        self.entry_depth.pack(side="left", padx=(5, 10), pady=10)
+
+        # 4. Log and dry-run preview
+        self.tabs = ctk.CTkTabview(self)
+        self.tabs.grid(row=3, column=0, padx=20, pady=(0, 20), sticky="nsew")
+        self.tabs.add("Log")
+        self.tabs.add("Preview")
+
+        self.textbox_log = ctk.CTkTextbox(self.tabs.tab("Log"), width=760)
+        self.textbox_log.pack(fill="both", expand=True)
         self.textbox_log.configure(state="disabled", font=("Consolas", 12))
 
+        self.preview = PreviewTable(self.tabs.tab("Preview"), fg_color="transparent")
+        self.preview.pack(fill="both", expand=True)
+
+        # 5. Progress and run summary
+        self.summary_frame = ctk.CTkFrame(self)
+        self.summary_frame.grid(row=4, column=0, padx=20, pady=(0, 20), sticky="ew")
+
+        self.progress_bar = ctk.CTkProgressBar(self.summary_frame)
+        self.progress_bar.pack(side="top", padx=10, pady=(10, 0), fill="x")
+        self.progress_bar.set(0)
+
+        self.label_progress = ctk.CTkLabel(self.summary_frame, text="", anchor="w")
+        self.label_progress.pack(side="top", padx=10, fill="x")
+
+        self.label_summary = ctk.CTkLabel(self.summary_frame, text="No run yet", justify="left", anchor="w",
+                                          font=("Consolas", 12))
+        self.label_summary.pack(side="top", padx=10, pady=(0, 10), fill="x", expand=True)
+
         # Initial log message
         self.log_message("Welcome! Select a folder to get started.\n")
+        self.after(LOG_FLUSH_MS, self.flush_log)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def select_folder(self):
         folder = filedialog.askdirectory()
         if folder:
             self.selected_folder = Path(folder)
+            self.last_plan = None
+            self.preview.set_plan(None)
             self.label_path.configure(text=str(self.selected_folder), text_color=("black", "white"))
             self.btn_run.configure(state="normal")
             self.log_message(f"Selected folder: {self.selected_folder}\n")
@@ -70,14 +320,34 @@ class FileRenamerApp(ctk.CTk):
             self.btn_run.configure(fg_color="green", hover_color="#006400")
 
     def log_message(self, message):
-        """Thread-safe logging to the text box."""
-        def _update():
+        """Thread-safe logging: queue the line, flush_log() shows it."""
+        self.log_sink.write(message)
+
+    def flush_log(self):
+        """Move queued log lines into the text box in a single insert."""
+        lines, trim = self.log_sink.drain()
+        if lines:
             self.textbox_log.configure(state="normal")
-            self.textbox_log.insert("end", str(message) + "\n")
+            self.textbox_log.insert("end", "\n".join(lines) + "\n")
+            if trim:
+                self.textbox_log.delete("1.0", f"{trim + 1}.0")
             self.textbox_log.see("end")
             self.textbox_log.configure(state="disabled")
-        
-        self.after(0, _update)
+        self.show_progress()
+        self.after(LOG_FLUSH_MS, self.flush_log)
+
+    def on_progress(self, update):
+        """Called from the worker thread (throttled by rename_tree); drawn by show_progress()."""
+        self.progress_update = update
+
+    def show_progress(self):
+        update = self.progress_update
+        if update is None or update is self.shown_progress:
+            return
+        self.shown_progress = update
+        fraction = update.fraction
+        self.progress_bar.set(fraction if fraction is not None else 0)
+        self.label_progress.configure(text=format_progress(update))
 
     def run_process(self):
         if not self.selected_folder:
@@ -89,38 +359,173 @@ class FileRenamerApp(ctk.CTk):
 
         mode = self.mode_var.get()
         dry_run = (mode == "Dry Run")
+
+        try:
+            path_filter = self.read_filter()
+        except ValueError as e:
+            messagebox.showwarning("Filters", str(e))
+            return
         
+        selection = None
         if not dry_run:
-            confirm = messagebox.askyesno("Confirm Apply", "This will PERMANENTLY rename files.\nAre you sure?")
+            message = "This will PERMANENTLY rename files.\nAre you sure?"
+            model = self.preview.model
+            if model is not None and model.deselected_count:
+                # A selection only means something for the plan it was made on: never fall back to a full apply
+                reason = plan_mismatch(model.plan, self.selected_folder, path_filter, check_tree=False)
+                if reason is not None:
+                    self.warn_selection_outdated(reason)
+                    return
+                message = (f"This will PERMANENTLY rename {model.selected_count} of {len(model)} entries "
+                           f"(deselected rows are skipped).\nAre you sure?")
+                selection = self.preview.selected_plan()
+            confirm = messagebox.askyesno("Confirm Apply", message)
             if not confirm:
                 return
 
         self.is_running = True
         self.btn_run.configure(state="disabled", text="Running...")
+        self.btn_pause.configure(state="normal", text="Pause")
+        self.btn_cancel.configure(state="normal")
         self.btn_select.configure(state="disabled")
         self.switch_mode.configure(state="disabled")
+        self.menu_workers.configure(state="disabled")
+        self.menu_log_level.configure(state="disabled")
+        self.check_dedupe.configure(state="disabled")
+        self.set_filter_state("disabled")
         
+        self.log_sink.reset()
+        self.control = RunControl()
+        self.progress_update = None
+        self.progress_bar.set(0)
+        self.label_progress.configure(text="Counting entries...")
         self.textbox_log.configure(state="normal")
         self.textbox_log.delete("1.0", "end")
         self.textbox_log.configure(state="disabled")
 
-        thread = threading.Thread(target=self.worker_task, args=(dry_run,))
+        workers = int(self.workers_var.get())
+        log_level = LOG_LEVEL_CHOICES[self.log_level_var.get()]
+        self.tabs.set("Log")
+        dedupe = ContentDedupe() if self.dedupe_var.get() and not dry_run else None
+        thread = threading.Thread(target=self.worker_task,
+                                  args=(dry_run, workers, log_level, path_filter, selection, dedupe))
         thread.start()
 
-    def worker_task(self, dry_run):
+    def read_filter(self):
+        """PathFilter from the filter fields, or None when they are empty. Raises ValueError on bad input."""
+        depth = self.entry_depth.get().strip()
+        if depth and not depth.isdigit():
+            raise ValueError("Max depth must be a whole number.")
+        path_filter = PathFilter(split_patterns(self.entry_include.get()), split_patterns(self.entry_exclude.get()),
+                                 int(depth) if depth else None)
+        return path_filter if path_filter.active else None
+
+    def set_filter_state(self, state):
+        for entry in (self.entry_exclude, self.entry_include, self.entry_depth):
+            entry.configure(state=state)
+
+    def reusable_plan(self, dry_run, path_filter=None):
+        """Return the last dry-run plan if Apply can use it without re-scanning."""
+        plan = self.last_plan
+        if dry_run or plan is None:
+            return None
+        reason = plan_mismatch(plan, self.selected_folder, path_filter)
+        if reason == "the folder changed":
+            self.log_message("Folder changed since the dry run -> scanning again.")
+        return plan if reason is None else None
+
+    def warn_selection_outdated(self, reason):
+        messagebox.showwarning("Preview out of date",
+                               f"Nothing was renamed: {reason} since the dry run, so the rows deselected in the "
+                               f"preview no longer match.\nRun the dry run again.")
+
+    def worker_task(self, dry_run, workers=1, log_level=file_renamer.LOG_VERBOSE, path_filter=None, selection=None,
+                    dedupe=None):
         try:
-            file_renamer.rename_tree(self.selected_folder, dry_run=dry_run, log_callback=self.log_message)
-            self.log_message("\n--- DONE ---")
+            if selection is not None:
+                # selection is the dry-run plan minus the deselected rows; applying anything else
+                # (a fresh scan) would also rename what was deselected
+                reason = plan_mismatch(selection, self.selected_folder, path_filter)
+                if reason is not None:
+                    self.log_message(f"\n--- NOT APPLIED ({reason} since the dry run) ---")
+                    self.after(0, self.warn_selection_outdated, reason)
+                    return
+                plan = selection
+            else:
+                plan = self.reusable_plan(dry_run, path_filter)
+            stats = file_renamer.rename_tree(self.selected_folder, dry_run=dry_run, log_callback=self.log_message, plan=plan, workers=workers, log_level=log_level,
+                                             progress=self.on_progress, control=self.control, path_filter=path_filter,
+                                             dedupe=dedupe)
+            # An applied plan is spent; only keep dry-run plans around
+            self.last_plan = stats.plan if dry_run else None
+            self.last_stats = stats
+            if stats.stopped:
+                # Part of the plan ran: scan again next time
+                self.last_plan = None
+                self.log_message(f"\n--- STOPPED ({stats.stopped}) ---")
+            else:
+                self.log_message("\n--- DONE ---")
+        except file_renamer.Cancelled:
+            self.last_plan = None
+            self.last_stats = None
+            self.log_message("\n--- CANCELLED ---")
         except Exception as e:
+            self.last_plan = None
+            self.last_stats = None
             self.log_message(f"\nERROR: {e}")
         finally:
             self.after(0, self.on_process_finished)
 
     def on_process_finished(self):
         self.is_running = False
+        if self.closing:
+            self.destroy()
+            return
+        self.show_progress()
+        if self.log_sink.spill_path:
+            self.log_message(f"Older log lines saved to: {self.log_sink.spill_path}")
+        if self.last_stats is not None:
+            self.label_summary.configure(text="\n".join(self.last_stats.summary_lines()))
+        # Preview the new dry-run plan; after an apply (or a failed run) there is nothing to preview
+        if self.last_plan is not (self.preview.model.plan if self.preview.model is not None else None):
+            self.preview.set_plan(self.last_plan)
+            if self.last_plan is not None and self.last_plan.operation_count:
+                self.tabs.set("Preview")
         self.btn_run.configure(state="normal", text="RUN RENAMER")
+        self.btn_pause.configure(state="disabled", text="Pause")
+        self.btn_cancel.configure(state="disabled")
         self.btn_select.configure(state="normal")
         self.switch_mode.configure(state="normal")
+        self.menu_workers.configure(state="normal")
+        self.menu_log_level.configure(state="normal")
+        self.check_dedupe.configure(state="normal")
+        self.set_filter_state("normal")
+
+    def toggle_pause(self):
+        if self.control.paused:
+            self.control.resume()
+            self.btn_pause.configure(text="Pause")
+            self.log_message("Resumed.")
+        else:
+            self.control.pause()
+            self.btn_pause.configure(text="Resume")
+            self.log_message("Paused after the current entry.")
+
+    def cancel_run(self):
+        """Stop at the next safe point (never halfway through a rename)."""
+        self.control.cancel()
+        self.btn_pause.configure(state="disabled")
+        self.btn_cancel.configure(state="disabled")
+        self.log_message("Cancelling after the current entry...")
+
+    def on_close(self):
+        if not self.is_running:
+            self.destroy()
+            return
+        # Let the worker stop at a safe point; on_process_finished() closes the window
+        self.closing = True
+        self.control.cancel()
+        self.log_message("Stopping, the window closes when the current step is done...")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+
+
+class BufferedLogSink:
+    """
+    Log buffer between the worker thread and the GUI.
+
+    The worker calls write() (a list append under a lock) for every line and
+    never touches Tk. The GUI calls drain() on a timer and inserts everything
+    it gets in one go. Only the newest max_lines are kept for display; older
+    lines are appended to a log file on disk so nothing is lost.
+    """
+
+    def __init__(self, max_lines: int = 5000, spill_dir: str = None):
+        self.max_lines = max_lines
+        self.spill_dir = spill_dir or tempfile.gettempdir()
+        self.spill_path = None
+        self._spill_file = None
+        self._lock = threading.Lock()
+        self._pending = []
+        self._shown = deque()
+
+    def write(self, message):
+        """Thread-safe, cheap: called from the worker for every log line."""
+        with self._lock:
+            self._pending.append(str(message))
+
+    __call__ = write
+
+    def drain(self):
+        """
+        Take all pending lines. Returns (lines, trim): the lines to append to
+        the widget and how many of its oldest lines to delete afterwards.
+        Messages holding newlines are split, so each returned line is one
+        line of the widget.
+        """
+        with self._lock:
+            messages, self._pending = self._pending, []
+        if not messages:
+            return [], 0
+        # Count textbox lines, not messages: "\n📂 Visiting folder:" is two of them
+        lines = [line for message in messages for line in message.split("\n")]
+
+        # A flood bigger than the display cap goes straight to disk
+        overflow = []
+        if len(lines) > self.max_lines:
+            overflow = lines[:-self.max_lines]
+            lines = lines[-self.max_lines:]
+
+        # Spill in log order: displayed lines that scroll out first, then the flood's overflow
+        trim = max(0, len(self._shown) + len(lines) - self.max_lines)
+        if trim:
+            self._spill(self._shown.popleft() for _ in range(trim))
+        if overflow:
+            self._spill(overflow)
+        self._shown.extend(lines)
+        return lines, trim
+
+    def reset(self):
+        """Start a new run: forget displayed lines and start a new spill file."""
+        with self._lock:
+            self._pending = []
+        self._shown.clear()
+        self.close()
+        self.spill_path = None
+
+    def close(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def _spill(self, lines):
+        if self._spill_file is None:
+            name = time.strftime("FileRenamer_log_%Y%m%d_%H%M%S.txt")
+            self.spill_path = os.path.join(self.spill_dir, name)
+            self._spill_file = open(self.spill_path, "a", encoding="utf-8")
+        for line in lines:
+            self._spill_file.write(line + "\n")
+        self._spill_file.flush()
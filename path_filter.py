@@ -0,0 +1,137 @@
+import fnmatch
+import hashlib
+import json
+import os
+import re
+from typing import Iterable, List, Optional
+
+# Patterns starting with this are regular expressions searched in the relative path
+REGEX_PREFIX = "re:"
+
+
+class _Patterns:
+    """
+    A list of glob/regex patterns folded into at most three compiled regexes:
+    globs without a slash match the entry name, globs with a slash the path
+    relative to the root ("a/b/c", case-insensitive where the OS is), and
+    "re:" patterns are searched in that relative path.
+    """
+
+    __slots__ = ("name_re", "path_re", "regex_re")
+
+    def __init__(self, patterns: Iterable[str]):
+        names, paths, regexes = [], [], []
+        for pattern in patterns:
+            if pattern.startswith(REGEX_PREFIX):
+                try:
+                    re.compile(pattern[len(REGEX_PREFIX):])
+                except re.error as e:
+                    raise ValueError(f"bad regular expression {pattern!r}: {e}")
+                regexes.append(f"(?:{pattern[len(REGEX_PREFIX):]})")
+            elif "/" in pattern.strip("/"):
+                paths.append(fnmatch.translate(os.path.normcase(pattern.strip("/"))))
+            else:
+                names.append(fnmatch.translate(os.path.normcase(pattern.strip("/"))))
+        self.name_re = re.compile("|".join(names)).match if names else None
+        self.path_re = re.compile("|".join(paths)).match if paths else None
+        self.regex_re = re.compile("|".join(regexes)).search if regexes else None
+
+    def __bool__(self):
+        return bool(self.name_re or self.path_re or self.regex_re)
+
+    def matches(self, name: str, rel: str) -> bool:
+        if self.name_re is not None and self.name_re(os.path.normcase(name)):
+            return True
+        if self.path_re is not None and self.path_re(os.path.normcase(rel)):
+            return True
+        return self.regex_re is not None and self.regex_re(rel) is not None
+
+
+class PathFilter:
+    """
+    Decides, during the walk, which entries are left alone and which
+    subfolders are never listed.
+
+    - exclude: matching entries are not renamed; matching folders are not
+      walked either (their whole subtree is pruned).
+    - include: when given, only matching entries are renamed. Folders that
+      don't match are still walked, so files deeper down can match.
+    - max_depth: entries directly in the root are depth 1; folders at
+      max_depth are renamed but not walked.
+    """
+
+    def __init__(self, include: Iterable[str] = (), exclude: Iterable[str] = (), max_depth: Optional[int] = None):
+        self.include: List[str] = list(include)
+        self.exclude: List[str] = list(exclude)
+        if max_depth is not None and max_depth < 1:
+            raise ValueError("max_depth must be at least 1")
+        self.max_depth = max_depth
+        self._include = _Patterns(self.include)
+        self._exclude = _Patterns(self.exclude)
+
+    def __getstate__(self):
+        return {"include": self.include, "exclude": self.exclude, "max_depth": self.max_depth}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def active(self) -> bool:
+        return bool(self._include or self._exclude or self.max_depth is not None)
+
+    @property
+    def fingerprint(self) -> str:
+        text = json.dumps(self.__getstate__(), sort_keys=True)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def left_alone(self, name: str, rel: str) -> bool:
+        if self._exclude and self._exclude.matches(name, rel):
+            return True
+        return bool(self._include) and not self._include.matches(name, rel)
+
+    def walks(self, rel: str) -> bool:
+        """Whether the folder at rel ("" for the root) is listed at all."""
+        if not rel:
+            return True
+        if self.max_depth is not None and rel.count("/") + 1 >= self.max_depth:
+            return False
+        return not (self._exclude and self._exclude.matches(rel.rsplit("/", 1)[-1], rel))
+
+    def apply(self, listing, rel: str) -> None:
+        """
+        Filter a scan_tree() DirListing of the folder at rel ("" for the root)
+        in place: fills listing.skip and drops pruned folders from
+        listing.descend, counting them in listing.pruned.
+        """
+        prefix = rel + "/" if rel else ""
+        skip = {name for name in listing.files if self.left_alone(name, prefix + name)}
+        skip.update(name for name in listing.dirs if self.left_alone(name, prefix + name))
+        listing.skip = skip
+        depth = rel.count("/") + 1 if rel else 0
+        if self.max_depth is not None and depth + 1 >= self.max_depth:
+            listing.pruned = len(listing.descend)
+            listing.descend = []
+        elif self._exclude:
+            descend = [name for name in listing.descend if not self._exclude.matches(name, prefix + name)]
+            listing.pruned = len(listing.descend) - len(descend)
+            listing.descend = descend
+
+
+def parse_filters(data: dict) -> Optional[PathFilter]:
+    """PathFilter from the "filters" section of a rules file, or None if it sets nothing."""
+    unknown = set(data) - {"include", "exclude", "max_depth"}
+    if unknown:
+        raise ValueError(f"filters: unknown setting(s) {', '.join(sorted(unknown))}")
+    for key in ("include", "exclude"):
+        if not isinstance(data.get(key, []), list):
+            raise ValueError(f"filters: {key} must be a list of patterns")
+    max_depth = data.get("max_depth")
+    if max_depth is not None and not isinstance(max_depth, int):
+        raise ValueError("filters: max_depth must be a number")
+    path_filter = PathFilter(data.get("include", []), data.get("exclude", []), max_depth)
+    return path_filter if path_filter.active else None
+
+
+def split_patterns(text: str) -> List[str]:
+    """Patterns typed in one field, separated by ';' or new lines."""
+    return [p.strip() for p in re.split(r"[;\n]", text) if p.strip()]
@@ -0,0 +1,168 @@
+"""
+Rows behind the GUI's dry-run preview table.
+
+Built straight from a RenamePlan's column-wise batches: one row per planned
+operation, held in flat lists and byte arrays, with the displayed order
+(sorted and filtered) kept as an array of row numbers. The table asks for
+the few rows it shows with rows(), so a million operations cost a few
+arrays, not a million widgets.
+"""
+from array import array
+from dataclasses import replace
+from itertools import chain, compress, repeat
+from typing import Iterable, List, Optional, Tuple
+
+from file_renamer import ACTION_RENAME, ACTIONS, DirBatch, RenamePlan
+from path_filter import PathFilter
+
+COLUMNS = ("folder", "old", "new", "action", "collision")
+
+
+class PlanPreview:
+    """Sortable, filterable rows of a plan, each of which can be deselected before applying."""
+
+    def __init__(self, plan: RenamePlan):
+        self.plan = plan
+        self.batch_of = array("I")
+        self.batch_start = array("I")  # first row of every batch (rows of a batch are contiguous)
+        self.src_names: List[str] = []
+        self.dst_names: List[str] = []
+        self.actions = bytearray()
+        for i, batch in enumerate(plan.batches):
+            self.batch_start.append(len(self.src_names))
+            self.batch_of.extend(repeat(i, len(batch)))
+            self.src_names.extend(batch.src_names)
+            self.dst_names.extend(batch.dst_names)
+            self.actions += batch.actions
+        self.deselected = bytearray(len(self.src_names))
+        self.deselected_count = 0
+        self._folders = {}
+        self.sort_column: Optional[str] = None
+        self.descending = False
+        self.shown_actions = set(ACTIONS)
+        self._order = array("I", range(len(self.src_names)))  # every row, sorted
+        self.view = self._order  # rows shown, in display order
+
+    def __len__(self) -> int:
+        return len(self.src_names)
+
+    def folder(self, row: int) -> str:
+        """Folder of a row relative to the plan root, built once per batch."""
+        i = self.batch_of[row]
+        folder = self._folders.get(i)
+        if folder is None:
+            path = self.plan.batches[i].path
+            folder = self._folders[i] = str(path.relative_to(self.plan.root)) if path != self.plan.root else "."
+        return folder
+
+    # --- sorting and filtering ---
+
+    def sort(self, column: Optional[str], descending: bool = False):
+        """Sort every row by column (None: plan order), then re-apply the action filter."""
+        n = len(self)
+        if column is None:
+            order = range(n)
+        elif column in ("old", "new"):
+            names = self.src_names if column == "old" else self.dst_names
+            order = sorted(range(n), key=names.__getitem__)
+        elif column == "folder":
+            batches, starts = self.plan.batches, self.batch_start
+            by_path = sorted(range(len(batches)), key=lambda i: str(batches[i].path))
+            order = chain.from_iterable(range(starts[i], starts[i] + len(batches[i])) for i in by_path)
+        elif column in ("action", "collision"):
+            # One byte per row: a counting sort keeps plan order within each action
+            codes = self.actions if column == "action" else self.actions.translate(_COLLISION)
+            order = []
+            for code in sorted(set(codes)):
+                order.extend(compress(range(n), codes.translate(_only(code))))
+        else:
+            raise ValueError(f"unknown column {column!r}")
+        order = array("I", order)
+        if descending:
+            order.reverse()
+        self._order = order
+        self.sort_column, self.descending = column, descending
+        self.filter(self.shown_actions)
+
+    def filter(self, actions: Iterable[str]):
+        """Show only rows whose action is in actions, in the current sort order."""
+        self.shown_actions = set(actions)
+        if self.shown_actions >= set(ACTIONS):
+            self.view = self._order
+            return
+        shown = bytes(1 if action in self.shown_actions else 0 for action in ACTIONS) + bytes(256 - len(ACTIONS))
+        mask = self.actions.translate(shown)
+        self.view = array("I", compress(self._order, map(mask.__getitem__, self._order)))
+
+    # --- display ---
+
+    def rows(self, start: int, count: int) -> List[Tuple[bool, str, str, str, str, bool]]:
+        """(selected, folder, old name, new name, action, collision) of view[start:start + count]."""
+        result = []
+        for row in self.view[start:start + count]:
+            action = ACTIONS[self.actions[row]]
+            result.append((not self.deselected[row], self.folder(row), self.src_names[row], self.dst_names[row],
+                           action, action != ACTION_RENAME))
+        return result
+
+    # --- selection ---
+
+    def toggle(self, position: int):
+        row = self.view[position]
+        self.deselected[row] ^= 1
+        self.deselected_count += 1 if self.deselected[row] else -1
+
+    def select_shown(self, selected: bool):
+        """Select or deselect every row currently shown."""
+        value = 0 if selected else 1
+        if self.view is self._order:
+            self.deselected = bytearray([value]) * len(self)
+        else:
+            for row in self.view:
+                self.deselected[row] = value
+        self.deselected_count = self.deselected.count(1)
+
+    @property
+    def selected_count(self) -> int:
+        return len(self) - self.deselected_count
+
+    def selected_plan(self) -> RenamePlan:
+        """The plan without the deselected operations (the plan itself when nothing is deselected)."""
+        if not self.deselected_count:
+            return self.plan
+        batches = []
+        row = 0
+        for batch in self.plan.batches:
+            kept = DirBatch(batch.path, listing=batch.listing, dev=batch.dev)
+            for kind, src_name, dst_name, action in batch.records():
+                if not self.deselected[row]:
+                    kept.add(kind, src_name, dst_name, action)
+                row += 1
+            if len(kept):
+                batches.append(kept)
+        return replace(self.plan, batches=batches)
+
+
+def plan_mismatch(plan: RenamePlan, root, path_filter: Optional[PathFilter] = None,
+                  check_tree: bool = True) -> Optional[str]:
+    """
+    Why plan can no longer be applied as it is for root and path_filter, or
+    None if it can. check_tree also compares the folder with the dry run
+    (a stat() per visited folder).
+    """
+    if plan.root != root:
+        return "a different folder is selected"
+    fingerprint = path_filter.fingerprint if path_filter is not None else None
+    if fingerprint != (plan.path_filter.fingerprint if plan.path_filter is not None else None):
+        return "the filters changed"
+    if check_tree and plan.is_stale():
+        return "the folder changed"
+    return None
+
+
+# translate() tables: action code -> 1 for collisions (overwrite/merge), code -> 1 for one code only
+_COLLISION = bytes(0 if code == ACTIONS.index(ACTION_RENAME) else 1 for code in range(256))
+
+
+def _only(code: int) -> bytes:
+    return bytes(1 if c == code else 0 for c in range(256))
@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+
+# Minimum time between two progress callbacks
+PROGRESS_INTERVAL = 0.25
+
+
+class Progress(NamedTuple):
+    """One progress report. total is 0 while it isn't known yet (e.g. while counting)."""
+    phase: str       # "scan", "plan" or "apply"
+    done: int
+    total: int
+    rate: float      # units per second since the phase started
+    eta: Optional[float]  # seconds left, None if unknown
+
+    @property
+    def fraction(self) -> Optional[float]:
+        if not self.total:
+            return None
+        return min(1.0, self.done / self.total)
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+def format_progress(update: Progress) -> str:
+    """Human readable one-liner, e.g. 'apply: 1,200 / 5,000 (24%) 310/s, ETA 12s'."""
+    if update.total:
+        text = f"{update.phase}: {update.done:,} / {update.total:,} ({update.fraction:.0%})"
+    else:
+        text = f"{update.phase}: {update.done:,}"
+    text += f" {update.rate:,.0f}/s"
+    if update.eta is not None:
+        text += f", ETA {format_duration(update.eta)}"
+    return text
+
+
+class ProgressTracker:
+    """
+    Counts work done in one phase and hands a Progress to callback at most
+    once per interval (and once more from finish()). advance() is cheap and
+    thread-safe, so it can be called per entry from worker threads.
+    """
+
+    def __init__(self, callback: Callable[[Progress], None], phase: str, total: int = 0,
+                 interval: float = PROGRESS_INTERVAL):
+        self.callback = callback
+        self.phase = phase
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._last_report = self._start
+
+    def advance(self, n: int = 1):
+        with self._lock:
+            self.done += n
+            now = time.monotonic()
+            if now - self._last_report < self.interval:
+                return
+            self._last_report = now
+            update = self._snapshot(now)
+        self.callback(update)
+
+    def finish(self):
+        with self._lock:
+            update = self._snapshot(time.monotonic())
+        self.callback(update)
+
+    def _snapshot(self, now: float) -> Progress:
+        elapsed = now - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.total and rate > 0:
+            eta = max(0.0, (self.total - self.done) / rate)
+        return Progress(self.phase, self.done, self.total, rate, eta)
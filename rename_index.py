@@ -0,0 +1,80 @@
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import List, Optional
+
+
+# Directories modified this recently are not recorded: a change within the
+# same mtime tick (2 s on FAT, coarse on some SMB servers) would go unnoticed.
+MTIME_SETTLE_NS = 2_000_000_000
+
+
+class RenameIndex:
+    """
+    On-disk record of directories whose children already satisfy the naming rules.
+
+    Rows are keyed by absolute directory path (so a run from another working
+    directory or with a relative root finds them) and store the directory's mtime plus the
+    names of its subfolders. While the mtime is unchanged the directory has
+    the same children, so a later run can skip listing and checking it and
+    go straight to its subfolders. Changing the rules (a different
+    fingerprint) empties the index.
+    """
+
+    def __init__(self, path: Path, rules_fingerprint: str):
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self.invalidated = False
+
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, subdirs TEXT NOT NULL)"
+        )
+
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'rules'").fetchone()
+        if row is None or row[0] != rules_fingerprint:
+            if row is not None:
+                self.invalidated = True
+            self._conn.execute("DELETE FROM dirs")
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rules', ?)", (rules_fingerprint,))
+        self._conn.commit()
+
+    def lookup(self, dir_path: str, mtime_ns: int) -> Optional[List[str]]:
+        """Subfolder names of dir_path if it is recorded with this mtime, else None."""
+        row = self._conn.execute("SELECT mtime_ns, subdirs FROM dirs WHERE path = ?",
+                                 (os.path.abspath(dir_path),)).fetchone()
+        if row is None or row[0] != mtime_ns:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[1])
+
+    def record(self, dir_path: str, mtime_ns: int, subdirs: List[str]):
+        """Remember that every child of dir_path already satisfies the rules."""
+        if time.time_ns() - mtime_ns < MTIME_SETTLE_NS:
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO dirs (path, mtime_ns, subdirs) VALUES (?, ?, ?)",
+            (os.path.abspath(dir_path), mtime_ns, json.dumps(subdirs)),
+        )
+        self.recorded += 1
+
+    def summary(self) -> str:
+        text = f"Index: {self.hits} hits, {self.misses} misses, {self.recorded} recorded"
+        if self.invalidated:
+            text += " (rules changed, index was reset)"
+        return text
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
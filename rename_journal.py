@@ -0,0 +1,176 @@
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+
+JOURNAL_VERSION = 1
+
+# Names created by forced_temp_rename_with_overwrite(): __tmp__<uuid hex>__<original name>
+TMP_NAME_RE = re.compile(r"^__tmp__([0-9a-f]{32})__(.*)$", re.DOTALL)
+
+
+def _dir(directory) -> str:
+    """Journal form of a directory: absolute, so a resume doesn't depend on the working directory."""
+    return os.path.abspath(directory)
+
+
+def original_name(tmp_name: str) -> Optional[str]:
+    """Original entry name encoded in a temp name, or None if it isn't one."""
+    match = TMP_NAME_RE.match(tmp_name)
+    return match.group(2) if match else None
+
+
+class RenameJournal:
+    """
+    Append-only write-ahead journal of an apply run (JSON lines).
+
+    The whole plan is written and fsynced before the first rename. After
+    that every directory batch gets a "begin" record, each rename step
+    ("op" = src -> tmp is about to happen, "final" = tmp -> final done,
+    "merge" = tmp is being merged into final) and a "done" record.
+
+    "begin" records are fsynced immediately: they name every directory that
+    may hold __tmp__ entries after a crash. All other records are group
+    committed (every commit_every records or commit_interval seconds) to keep
+    the fsync count low; a lost record only means a bit more work on resume.
+    """
+
+    def __init__(self, path: Path, commit_every: int = 256, commit_interval: float = 0.5):
+        self.path = Path(path)
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._buffer: List[str] = []
+        self._last_commit = time.monotonic()
+
+    # -- writing -----------------------------------------------------------
+
+    def write_plan(self, root: Path, batches):
+        """Record the run and its full plan, durably, before anything is renamed."""
+        with self._lock:
+            self._append({"t": "run", "version": JOURNAL_VERSION, "root": _dir(root)})
+            for batch in batches:
+                ops = [list(record) for record in batch.records()]
+                self._append({"t": "plan", "dir": _dir(batch.path), "ops": ops})
+            self._append({"t": "planned"})
+            self._commit()
+
+    def begin_dir(self, directory: Path):
+        with self._lock:
+            self._append({"t": "begin", "dir": _dir(directory)})
+            self._commit()
+
+    def record_op(self, directory: Path, src: str, tmp: str, dst: str, kind: str):
+        self._record({"t": "op", "dir": _dir(directory), "src": src, "tmp": tmp, "dst": dst, "kind": kind})
+
+    def record_step(self, step: str, directory: Path, src: str):
+        self._record({"t": step, "dir": _dir(directory), "src": src})
+
+    def done_dir(self, directory: Path):
+        self._record({"t": "done", "dir": _dir(directory)})
+
+    def finish(self):
+        with self._lock:
+            self._append({"t": "end"})
+            self._commit()
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._file.close()
+
+    def _record(self, record: dict):
+        with self._lock:
+            self._append(record)
+            if (len(self._buffer) >= self.commit_every
+                    or time.monotonic() - self._last_commit >= self.commit_interval):
+                self._commit()
+
+    def _append(self, record: dict):
+        self._buffer.append(json.dumps(record) + "\n")
+
+    def _commit(self):
+        if self._buffer:
+            self._file.write("".join(self._buffer))
+            self._buffer.clear()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_commit = time.monotonic()
+
+
+# -- reading ---------------------------------------------------------------
+
+@dataclass
+class JournalState:
+    """What a journal says about an interrupted run."""
+    root: Path
+    # (dir, [(kind, src, dst, action), ...]) in plan order
+    plan: List[Tuple[str, List[list]]] = field(default_factory=list)
+    done: Set[str] = field(default_factory=set)
+    begun: Set[str] = field(default_factory=set)
+    # (dir, tmp name) -> final name, for renames that reached the temp step
+    tmp_targets: Dict[Tuple[str, str], str] = field(default_factory=dict)
+    finished: bool = False
+
+    @property
+    def in_flight(self) -> Set[str]:
+        """Directories whose batch started but never completed."""
+        return self.begun - self.done
+
+
+def load_journal(path: Path) -> JournalState:
+    state = None
+    planned = False
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn last line from the crash; everything before it is valid
+                break
+            kind = record.get("t")
+            if kind == "run":
+                if record.get("version") != JOURNAL_VERSION:
+                    raise ValueError(f"Unsupported journal version in {path}")
+                # A reused journal file: only the latest run matters
+                state = JournalState(root=Path(record["root"]))
+                planned = False
+            elif state is None:
+                raise ValueError(f"Not a rename journal: {path}")
+            elif kind == "plan" and not planned:
+                state.plan.append((record["dir"], record["ops"]))
+            elif kind == "planned":
+                planned = True
+            elif kind == "begin":
+                state.begun.add(record["dir"])
+            elif kind == "op":
+                state.tmp_targets[(record["dir"], record["tmp"])] = record["dst"]
+            elif kind == "done":
+                state.done.add(record["dir"])
+            elif kind == "end":
+                state.finished = True
+
+    if state is None:
+        raise ValueError(f"Not a rename journal: {path}")
+    if not planned:
+        raise ValueError(f"Journal has no complete plan, nothing was renamed yet: {path}")
+    return state
+
+
+def find_tmp_entries(directory: Path) -> List[Tuple[str, bool]]:
+    """(name, is_dir) of every __tmp__ entry directly inside directory."""
+    found = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if TMP_NAME_RE.match(entry.name):
+                    found.append((entry.name, entry.is_dir()))
+    except OSError:
+        pass
+    return found
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import re
+from dataclasses import asdict, dataclass, field, replace
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+
+# Bump when the meaning of a setting changes, so fingerprints (and indexes built on them) are reset
+ENGINE_VERSION = 1
+
+# Names cached per compiled rule set and entry type; real trees repeat names a lot (Thumbs.db, IMG_0001.JPG)
+DEFAULT_CACHE_SIZE = 1 << 16
+
+CASE_STYLES: Dict[str, Callable[[str], str]] = {
+    "keep": lambda s: s,
+    "upper": str.upper,
+    "lower": str.lower,
+    # every word capitalized: "my file" -> "My File"; lowered first, as the original
+    # stem.lower().title() did (str.title() alone differs on names like "İstanbul")
+    "title": lambda s: s.lower().title(),
+    "capitalize": str.capitalize,  # first letter only: "my FILE" -> "My file"
+}
+EXTENSION_STYLES = ("keep", "upper", "lower")
+
+_SUFFIX_RE = re.compile(r"\s+\(\d+\)$")
+_NUMBERED_PREFIX_RE = re.compile(r"^(\d+\.\s+)(.*)", re.DOTALL)
+
+
+@dataclass(frozen=True)
+class NameRules:
+    """How one kind of name (files, folders or one extension) is normalized."""
+    strip_suffix: bool = True       # drop a trailing " (n)" (from the stem, for files)
+    case: str = "keep"              # one of CASE_STYLES, applied to the stem
+    numbered_prefix: bool = False   # keep a leading "2. " as written and apply case to the rest
+    extension: str = "keep"         # files only: one of EXTENSION_STYLES
+
+    def describe(self) -> str:
+        """Short human-readable summary, e.g. "title case, remove ' (n)'"."""
+        parts = ["case kept" if self.case == "keep" else f"{self.case} case"]
+        if self.strip_suffix:
+            parts.append("remove ' (n)'")
+        if self.numbered_prefix:
+            parts.append("keep '2. ' prefixes")
+        if self.extension != "keep":
+            parts.append(f"{self.extension} case extension")
+        return ", ".join(parts)
+
+
+@dataclass(frozen=True)
+class RuleSet:
+    files: NameRules = NameRules(case="title")
+    folders: NameRules = NameRules(case="upper", numbered_prefix=True)
+    # Per-extension overrides for files, keyed by lowercase extension with the dot (".jpg")
+    extensions: Dict[str, NameRules] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {
+            "files": asdict(self.files),
+            "folders": asdict(self.folders),
+            "extensions": {ext: asdict(rules) for ext, rules in sorted(self.extensions.items())},
+        }
+
+    def describe(self) -> str:
+        """One-line summary for log headers."""
+        text = f"folders -> {self.folders.describe()} | files -> {self.files.describe()}"
+        for ext, rules in sorted(self.extensions.items()):
+            text += f" | {ext} -> {rules.describe()}"
+        return text
+
+    def fingerprint(self) -> str:
+        """Changes whenever a setting (or the engine) changes."""
+        text = json.dumps({"engine": ENGINE_VERSION, "rules": self.to_dict()}, sort_keys=True)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+
+# Folders ALL CAPS keeping "2. " prefixes, files "Title Case" with the extension untouched, " (n)" dropped
+DEFAULT_RULES = RuleSet()
+
+
+def _name_rules(data: dict, base: NameRules, where: str) -> NameRules:
+    unknown = set(data) - set(NameRules.__dataclass_fields__)
+    if unknown:
+        raise ValueError(f"{where}: unknown setting(s) {', '.join(sorted(unknown))}")
+    rules = replace(base, **data)
+    if rules.case not in CASE_STYLES:
+        raise ValueError(f"{where}: case must be one of {', '.join(CASE_STYLES)}")
+    if rules.extension not in EXTENSION_STYLES:
+        raise ValueError(f"{where}: extension must be one of {', '.join(EXTENSION_STYLES)}")
+    for name in ("strip_suffix", "numbered_prefix"):
+        if not isinstance(getattr(rules, name), bool):
+            raise ValueError(f"{where}: {name} must be true or false")
+    return rules
+
+
+def parse_rules(data: dict) -> RuleSet:
+    """
+    Build a RuleSet from a config dict. Missing settings keep their defaults;
+    an extension override starts from the "files" settings. A "filters"
+    section is read by path_filter.parse_filters():
+
+        {"files": {"case": "title", "extension": "lower"},
+         "folders": {"case": "upper", "numbered_prefix": true},
+         "extensions": {".jpg": {"case": "lower"}}}
+    """
+    unknown = set(data) - {"files", "folders", "extensions", "filters"}
+    if unknown:
+        raise ValueError(f"unknown section(s) {', '.join(sorted(unknown))}")
+    files = _name_rules(data.get("files", {}), DEFAULT_RULES.files, "files")
+    folders = _name_rules(data.get("folders", {}), DEFAULT_RULES.folders, "folders")
+    extensions = {}
+    for ext, settings in data.get("extensions", {}).items():
+        key = ext.lower() if ext.startswith(".") else "." + ext.lower()
+        extensions[key] = _name_rules(settings, files, f"extensions.{ext}")
+    return RuleSet(files, folders, extensions)
+
+
+def read_config(path: Path) -> dict:
+    """The JSON object in a rules file."""
+    with open(path, encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"{path}: not valid JSON ({e})")
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected a JSON object")
+    return data
+
+
+def load_rules(path: Path) -> RuleSet:
+    """Read a JSON rules file (see parse_rules())."""
+    data = read_config(path)
+    try:
+        return parse_rules(data)
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}")
+
+
+def _split_ext(name: str):
+    """(stem, extension) split like pathlib: the last dot, not a leading or trailing one."""
+    i = name.rfind(".")
+    if 0 < i < len(name) - 1:
+        return name[:i], name[i:]
+    return name, ""
+
+
+def _stem_transform(rules: NameRules) -> Callable[[str], str]:
+    """Compile the stem part of rules into one function, doing only the steps that are switched on."""
+    case = CASE_STYLES[rules.case]
+    strip = _SUFFIX_RE.sub if rules.strip_suffix else None
+    prefix = _NUMBERED_PREFIX_RE.match if rules.numbered_prefix else None
+
+    def transform(stem: str) -> str:
+        if strip is not None:
+            stem = strip("", stem)
+        if prefix is not None:
+            match = prefix(stem)
+            if match:
+                return match.group(1) + case(match.group(2))
+        return case(stem)
+
+    return transform
+
+
+class CompiledRules:
+    """
+    A RuleSet turned into two functions, file(name) and folder(name), each
+    behind a bounded LRU cache of name -> result. Compile once per run (or
+    process) and reuse.
+    """
+
+    def __init__(self, ruleset: RuleSet = DEFAULT_RULES, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.ruleset = ruleset
+        self.fingerprint = ruleset.fingerprint()
+        folder_stem = _stem_transform(ruleset.folders)
+        file_stem = _stem_transform(ruleset.files)
+        ext_case = CASE_STYLES[ruleset.files.extension]
+        overrides = {ext: (_stem_transform(rules), CASE_STYLES[rules.extension])
+                     for ext, rules in ruleset.extensions.items()}
+
+        def folder(name: str) -> str:
+            if not name:
+                return name
+            return folder_stem(name)
+
+        def file(name: str) -> str:
+            stem, ext = _split_ext(name)
+            if not stem:
+                return name
+            if overrides:
+                override = overrides.get(ext.lower())
+                if override is not None:
+                    return override[0](stem) + override[1](ext)
+            return file_stem(stem) + ext_case(ext)
+
+        self.folder = lru_cache(maxsize=cache_size)(folder)
+        self.file = lru_cache(maxsize=cache_size)(file)
+
+    def cache_info(self) -> Dict[str, tuple]:
+        return {"file": self.file.cache_info(), "folder": self.folder.cache_info()}
+
+
+def compile_rules(ruleset: Optional[RuleSet] = None, cache_size: int = DEFAULT_CACHE_SIZE) -> CompiledRules:
+    return CompiledRules(ruleset or DEFAULT_RULES, cache_size)
@@ -0,0 +1,69 @@
+import threading
+import time
+from typing import Optional
+
+
+STOP_CANCELLED = "cancelled"
+STOP_TIME_BUDGET = "time budget"
+
+
+class Cancelled(Exception):
+    """Raised at a safe point of a scan or planning pass once the run is cancelled."""
+
+
+class RunControl:
+    """
+    Cancel / pause / time budget for a running rename, shared between the
+    thread that runs it and the one that controls it (e.g. the GUI).
+
+    The run only looks at it at safe points: between directories while
+    scanning and planning, and between entries while renaming (never between
+    the two steps of a rename). time_budget (seconds, counted from creation)
+    is checked before each directory is applied.
+    """
+
+    def __init__(self, time_budget: Optional[float] = None):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self.deadline = time.monotonic() + time_budget if time_budget is not None else None
+
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set()  # wake up anything waiting in a pause
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def proceed(self) -> bool:
+        """Block while paused; False once the run is cancelled."""
+        if not self._running.is_set():
+            self._running.wait()
+        return not self._cancelled.is_set()
+
+    def checkpoint(self):
+        """Like proceed(), but raises Cancelled instead of returning False."""
+        if not self.proceed():
+            raise Cancelled("Cancelled")
+
+    def out_of_time(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def stop_reason(self) -> str:
+        """Why the next directory shouldn't be started ("" = keep going). Blocks while paused."""
+        if not self.proceed():
+            return STOP_CANCELLED
+        if self.out_of_time():
+            return STOP_TIME_BUDGET
+        return ""
@@ -7,7 +7,7 @@ from cx_Freeze import setup, Executable
 ctk_path = os.path.dirname(customtkinter.__file__)
 
 build_exe_options = {
-    "packages": ["customtkinter", "file_renamer", "threading", "re", "shutil", "pathlib", "uuid"],
+    "packages": ["customtkinter", "file_renamer", "fs_probe", "rename_index", "rename_journal", "log_sink", "progress", "run_control", "rename_rules", "path_filter", "tree_watch", "preview_model", "content_dedupe", "threading", "re", "shutil", "pathlib", "uuid"],
     "include_files": [
         "README.md",
         (ctk_path, "customtkinter")  # Copy ctk data to lib/customtkinter
@@ -0,0 +1,20 @@
+"""Helpers shared by the test modules (run from this directory, so importable as `helpers`)."""
+import os
+from pathlib import Path
+
+
+def quiet(msg):
+    pass
+
+
+def make_tree(root: Path, files):
+    """Create every file in files (paths relative to root), holding its own relative path as text."""
+    for rel in files:
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(rel)
+
+
+def listing(root: Path):
+    """Every path below root, relative and with "/" separators, sorted."""
+    return sorted(str(p.relative_to(root)).replace(os.sep, "/") for p in root.rglob("*"))
@@ -0,0 +1,37 @@
+import unittest
+import tempfile
+from pathlib import Path
+import sys
+import os
+
+# Add the benchmarks directory to path to import the synthetic tree helpers
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from synthetic import SyscallCounter, make_tree, name_corpus
+from helpers import listing
+
+
+class TestSyntheticTrees(unittest.TestCase):
+    def test_same_seed_gives_same_tree(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            first = make_tree(Path(tmp) / "a", files=200, depth=2, fanout=3, seed=7)
+            second = make_tree(Path(tmp) / "b", files=200, depth=2, fanout=3, seed=7)
+            self.assertEqual(first, 200 + 3 + 9)
+            self.assertEqual(first, second)
+            self.assertEqual(listing(Path(tmp) / "a"), listing(Path(tmp) / "b"))
+
+    def test_name_corpus_is_reproducible(self):
+        self.assertEqual(name_corpus(1000, seed=3), name_corpus(1000, seed=3))
+
+    def test_syscall_counter_restores_os(self):
+        original = os.stat
+        with tempfile.TemporaryDirectory() as tmp:
+            with SyscallCounter() as counter:
+                os.stat(tmp)
+                Path(tmp).exists()
+        self.assertIs(os.stat, original)
+        self.assertEqual(counter.counts["stat"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import tempfile
+import pickle
+from pathlib import Path
+import sys
+import os
+
+# Add parent directory to path to import file_renamer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from content_dedupe import ContentDedupe, hash_file
+from file_renamer import RunStats, merge_dirs, rename_tree
+from helpers import listing, quiet
+
+
+class TestContentDedupe(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self._tmp.name)
+        self.root = self.base / "tree"
+        self.root.mkdir()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, rel, data: bytes):
+        path = self.root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return path
+
+    def test_identical_copy_is_dropped(self):
+        kept = self.write("Report.pdf", b"x" * 5000)
+        inode = kept.stat().st_ino
+        self.write("report (1).pdf", b"x" * 5000)
+        self.write("Notes.txt", b"old")
+        self.write("notes (1).txt", b"new")
+        stats = rename_tree(self.root, dry_run=False, log_callback=quiet, dedupe=ContentDedupe())
+        self.assertEqual(listing(self.root), ["Notes.txt", "Report.pdf"])
+        # The target was left alone, the differing copy still overwrote
+        self.assertEqual((self.root / "Report.pdf").stat().st_ino, inode)
+        self.assertEqual((self.root / "Notes.txt").read_bytes(), b"new")
+        self.assertEqual((stats.deduped, stats.bytes_saved, stats.overwrites), (1, 5000, 1))
+        # Notes.txt has the same size, so both of its copies were hashed too
+        self.assertEqual(stats.bytes_hashed, 2 * 5000 + 2 * 3)
+
+    def test_merge_drops_identical_files(self):
+        self.write("DOCS/a.txt", b"same")
+        self.write("DOCS/b.txt", b"one")
+        self.write("docs (1)/a.txt", b"same")
+        self.write("docs (1)/b.txt", b"two")
+        self.write("docs (1)/c.txt", b"same")  # same size and bytes, but no counterpart: moved
+        stats = RunStats()
+        merge_dirs(self.root / "docs (1)", self.root / "DOCS", dry_run=False, log_callback=quiet, stats=stats,
+                   dedupe=ContentDedupe())
+        self.assertEqual(listing(self.root), ["DOCS", "DOCS/a.txt", "DOCS/b.txt", "DOCS/c.txt"])
+        self.assertEqual((self.root / "DOCS" / "b.txt").read_bytes(), b"two")
+        self.assertEqual((stats.deduped, stats.bytes_saved, stats.merge_individual), (1, 4, 2))
+
+    def test_same_size_different_bytes(self):
+        a = self.write("a.bin", b"abcd")
+        b = self.write("b.bin", b"abce")
+        stats = RunStats()
+        self.assertFalse(ContentDedupe().identical(a, b, stats))
+        self.assertFalse(ContentDedupe().identical(a, a, stats))
+        os.symlink(a, self.root / "link.bin")
+        self.assertFalse(ContentDedupe().identical(self.root / "link.bin", a, stats))
+
+    def test_hash_cache_persists(self):
+        cache_path = self.base / "hashes.sqlite"
+        a = self.write("a.bin", b"z" * 3000)
+        b = self.write("b.bin", b"z" * 3000)
+        dedupe = ContentDedupe(cache_path)
+        stats = RunStats()
+        self.assertTrue(dedupe.identical(a, b, stats))
+        dedupe.close()
+        self.assertEqual(stats.bytes_hashed, 6000)
+
+        # A new run (here: through pickling, as for a pool process) reads nothing again
+        dedupe = pickle.loads(pickle.dumps(ContentDedupe(cache_path)))
+        stats = RunStats()
+        self.assertTrue(dedupe.identical(a, b, stats))
+        self.assertEqual(stats.bytes_hashed, 0)
+        self.assertIn("2 hits", dedupe.summary())
+
+        # A changed file is hashed again
+        b.write_bytes(b"y" * 3000)
+        self.assertFalse(dedupe.identical(a, b, stats))
+        self.assertEqual(stats.bytes_hashed, 3000)
+        dedupe.close()
+
+    def test_hash_file_chunks(self):
+        path = self.write("big.bin", os.urandom(1000))
+        self.assertEqual(hash_file(path, chunk_size=64), hash_file(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
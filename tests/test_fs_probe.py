@@ -0,0 +1,81 @@
+import unittest
+import tempfile
+from pathlib import Path
+import sys
+import os
+from unittest import mock
+
+# Add parent directory to path to import file_renamer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fs_probe
+import file_renamer
+from file_renamer import plan_tree, apply_plan
+from helpers import quiet
+
+
+class TestFsProbe(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        fs_probe.clear_cache()
+
+    def tearDown(self):
+        fs_probe.clear_cache()
+        self._tmp.cleanup()
+
+    def test_probe_leaves_no_files_behind(self):
+        caps = fs_probe.probe_directory(self.root)
+        self.assertIsInstance(caps.case_sensitive, bool)
+        self.assertEqual(list(self.root.iterdir()), [])
+
+    def test_capabilities_are_cached_per_device(self):
+        first = fs_probe.capabilities_for(self.root)
+        (self.root / "sub").mkdir()
+        self.assertIs(fs_probe.capabilities_for(self.root / "sub"), first)
+
+    def test_direct_and_temp_paths_give_same_result(self):
+        results = []
+        for always_temp in (True, False):
+            root = self.root / str(always_temp)
+            (root / "docs (1)").mkdir(parents=True)
+            for name in ["a (1).TXT", "A.TXT", "b.txt", "docs (1)/c.txt"]:
+                (root / name).write_text(name)
+            stats = apply_plan(plan_tree(root, log_callback=quiet), log_callback=quiet, always_temp=always_temp)
+            results.append((sorted(str(p.relative_to(root)) for p in root.rglob("*")), stats))
+        (temp_tree, temp_stats), (probed_tree, probed_stats) = results
+        self.assertEqual(temp_tree, probed_tree)
+        self.assertEqual(temp_stats.temp_hops, 4)
+        if fs_probe.capabilities_for(self.root).case_sensitive:
+            self.assertEqual((probed_stats.direct_renames, probed_stats.temp_hops), (4, 0))
+
+    def test_case_sensitivity_without_writing(self):
+        (self.root / "Photos").mkdir()
+        self.assertIsNone(fs_probe.case_sensitivity(self.root, ["123", "(1)"]))
+        found = fs_probe.case_sensitivity(self.root, ["123", "Photos"])
+        self.assertEqual(os.listdir(self.root), ["Photos"])
+        self.assertEqual(found, fs_probe.probe_directory(self.root).case_sensitive)
+        fs_probe.clear_cache()
+        self.assertTrue(fs_probe.case_sensitivity(self.root, ["photos", "Photos"]))
+
+    def test_collisions_follow_case_sensitivity(self):
+        def plan(case_sensitive):
+            with mock.patch.object(file_renamer, "case_sensitivity", return_value=case_sensitive):
+                names = file_renamer.DirListing(self.root, ["Report.pdf"], ["Photos"]).names()
+            batch = file_renamer.DirBatch(self.root)
+            file_renamer.plan_entry(batch, names, "photos (1)", "PHOTOS", "FOLDER", quiet, file_renamer.LOG_SUMMARY)
+            file_renamer.plan_entry(batch, names, "report (1).pdf", "REPORT.PDF", "FILE", quiet,
+                                    file_renamer.LOG_SUMMARY)
+            return [action for _, _, _, action in batch.records()]
+
+        # e.g. an SMB mount on Linux: "PHOTOS" is the existing "Photos" folder
+        self.assertEqual(plan(False), ["MERGE", "OVERWRITE"])
+        self.assertEqual(plan(True), ["RENAME", "RENAME"])
+        # Not known yet: plan for the collision, but let apply ask the filesystem
+        self.assertEqual(plan(None), ["MERGE", "OVERWRITE"])
+        with mock.patch.object(file_renamer, "case_sensitivity", return_value=None):
+            self.assertIsNone(file_renamer.DirBatch(self.root, listing=([], ["Photos"])).names)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import tempfile
+import sys
+import os
+
+# Add parent directory to path to import log_sink
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_sink import BufferedLogSink
+
+
+class TestBufferedLogSink(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.sink = BufferedLogSink(max_lines=3, spill_dir=self._tmp.name)
+
+    def tearDown(self):
+        self.sink.close()
+        self._tmp.cleanup()
+
+    def test_drain_returns_lines_in_order(self):
+        self.sink.write("a")
+        self.sink("b")
+        self.assertEqual(self.sink.drain(), (["a", "b"], 0))
+        self.assertEqual(self.sink.drain(), ([], 0))
+        self.assertIsNone(self.sink.spill_path)
+
+    def test_old_lines_are_spilled_to_disk(self):
+        for line in "abcde":
+            self.sink.write(line)
+        self.assertEqual(self.sink.drain(), (["c", "d", "e"], 0))
+        self.sink.write("f")
+        self.assertEqual(self.sink.drain(), (["f"], 1))
+        self.sink.close()
+        with open(self.sink.spill_path, encoding="utf-8") as f:
+            self.assertEqual(f.read().split(), ["a", "b", "c"])
+
+    def test_flood_spills_in_log_order(self):
+        for line in "abc":
+            self.sink.write(line)
+        self.sink.drain()
+        for line in "defghi":
+            self.sink.write(line)
+        self.assertEqual(self.sink.drain(), (["g", "h", "i"], 3))
+        self.sink.close()
+        with open(self.sink.spill_path, encoding="utf-8") as f:
+            self.assertEqual(f.read().split(), ["a", "b", "c", "d", "e", "f"])
+
+    def test_multiline_messages_count_as_lines(self):
+        self.sink.write("\nVisiting folder:")
+        self.sink.write("a")
+        self.assertEqual(self.sink.drain(), (["", "Visiting folder:", "a"], 0))
+        self.sink.write("\n" + "=" * 3)
+        self.assertEqual(self.sink.drain(), (["", "==="], 2))
+        self.sink.close()
+        with open(self.sink.spill_path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "\nVisiting folder:\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import tempfile
+from pathlib import Path
+import sys
+import os
+
+# Add parent directory to path to import file_renamer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_renamer
+from file_renamer import find_overlapping_roots, log_roots_report, read_roots_file, run_roots
+from run_control import RunControl
+from helpers import listing, make_tree, quiet
+
+
+class TestRoots(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_overlaps(self):
+        a, b = str(self.base / "a"), str(self.base / "b")
+        self.assertEqual(find_overlapping_roots([a, b, str(self.base / "ab")]), [])
+        self.assertEqual(find_overlapping_roots([str(self.base / "a" / "x"), b, a]), [(a, str(self.base / "a" / "x"))])
+        self.assertEqual(len(find_overlapping_roots([a, a + os.sep])), 1)
+
+    def test_roots_file(self):
+        path = self.base / "roots.txt"
+        path.write_text("# nightly\n/srv/a\n\n  /srv/b  \n")
+        self.assertEqual(read_roots_file(path), ["/srv/a", "/srv/b"])
+
+    def test_run_roots_in_processes(self):
+        roots = []
+        for name in ("sales", "hr", "it"):
+            make_tree(self.base / name, [f"{name} (1)/report (2).PDF", "notes.TXT"])
+            roots.append(str(self.base / name))
+        roots.append(str(self.base / "missing"))
+
+        lines = []
+        options = {"dry_run": False, "log_level": file_renamer.LOG_CHANGES}
+        results = run_roots(roots, options, root_workers=2, log_callback=lines.append)
+
+        self.assertEqual([r.root for r in results], roots)
+        self.assertEqual([r.error is None for r in results], [True, True, True, False])
+        self.assertIn("IT/Report.PDF", listing(self.base / "it"))
+        # Each root's log comes out as one block
+        blocks = {}
+        for line in lines:
+            if line.startswith("\n##### "):
+                current = blocks.setdefault(line.strip("\n# "), [])
+            else:
+                current.append(line)
+        self.assertEqual(sorted(blocks), sorted(roots))
+        for root in roots[:3]:
+            self.assertEqual([l for l in blocks[root] if l.startswith("ROOT:")], [f"ROOT: {root}"])
+            self.assertEqual(len([l for l in blocks[root] if l.startswith("RENAME")]), 3)
+        total = log_roots_report(results, quiet)
+        self.assertEqual(total.actions, 9)
+
+    def test_log_dir_keeps_one_file_per_root(self):
+        roots = []
+        for name in ("a", "b"):
+            make_tree(self.base / name, ["x (1).TXT"])
+            roots.append(str(self.base / name))
+        log_dir = self.base / "logs"
+        log_dir.mkdir()
+        results = run_roots(roots, {"dry_run": True}, log_dir=log_dir, log_callback=quiet)
+        self.assertEqual(len(list(log_dir.iterdir())), 2)
+        for result in results:
+            self.assertIn(f"ROOT: {result.root}", Path(result.log_path).read_text(encoding="utf-8"))
+
+    def test_cancel_skips_queued_roots(self):
+        roots = []
+        for n in range(8):
+            name = f"root{n}"
+            make_tree(self.base / name, [f"dir {d} (1)/file {f} (1).TXT" for d in range(10) for f in range(20)])
+            roots.append(str(self.base / name))
+        control = RunControl()
+
+        def log(msg):
+            # Cancel as soon as the first root is done
+            if msg.startswith("\n##### "):
+                control.cancel()
+
+        results = run_roots(roots, {"dry_run": False, "log_level": file_renamer.LOG_SUMMARY}, root_workers=2,
+                            log_callback=log, control=control)
+        not_started = [r for r in results if r.error == "not started (cancelled)"]
+        self.assertTrue(not_started)
+        self.assertGreater(len(results) - len(not_started), 0)
+        for result in not_started:
+            self.assertIn("dir 0 (1)", listing(Path(result.root)))
+
+
+if __name__ == '__main__':
+    unittest.main()
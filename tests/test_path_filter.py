@@ -0,0 +1,111 @@
+import unittest
+import tempfile
+import pickle
+from pathlib import Path
+from unittest import mock
+import sys
+import os
+
+# Add parent directory to path to import file_renamer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_renamer
+from file_renamer import plan_tree, prescan_tree, rename_tree
+from path_filter import PathFilter, parse_filters, split_patterns
+from helpers import listing, make_tree, quiet
+
+
+FILES = [
+    "project (1)/.git/objects/pack (1).idx",
+    "project (1)/node_modules/left pad/index (1).js",
+    "project (1)/src/main (1).py",
+    "project (1)/notes.txt",
+    "photos/2020/beach.jpg",
+    "photos/2020/deep/sea.jpg",
+    "readme (1).md",
+]
+
+
+class TestPathFilter(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        make_tree(self.root, FILES)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def planned(self, path_filter):
+        plan = plan_tree(self.root, log_callback=quiet, path_filter=path_filter)
+        ops = sorted(str(op.src.relative_to(self.root)).replace(os.sep, "/") for op in plan.iter_ops())
+        return ops, plan.stats
+
+    def test_excluded_folders_are_never_listed(self):
+        listed = []
+        real_list_dir = file_renamer.list_dir
+
+        def spy(path):
+            listed.append(os.path.basename(path))
+            return real_list_dir(path)
+
+        with mock.patch.object(file_renamer, "list_dir", spy):
+            ops, stats = self.planned(PathFilter(exclude=[".git", "node_modules"]))
+        self.assertFalse({".git", "objects", "node_modules", "left pad"} & set(listed))
+        self.assertEqual(ops, ["photos", "photos/2020/beach.jpg", "photos/2020/deep", "photos/2020/deep/sea.jpg",
+                               "project (1)", "project (1)/notes.txt", "project (1)/src",
+                               "project (1)/src/main (1).py", "readme (1).md"])
+        self.assertEqual((stats.pruned_dirs, stats.filtered), (2, 2))
+
+    def test_include_and_path_patterns(self):
+        ops, stats = self.planned(PathFilter(include=["*.py", "re:^photos/2020/[^/]+$"]))
+        self.assertEqual(ops, ["photos/2020/beach.jpg", "photos/2020/deep", "project (1)/src/main (1).py"])
+        ops, _ = self.planned(PathFilter(exclude=["photos/2020/*"]))
+        self.assertNotIn("photos/2020/beach.jpg", ops)
+        self.assertIn("photos", ops)
+
+    def test_max_depth(self):
+        ops, stats = self.planned(PathFilter(max_depth=1))
+        self.assertEqual(ops, ["photos", "project (1)", "readme (1).md"])
+        self.assertEqual(stats.pruned_dirs, 2)
+        ops, _ = self.planned(PathFilter(max_depth=2))
+        self.assertIn("project (1)/src", ops)
+        self.assertNotIn("project (1)/src/main (1).py", ops)
+
+    def test_excluded_target_is_not_overwritten(self):
+        make_tree(self.root, ["keep/Report.txt", "keep/report (1).txt"])
+        rename_tree(self.root, dry_run=False, log_callback=quiet, path_filter=PathFilter(exclude=["Report.txt"]))
+        tree = listing(self.root)
+        self.assertIn("KEEP/Report.txt", tree)
+        self.assertIn("KEEP/report (1).txt", tree)
+
+    def test_prescan_run_uses_the_filter(self):
+        path_filter = PathFilter(exclude=[".git", "node_modules"], max_depth=3)
+        expected = [l.path for l in file_renamer.scan_tree(self.root, path_filter=path_filter)]
+        scan = prescan_tree(self.root, workers=4, path_filter=path_filter)
+        self.assertEqual([l.path for l in scan.listings], expected)
+
+        updates = []
+        stats = rename_tree(self.root, dry_run=False, log_callback=quiet, progress=updates.append,
+                            path_filter=path_filter)
+        tree = listing(self.root)
+        self.assertIn("PROJECT/.git/objects/pack (1).idx", tree)
+        # deep is renamed (depth 3) but not walked
+        self.assertIn("PHOTOS/2020/DEEP/sea.jpg", tree)
+        self.assertIn("PHOTOS/2020/Beach.jpg", tree)
+        self.assertEqual(stats.pruned_dirs, 3)
+
+    def test_config_and_pickling(self):
+        self.assertIsNone(parse_filters({}))
+        path_filter = parse_filters({"exclude": ["re:\\.bak$"], "max_depth": 2})
+        copy = pickle.loads(pickle.dumps(path_filter))
+        self.assertEqual(copy.fingerprint, path_filter.fingerprint)
+        self.assertTrue(copy.left_alone("a.bak", "x/a.bak"))
+        for data in ({"exclude": "*.bak"}, {"max_depth": 0}, {"depth": 2}, {"include": ["re:("]}):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    parse_filters(data)
+        self.assertEqual(split_patterns(" .git; node_modules ;\n*.bak;"), [".git", "node_modules", "*.bak"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import tempfile
+from pathlib import Path
+import sys
+import os
+
+# Add parent directory to path to import file_renamer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_renamer import export_plan, apply_plan_file, read_plan_header
+from helpers import quiet
+
+
+class TestPlanFile(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name) / "tree"
+        self.plan_path = Path(self._tmp.name) / "plan.jsonl"
+        for rel in ["photos (1)/img (2).JPG", "photos (1)/keep.txt", "notes.TXT"]:
+            path = self.root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(rel)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_export_then_apply(self):
+        export_plan(self.root, self.plan_path, log_callback=quiet)
+        self.assertTrue((self.root / "photos (1)").exists())
+        self.assertEqual(read_plan_header(self.plan_path)["root"], str(self.root.resolve()))
+
+        stats = apply_plan_file(self.plan_path, log_callback=quiet)
+        self.assertEqual((stats.actions, stats.skipped), (4, 0))
+        self.assertEqual(sorted(p.name for p in (self.root / "PHOTOS").iterdir()), ["Img.JPG", "Keep.txt"])
+
+    def test_relative_root_applies_from_another_directory(self):
+        cwd = os.getcwd()
+        try:
+            os.chdir(self._tmp.name)
+            export_plan(Path("tree"), self.plan_path, log_callback=quiet)
+            # A folder with the same relative name elsewhere must not be touched
+            other = Path(self._tmp.name) / "other"
+            (other / "tree").mkdir(parents=True)
+            (other / "tree" / "notes.TXT").write_text("other")
+            os.chdir(other)
+            stats = apply_plan_file(self.plan_path, log_callback=quiet)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual((stats.actions, stats.skipped), (4, 0))
+        self.assertTrue((self.root / "PHOTOS" / "Img.JPG").exists())
+        self.assertTrue((other / "tree" / "notes.TXT").exists())
+
+    def test_missing_sources_are_skipped(self):
+        export_plan(self.root, self.plan_path, log_callback=quiet)
+        (self.root / "notes.TXT").unlink()
+        stats = apply_plan_file(self.plan_path, log_callback=quiet)
+        self.assertEqual((stats.actions, stats.skipped), (3, 1))
+
+    def test_truncated_plan_is_rejected(self):
+        export_plan(self.root, self.plan_path, log_callback=quiet)
+        lines = self.plan_path.read_text().splitlines(keepends=True)
+        self.plan_path.write_text("".join(lines[:-1]))
+        with self.assertRaises(ValueError):
+            apply_plan_file(self.plan_path, log_callback=quiet)
+        self.assertTrue((self.root / "notes.TXT").exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import tempfile
+from pathlib import Path
+import sys
+import os
+
+# Add parent directory to path to import file_renamer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_renamer import apply_plan, plan_tree
+from path_filter import PathFilter
+from preview_model import PlanPreview, plan_mismatch
+from helpers import listing, make_tree, quiet
+
+
+FILES = ["b dir/zeta (1).txt", "b dir/Zeta.txt", "b dir/alpha.txt", "a dir/mid.txt", "a dir (1)/other.txt"]
+
+
+class TestPlanPreview(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        make_tree(self.root, FILES)
+        self.preview = PlanPreview(plan_tree(self.root, log_callback=quiet))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def shown(self):
+        return [(row[2], row[4]) for row in self.preview.rows(0, len(self.preview.view))]
+
+    def test_rows_in_plan_order(self):
+        rows = self.preview.rows(0, 100)
+        self.assertEqual(len(rows), len(self.preview))
+        self.assertIn((True, "b dir", "zeta (1).txt", "Zeta.txt", "OVERWRITE", True), rows)
+        # "a dir" and "a dir (1)" both become "A DIR": the one without a number is renamed, the other merged
+        self.assertIn((True, ".", "a dir", "A DIR", "RENAME", False), rows)
+        self.assertIn((True, ".", "a dir (1)", "A DIR", "MERGE", True), rows)
+        self.assertEqual(self.preview.rows(len(self.preview) - 1, 10)[0][1], ".")
+
+    def test_sort_and_filter(self):
+        self.preview.sort("old")
+        names = [row[0] for row in self.shown()]
+        self.assertEqual(names, sorted(names))
+        self.preview.sort("old", descending=True)
+        self.assertEqual([row[0] for row in self.shown()], sorted(names, reverse=True))
+
+        self.preview.sort("collision", descending=True)
+        self.assertEqual({action for _, action in self.shown()[:2]}, {"OVERWRITE", "MERGE"})
+        self.preview.filter(["RENAME"])
+        self.assertTrue(self.shown())
+        self.assertEqual({action for _, action in self.shown()}, {"RENAME"})
+        self.preview.sort("folder")
+        self.assertEqual({action for _, action in self.shown()}, {"RENAME"})
+        folders = [row[1] for row in self.preview.rows(0, 100)]
+        self.assertEqual(folders, sorted(folders, key=lambda f: str(self.root / f)))
+
+    def test_deselected_rows_are_not_applied(self):
+        self.preview.filter(["OVERWRITE", "MERGE"])
+        self.preview.select_shown(False)
+        self.assertEqual(self.preview.selected_count, len(self.preview) - 2)
+        self.preview.filter(["RENAME", "OVERWRITE", "MERGE"])
+        self.preview.sort("old")
+        position = [row[2] for row in self.preview.rows(0, 100)].index("alpha.txt")
+        self.preview.toggle(position)
+        self.assertFalse(self.preview.rows(position, 1)[0][0])
+
+        apply_plan(self.preview.selected_plan(), log_callback=quiet)
+        tree = listing(self.root)
+        self.assertIn("B DIR/zeta (1).txt", tree)
+        self.assertIn("B DIR/alpha.txt", tree)
+        # The merge of "a dir (1)" was deselected, its own contents still renamed
+        self.assertIn("a dir (1)/Other.txt", tree)
+        self.assertIn("A DIR/Mid.txt", tree)
+
+    def test_nothing_deselected_keeps_plan(self):
+        self.assertIs(self.preview.selected_plan(), self.preview.plan)
+        self.preview.toggle(0)
+        self.preview.toggle(0)
+        self.assertIs(self.preview.selected_plan(), self.preview.plan)
+
+    def test_outdated_selection_is_refused(self):
+        self.preview.toggle(0)
+        selection = self.preview.selected_plan()
+        self.assertIsNone(plan_mismatch(selection, self.root))
+        self.assertEqual(plan_mismatch(selection, self.root / "b dir"), "a different folder is selected")
+        self.assertEqual(plan_mismatch(selection, self.root, PathFilter(exclude=["*.txt"])), "the filters changed")
+        (self.root / "b dir" / "new.txt").write_text("x")
+        os.utime(self.root / "b dir", ns=(0, 0))
+        self.assertIsNone(plan_mismatch(selection, self.root, check_tree=False))
+        self.assertEqual(plan_mismatch(selection, self.root), "the folder changed")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import tempfile
+from pathlib import Path
+import sys
+import os
+
+# Add parent directory to path to import file_renamer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_renamer
+from progress import Progress, ProgressTracker, format_progress
+from run_control import RunControl
+from helpers import make_tree, quiet
+
+
+FILES = [f"dept {d}/year (1)/file {f} (2).TXT" for d in range(4) for f in range(3)] + ["top.TXT"]
+
+
+class TestProgressTracker(unittest.TestCase):
+    def test_throttles_and_finishes(self):
+        updates = []
+        tracker = ProgressTracker(updates.append, "apply", total=1000, interval=3600)
+        for _ in range(1000):
+            tracker.advance()
+        self.assertEqual(updates, [])
+        tracker.finish()
+        self.assertEqual(len(updates), 1)
+        self.assertEqual((updates[0].done, updates[0].total, updates[0].fraction), (1000, 1000, 1.0))
+        self.assertEqual(updates[0].eta, 0)
+
+    def test_unknown_total_has_no_eta(self):
+        update = Progress("scan", 10, 0, 5.0, None)
+        self.assertIsNone(update.fraction)
+        self.assertEqual(format_progress(update), "scan: 10 5/s")
+
+
+class TestPrescan(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        make_tree(self.root, FILES)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_same_order_as_scan_tree(self):
+        expected = [l.path for l in file_renamer.scan_tree(self.root)]
+        scan = file_renamer.prescan_tree(self.root, workers=4)
+        self.assertEqual([l.path for l in scan.listings], expected)
+        self.assertEqual(scan.entries, len(FILES) + 4 + 4)
+
+    def test_cancel(self):
+        control = RunControl()
+        control.cancel()
+        with self.assertRaises(file_renamer.Cancelled):
+            file_renamer.prescan_tree(self.root, control=control)
+        with self.assertRaises(file_renamer.Cancelled):
+            file_renamer.rename_tree(self.root, dry_run=False, log_callback=quiet, control=control)
+        self.assertTrue((self.root / "dept 0").exists())
+
+    def test_rename_tree_reports_every_phase(self):
+        updates = []
+        stats = file_renamer.rename_tree(self.root, dry_run=False, log_callback=quiet, progress=updates.append)
+        last = {u.phase: u for u in updates}
+        self.assertEqual(set(last), {"scan", "plan", "apply"})
+        self.assertEqual(last["plan"].done, last["plan"].total)
+        self.assertEqual(last["apply"].done, stats.actions)
+        self.assertEqual(last["apply"].total, stats.actions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import tempfile
+from pathlib import Path
+import sys
+import os
+
+# Add parent directory to path to import file_renamer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_renamer import plan_tree, rules_fingerprint
+from rename_index import RenameIndex
+from helpers import quiet
+
+
+class TestRenameIndex(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name) / "tree"
+        self.index_path = Path(self._tmp.name) / "index.sqlite"
+        for rel in ["A.txt", "DOCS/B.txt", "DOCS/OLD/C.txt", "MUSIC/D.mp3"]:
+            path = self.root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(rel)
+        # Pretend the tree was last touched long ago so the settle window doesn't apply
+        for path in [self.root, *self.root.rglob("*")]:
+            os.utime(path, ns=(10**18, 10**18))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def run_plan(self, fingerprint=None, root=None):
+        index = RenameIndex(self.index_path, fingerprint or rules_fingerprint())
+        try:
+            plan = plan_tree(root or self.root, log_callback=quiet, index=index)
+        finally:
+            index.close()
+        return plan, index
+
+    def test_second_run_skips_unchanged_dirs(self):
+        plan, index = self.run_plan()
+        self.assertEqual((index.hits, index.recorded), (0, 4))
+        self.assertEqual(plan.visited_files, 4)
+
+        plan, index = self.run_plan()
+        self.assertEqual(index.hits, 4)
+        self.assertEqual((plan.visited_dirs, plan.skipped_dirs, plan.visited_files), (0, 4, 0))
+
+    def test_relative_root_shares_entries(self):
+        cwd = os.getcwd()
+        try:
+            os.chdir(self._tmp.name)
+            self.run_plan(root=Path("tree"))
+        finally:
+            os.chdir(cwd)
+        plan, index = self.run_plan()
+        self.assertEqual((index.hits, plan.visited_dirs), (4, 0))
+
+    def test_changed_dir_is_rescanned(self):
+        self.run_plan()
+        (self.root / "DOCS" / "OLD" / "new (1).txt").write_text("x")
+        plan, index = self.run_plan()
+        self.assertEqual(index.misses, 1)
+        self.assertEqual(plan.operation_count, 1)
+
+    def test_rule_change_resets_index(self):
+        self.run_plan()
+        plan, index = self.run_plan(fingerprint="other rules")
+        self.assertTrue(index.invalidated)
+        self.assertEqual(index.hits, 0)
+        self.assertEqual(plan.visited_dirs, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
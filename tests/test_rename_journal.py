@@ -0,0 +1,94 @@
+import unittest
+import tempfile
+import uuid
+from pathlib import Path
+import sys
+import os
+
+# Add parent directory to path to import file_renamer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_renamer
+from file_renamer import plan_tree, apply_plan, rename_tree, resume_from_journal
+from rename_journal import RenameJournal, load_journal
+from helpers import listing, quiet
+
+
+class TestJournalResume(unittest.TestCase):
+    FILES = ["docs (1)/a (1).txt", "docs (1)/b.txt", "music/c.MP3", "music/D (2).mp3", "top.txt"]
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def make_tree(self, name):
+        root = self.base / name
+        for rel in self.FILES:
+            path = root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(rel)
+        return root
+
+    def test_resume_after_crash_between_renames(self):
+        expected_root = self.make_tree("expected")
+        rename_tree(expected_root, dry_run=False, log_callback=quiet)
+
+        root = self.make_tree("crashed")
+        journal_path = self.base / "journal.jsonl"
+        plan = plan_tree(root, log_callback=quiet)
+        journal = RenameJournal(journal_path, commit_every=1)
+        journal.write_plan(root, plan.batches)
+
+        # First batch completes, the second dies after the src -> tmp step of its first op
+        apply_plan(file_renamer.RenamePlan(root, plan.batches[:1]), log_callback=quiet, journal=journal)
+        batch = plan.batches[1]
+        op = batch.ops[0]
+        tmp_name = f"__tmp__{uuid.uuid4().hex}__{op.src.name}"
+        journal.begin_dir(batch.path)
+        journal.record_op(batch.path, op.src.name, tmp_name, op.dst.name, op.kind)
+        op.src.rename(batch.path / tmp_name)
+        journal.close()
+
+        state = load_journal(journal_path)
+        self.assertEqual(state.in_flight, {str(batch.path)})
+
+        resume_from_journal(journal_path, log_callback=quiet)
+        self.assertEqual(listing(root), listing(expected_root))
+        self.assertTrue(load_journal(journal_path).finished)
+
+    def test_relative_root_resumes_from_another_directory(self):
+        expected_root = self.make_tree("expected")
+        rename_tree(expected_root, dry_run=False, log_callback=quiet)
+        root = self.make_tree("tree")
+        journal_path = self.base / "journal.jsonl"
+        cwd = os.getcwd()
+        try:
+            os.chdir(self.base)
+            plan = plan_tree(Path("tree"), log_callback=quiet)
+            journal = RenameJournal(journal_path)
+            journal.write_plan(plan.root, plan.batches)
+            journal.close()
+            os.chdir(expected_root)
+            resume_from_journal(journal_path, log_callback=quiet)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(load_journal(journal_path).root, Path(os.path.abspath(self.base / "tree")))
+        self.assertEqual(listing(root), listing(expected_root))
+
+    def test_rename_tree_writes_complete_journal(self):
+        root = self.make_tree("tree")
+        journal_path = self.base / "journal.jsonl"
+        journal = RenameJournal(journal_path)
+        rename_tree(root, dry_run=False, log_callback=quiet, journal=journal)
+        journal.close()
+        state = load_journal(journal_path)
+        self.assertTrue(state.finished)
+        self.assertEqual(state.in_flight, set())
+        self.assertEqual(len(state.done), len(state.plan))
+
+
+if __name__ == '__main__':
+    unittest.main()
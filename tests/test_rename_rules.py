@@ -0,0 +1,86 @@
+import unittest
+import tempfile
+import json
+from pathlib import Path
+import sys
+import os
+
+# Add parent directory to path to import file_renamer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_renamer
+from rename_rules import DEFAULT_RULES, compile_rules, load_rules, parse_rules
+from helpers import quiet
+
+
+class TestCompiledRules(unittest.TestCase):
+    def test_default_rules(self):
+        rules = compile_rules()
+        self.assertEqual(rules.folder("my folder (2)"), "MY FOLDER")
+        self.assertEqual(rules.folder("1. my folder"), "1. MY FOLDER")
+        self.assertEqual(rules.file("my report (1).PDF"), "My Report.PDF")
+        self.assertEqual(rules.file(".bashrc"), ".Bashrc")
+        self.assertEqual(rules.file("archive.tar.GZ"), "Archive.Tar.GZ")
+        self.assertEqual(rules.file(""), "")
+        # Same output as the original stem.lower().title(), Unicode corner cases included
+        for name in ("İstanbul.txt", "ᲐAB.txt", "ǅungla.txt"):
+            stem, ext = os.path.splitext(name)
+            self.assertEqual(rules.file(name), stem.lower().title() + ext)
+
+    def test_settings_and_overrides(self):
+        rules = compile_rules(parse_rules({
+            "folders": {"case": "lower", "numbered_prefix": False, "strip_suffix": False},
+            "files": {"case": "capitalize", "extension": "lower"},
+            "extensions": {"JPG": {"case": "upper"}, ".md": {"case": "keep", "strip_suffix": False}},
+        }))
+        self.assertEqual(rules.folder("2. My Folder (3)"), "2. my folder (3)")
+        self.assertEqual(rules.file("my REPORT (1).PDF"), "My report.pdf")
+        self.assertEqual(rules.file("holiday (1).Jpg"), "HOLIDAY.jpg")
+        self.assertEqual(rules.file("ReadMe (2).MD"), "ReadMe (2).md")
+
+    def test_cache_is_bounded(self):
+        rules = compile_rules(cache_size=2)
+        for name in ("a.txt", "b.txt", "c.txt", "a.txt"):
+            rules.file(name)
+        info = rules.cache_info()["file"]
+        self.assertEqual((info.currsize, info.maxsize, info.hits), (2, 2, 0))
+
+    def test_invalid_config(self):
+        for data in ({"files": {"case": "shout"}}, {"folders": {"colour": "red"}}, {"other": {}},
+                     {"files": {"extension": "title"}}, {"files": {"strip_suffix": "yes"}}):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    parse_rules(data)
+
+    def test_fingerprint_follows_settings(self):
+        self.assertEqual(parse_rules({}).fingerprint(), DEFAULT_RULES.fingerprint())
+        self.assertNotEqual(parse_rules({"files": {"case": "lower"}}).fingerprint(), DEFAULT_RULES.fingerprint())
+
+
+class TestActiveRules(unittest.TestCase):
+    def tearDown(self):
+        file_renamer.set_rules(None)
+
+    def test_rules_file_drives_plan(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            config = base / "rules.json"
+            config.write_text(json.dumps({"folders": {"case": "lower"}, "files": {"case": "upper"}}))
+            root = base / "tree"
+            (root / "My Folder (1)").mkdir(parents=True)
+            (root / "My Folder (1)" / "notes.txt").write_text("x")
+
+            default_fingerprint = file_renamer.rules_fingerprint()
+            file_renamer.set_rules(load_rules(config))
+            self.assertNotEqual(file_renamer.rules_fingerprint(), default_fingerprint)
+            plan = file_renamer.plan_tree(root, log_callback=quiet)
+            self.assertEqual(sorted((op.src_name, op.dst_name) for b in plan.batches for op in b.ops),
+                             [("My Folder (1)", "my folder"), ("notes.txt", "NOTES.txt")])
+            lines = []
+            file_renamer.rename_tree(root, dry_run=True, log_callback=lines.append)
+            self.assertIn("RULES (custom): " + load_rules(config).describe(), lines)
+            self.assertIn("folders -> lower case", load_rules(config).describe())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import unittest
+import tempfile
+from pathlib import Path
+import sys
+import os
+
+# Add parent directory to path to import file_renamer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_renamer
+from file_renamer import plan_tree, apply_plan, rename_tree
+from helpers import listing, make_tree, quiet
+
+
+class TestPlanApply(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_plan_does_not_touch_tree(self):
+        make_tree(self.root, ["photos (1)/image one.JPG", "notes.txt"])
+        before = listing(self.root)
+        plan = plan_tree(self.root, log_callback=quiet)
+        self.assertEqual(listing(self.root), before)
+        self.assertEqual(plan.visited_files, 2)
+        self.assertEqual(plan.operation_count, 3)
+
+    def test_collisions_are_planned_as_overwrite(self):
+        make_tree(self.root, ["report (1).pdf", "Report.pdf"])
+        plan = plan_tree(self.root, log_callback=quiet)
+        [op] = list(plan.iter_ops())
+        self.assertEqual(op.action, file_renamer.ACTION_OVERWRITE)
+
+    def test_collision_group_settled_once(self):
+        make_tree(self.root, ["Report.pdf", "REPORT (10).pdf", "report (9).pdf", "docs (2)/a.txt", "docs/a.txt",
+                              "docs (1)/b.txt"])
+        lines = []
+        plan = plan_tree(self.root, log_callback=lines.append, log_level=file_renamer.LOG_CHANGES)
+        ops = {op.src_name: op.action for op in plan.iter_ops() if op.src.parent == self.root}
+        self.assertEqual(ops, {"REPORT (10).pdf": "OVERWRITE", "report (9).pdf": "DROP", "docs": "RENAME",
+                               "docs (1)": "MERGE", "docs (2)": "MERGE"})
+        self.assertEqual(plan.stats.collision_groups, 2)
+        self.assertEqual(sum(l.startswith("GROUP") for l in lines), 2)
+
+        stats = rename_tree(self.root, dry_run=False, log_callback=quiet, plan=plan)
+        self.assertEqual(listing(self.root), ["DOCS", "DOCS/A.txt", "DOCS/B.txt", "Report.pdf"])
+        self.assertEqual((self.root / "Report.pdf").read_text(), "REPORT (10).pdf")
+        # Highest-ranked folder merged last, so its copy wins
+        self.assertEqual((self.root / "DOCS" / "A.txt").read_text(), "docs (2)/a.txt")
+        self.assertEqual((stats.dropped, stats.overwrites, stats.merges), (1, 1, 2))
+
+    def test_drop_falls_back_to_rename_without_winner(self):
+        make_tree(self.root, ["a (1).txt"])
+        batch = file_renamer.DirBatch(self.root)
+        batch.add("FILE", "a (1).txt", "A.txt", file_renamer.ACTION_DROP)
+        stats = apply_plan(file_renamer.RenamePlan(root=self.root, batches=[batch]), log_callback=quiet)
+        self.assertEqual(listing(self.root), ["A.txt"])
+        self.assertEqual((stats.dropped, stats.renames), (0, 1))
+
+    def test_apply_dry_run_plan(self):
+        make_tree(self.root, ["photos (1)/image one.JPG", "photos/old.txt", "notes.txt"])
+        plan = plan_tree(self.root, log_callback=quiet)
+        self.assertFalse(plan.is_stale())
+        apply_plan(plan, log_callback=quiet)
+        self.assertEqual(listing(self.root), ["Notes.txt", "PHOTOS", "PHOTOS/Image One.JPG", "PHOTOS/Old.txt"])
+
+    def test_plan_goes_stale_when_tree_changes(self):
+        make_tree(self.root, ["sub/a.txt"])
+        plan = plan_tree(self.root, log_callback=quiet)
+        (self.root / "sub" / "new.txt").write_text("x")
+        os.utime(self.root / "sub", ns=(0, 0))
+        self.assertTrue(plan.is_stale())
+
+    def test_rename_tree_reuses_plan(self):
+        make_tree(self.root, ["a (2).txt"])
+        plan = rename_tree(self.root, dry_run=True, log_callback=quiet).plan
+        rename_tree(self.root, dry_run=False, log_callback=quiet, plan=plan)
+        self.assertEqual(listing(self.root), ["A.txt"])
+
+    def test_merge_folders_with_collisions(self):
+        make_tree(self.root, ["Photos/a.jpg", "Photos/keep.jpg", "photos (1)/a.jpg", "photos (1)/new/b.jpg"])
+        plan = plan_tree(self.root, log_callback=quiet)
+        stats = apply_plan(plan, log_callback=quiet)
+        self.assertEqual(listing(self.root), ["PHOTOS", "PHOTOS/A.jpg", "PHOTOS/Keep.jpg", "PHOTOS/NEW", "PHOTOS/NEW/B.jpg"])
+        self.assertGreater(stats.syscalls_avoided, 0)
+
+    def test_merge_moves_non_colliding_subtrees_whole(self):
+        make_tree(self.root, ["src/NEW/DEEP/x.txt", "src/NEW/y.txt", "src/SHARED/a.txt", "src/File.txt",
+                              "dst/SHARED/b.txt", "dst/File.txt"])
+        (self.root / "src" / "File.txt").write_text("from src")
+        stats = file_renamer.RunStats()
+        file_renamer.merge_dirs(self.root / "src", self.root / "dst", dry_run=False, log_callback=quiet, stats=stats)
+        self.assertEqual(listing(self.root), ["dst", "dst/File.txt", "dst/NEW", "dst/NEW/DEEP", "dst/NEW/DEEP/x.txt",
+                                              "dst/NEW/y.txt", "dst/SHARED", "dst/SHARED/a.txt", "dst/SHARED/b.txt"])
+        self.assertEqual((self.root / "dst" / "File.txt").read_text(), "from src")
+        self.assertEqual((stats.merge_bulk, stats.merge_individual), (1, 2))
+
+    def test_scan_tree_is_bottom_up(self):
+        make_tree(self.root, ["a/b/c.txt", "a/d.txt"])
+        order = [str(l.path.relative_to(self.root)) for l in file_renamer.scan_tree(self.root)]
+        self.assertEqual(order, [os.path.join("a", "b"), "a", "."])
+        order = [str(l.path.relative_to(self.root)) for l in file_renamer.scan_tree(self.root, topdown=True)]
+        self.assertEqual(order, [".", "a", os.path.join("a", "b")])
+
+
+class TestCompactBatch(unittest.TestCase):
+    def test_records_and_views(self):
+        batch = file_renamer.DirBatch(Path("/data"), listing=(["a.TXT"], ["sub"]))
+        batch.add("FILE", "a.TXT", "A.txt", file_renamer.ACTION_RENAME)
+        batch.add("FOLDER", "sub", "SUB", file_renamer.ACTION_MERGE)
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(list(batch.records()), [("FILE", "a.TXT", "A.txt", "RENAME"), ("FOLDER", "sub", "SUB", "MERGE")])
+        op = batch.ops[1]
+        self.assertEqual((op.src, op.dst, op.kind, op.action), (Path("/data/sub"), Path("/data/SUB"), "FOLDER", "MERGE"))
+        self.assertEqual(file_renamer.DirBatch(Path("/data"), batch.ops).ops, batch.ops)
+        # /data can't be looked at, so apply would ask the filesystem
+        self.assertIsNone(batch.names)
+        with tempfile.TemporaryDirectory() as tmp:
+            batch = file_renamer.DirBatch(Path(tmp), listing=(["a.TXT"], ["sub"]))
+            self.assertEqual(batch.names, {batch.names.key("a.TXT"): False, "sub": True})
+        self.assertIsNone(file_renamer.DirBatch(Path("/data")).names)
+
+    def test_names_are_interned(self):
+        first = file_renamer.DirBatch(Path("/a"))
+        second = file_renamer.DirBatch(Path("/b"))
+        first.add("FILE", "thumbs.db", "Thumbs.db", file_renamer.ACTION_RENAME)
+        second.add("FILE", "".join(["thumbs", ".db"]), "".join(["Thumbs", ".db"]), file_renamer.ACTION_RENAME)
+        self.assertIs(first.src_names[0], second.src_names[0])
+        self.assertIs(first.dst_names[0], second.dst_names[0])
+
+
+class TestLogLevels(unittest.TestCase):
+    def run_tree(self, dry_run, level):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            make_tree(root, ["a (1).txt", "Ok.txt", "sub/b.txt"])
+            lines = []
+            rename_tree(root, dry_run=dry_run, log_callback=lines.append, log_level=level)
+            return [l for l in lines if l.startswith(("RENAME", "OVERWRITE", "MERGE"))], lines
+
+    def test_changes_level_prints_one_line_per_change(self):
+        for dry_run in (True, False):
+            changes, lines = self.run_tree(dry_run, file_renamer.LOG_CHANGES)
+            self.assertEqual(len(changes), 3, changes)
+            self.assertFalse(any("Checking" in l for l in lines))
+
+    def test_summary_level_prints_no_entries(self):
+        changes, lines = self.run_tree(False, file_renamer.LOG_SUMMARY)
+        self.assertEqual(changes, [])
+        self.assertIn("Completed operations: 3", lines)
+
+
+class TestParallelApply(unittest.TestCase):
+    FILES = [f"dept {d}/year (1)/sub {s}/file {f} (2).TXT" for d in range(3) for s in range(3) for f in range(4)]
+
+    def run_apply(self, workers):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            make_tree(root, self.FILES)
+            plan = plan_tree(root, log_callback=quiet)
+            lines = []
+            actions = apply_plan(plan, log_callback=lines.append, workers=workers).actions
+            # Temp names are random, drop them before comparing logs
+            lines = [l.replace(tmp, "<root>") for l in lines if "TMP:" not in l]
+            return listing(root), actions, lines
+
+    def test_parallel_matches_sequential(self):
+        seq_tree, seq_actions, seq_log = self.run_apply(1)
+        par_tree, par_actions, par_log = self.run_apply(4)
+        self.assertEqual(par_tree, seq_tree)
+        self.assertEqual(par_actions, seq_actions)
+        self.assertEqual(par_log, seq_log)
+        self.assertIn("DEPT 0/YEAR/SUB 0/File 0.TXT", par_tree)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import tempfile
+import threading
+import time
+from pathlib import Path
+import sys
+import os
+
+# Add parent directory to path to import file_renamer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_renamer
+from file_renamer import plan_tree, apply_plan, rename_tree, resume_from_journal
+from rename_journal import RenameJournal, load_journal
+from run_control import STOP_CANCELLED, STOP_TIME_BUDGET, RunControl
+from helpers import listing, quiet
+
+
+FILES = [f"dept {d} (1)/file {f} (2).TXT" for d in range(3) for f in range(3)] + ["top (1).txt"]
+
+
+class TestRunControl(unittest.TestCase):
+    def test_pause_blocks_until_resumed(self):
+        control = RunControl()
+        control.pause()
+        results = []
+        worker = threading.Thread(target=lambda: results.append(control.proceed()))
+        worker.start()
+        time.sleep(0.05)
+        self.assertEqual(results, [])
+        control.resume()
+        worker.join(1)
+        self.assertEqual(results, [True])
+
+    def test_cancel_wakes_paused_run(self):
+        control = RunControl()
+        control.pause()
+        control.cancel()
+        self.assertFalse(control.proceed())
+        self.assertEqual(control.stop_reason(), STOP_CANCELLED)
+
+    def test_time_budget(self):
+        self.assertEqual(RunControl(3600).stop_reason(), "")
+        self.assertEqual(RunControl(0).stop_reason(), STOP_TIME_BUDGET)
+
+
+class TestStopAndResume(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def make_tree(self, name):
+        root = self.base / name
+        for rel in FILES:
+            path = root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(rel)
+        return root
+
+    def expected(self):
+        root = self.make_tree("expected")
+        rename_tree(root, dry_run=False, log_callback=quiet)
+        return listing(root)
+
+    def test_time_budget_starts_no_folder(self):
+        root = self.make_tree("tree")
+        before = listing(root)
+        stats = apply_plan(plan_tree(root, log_callback=quiet), log_callback=quiet, control=RunControl(0))
+        self.assertEqual(stats.stopped, STOP_TIME_BUDGET)
+        self.assertEqual(stats.actions, 0)
+        self.assertEqual(listing(root), before)
+
+    def test_cancel_between_entries_then_resume(self):
+        expected = self.expected()
+        for workers in (1, 4):
+            with self.subTest(workers=workers):
+                root = self.make_tree(f"tree{workers}")
+                journal_path = self.base / f"journal{workers}.jsonl"
+                control = RunControl()
+
+                def cancel_after_first_change(msg):
+                    if msg.startswith("RENAME"):
+                        control.cancel()
+
+                journal = RenameJournal(journal_path)
+                stats = rename_tree(root, dry_run=False, log_callback=cancel_after_first_change, workers=workers,
+                                    log_level=file_renamer.LOG_CHANGES, journal=journal, control=control)
+                journal.close()
+                self.assertEqual(stats.stopped, STOP_CANCELLED)
+                self.assertGreaterEqual(stats.actions, 1)
+                self.assertFalse(any("__tmp__" in name for name in listing(root)))
+                self.assertFalse(load_journal(journal_path).finished)
+
+                resume_from_journal(journal_path, log_callback=quiet)
+                self.assertEqual(listing(root), expected)
+                self.assertTrue(load_journal(journal_path).finished)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import tempfile
+import json
+from pathlib import Path
+import sys
+import os
+
+# Add parent directory to path to import file_renamer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_renamer
+from file_renamer import LatencyHistogram, RunStats, rename_tree
+from helpers import make_tree, quiet
+
+
+FILES = ["a (1).txt", "A.txt", "Ok.txt", "Photos/x.jpg", "photos (1)/x.jpg", "photos (1)/new.jpg", "sub/b.txt"]
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        h = LatencyHistogram()
+        for _ in range(99):
+            h.record(0.000_010)   # 10 us -> bucket < 16 us
+        h.record(0.5)
+        self.assertEqual(h.count, 100)
+        self.assertEqual(h.percentile(50), 16 / 1_000_000)
+        self.assertGreaterEqual(h.percentile(100), 0.5)
+
+    def test_add(self):
+        a, b = LatencyHistogram(), LatencyHistogram()
+        a.record(0.001)
+        b.record(0.001)
+        b.record(0.1)
+        a.add(b)
+        self.assertEqual(a.count, 3)
+        self.assertEqual(sum(a.buckets.values()), 3)
+
+
+class TestRunStats(unittest.TestCase):
+    def test_add_sums_counters_and_keeps_slowest(self):
+        a, b = RunStats(renames=1, time_renaming=0.5), RunStats(renames=2, errors=1, time_renaming=0.25)
+        for i in range(8):
+            a.note_slow("apply", i, Path(f"a{i}"))
+            b.note_slow("apply", i + 0.5, Path(f"b{i}"))
+        a.add(b)
+        self.assertEqual((a.renames, a.errors, a.time_renaming), (3, 1, 0.75))
+        self.assertEqual(len(a.slowest_apply), file_renamer.SLOWEST_DIRS_KEPT)
+        self.assertEqual(max(a.slowest_apply), (7.5, "b7"))
+        # Still a heap after add(): a later entry replaces the fastest kept one
+        a.note_slow("apply", 7.2, Path("late"))
+        self.assertIn((7.2, "late"), a.slowest_apply)
+        self.assertEqual(min(a.slowest_apply), (3.5, "b3"))
+
+    def test_to_dict_is_json(self):
+        stats = RunStats(renames=1)
+        stats.histogram("rename").record(0.002)
+        data = json.loads(json.dumps(stats.to_dict()))
+        self.assertEqual(data["renames"], 1)
+        self.assertEqual(data["latency"]["rename"]["count"], 1)
+        self.assertNotIn("plan", data)
+
+
+class TestRenameTreeStats(unittest.TestCase):
+    def run_tree(self, dry_run):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            make_tree(root, FILES)
+            return rename_tree(root, dry_run=dry_run, log_callback=quiet)
+
+    def test_counts_by_action(self):
+        for dry_run in (True, False):
+            stats = self.run_tree(dry_run)
+            self.assertEqual(stats.entries_scanned, 10)
+            self.assertEqual((stats.renames, stats.overwrites, stats.merges, stats.errors), (6, 1, 1, 0))
+            self.assertEqual(stats.actions, 8)
+            self.assertIsNotNone(stats.plan)
+
+    def test_apply_records_timings(self):
+        stats = self.run_tree(False)
+        self.assertEqual(stats.latency["rename"].count, 8)
+        self.assertEqual(stats.latency["merge"].count, 1)
+        self.assertEqual(stats.latency["list"].count, 4)
+        self.assertGreater(stats.bytes_merged, 0)
+        self.assertGreater(stats.time_total, 0)
+        self.assertLessEqual(stats.time_listing + stats.time_renaming + stats.time_merging, stats.time_total)
+        self.assertTrue(stats.slowest_apply)
+
+
+if __name__ == '__main__':
+    unittest.main()
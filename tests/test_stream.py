@@ -0,0 +1,77 @@
+import unittest
+import tempfile
+from pathlib import Path
+import sys
+import os
+
+# Add parent directory to path to import file_renamer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_renamer
+from file_renamer import RenamePlan, apply_stream, iter_plan, rename_tree
+from helpers import listing, make_tree, quiet
+
+
+FILES = ([f"dept {d}/year (1)/sub {s}/file {f} (2).TXT" for d in range(3) for s in range(3) for f in range(4)]
+         + ["Photos/a.jpg", "photos (1)/a.jpg", "photos (1)/deep (1)/b.jpg", "top (1).txt"])
+
+
+class TestStream(unittest.TestCase):
+    def run_tree(self, **kwargs):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            make_tree(root, FILES)
+            lines = []
+            stats = rename_tree(root, dry_run=False, log_callback=lines.append, log_level=file_renamer.LOG_CHANGES,
+                                **kwargs)
+            changes = [l.replace(tmp, "<root>") for l in lines if l.startswith(("RENAME", "OVERWRITE", "MERGE"))]
+            return listing(root), stats, changes
+
+    def test_stream_matches_planned_run(self):
+        expected_tree, expected_stats, expected_log = self.run_tree()
+        for workers in (1, 4):
+            with self.subTest(workers=workers):
+                tree, stats, log = self.run_tree(stream=True, workers=workers)
+                self.assertEqual(tree, expected_tree)
+                self.assertEqual(stats.actions, expected_stats.actions)
+                self.assertEqual(log, expected_log)
+                self.assertEqual(stats.plan.batches, [])
+
+    def test_small_window(self):
+        expected_tree, expected_stats, _ = self.run_tree()
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            make_tree(root, FILES)
+            plan = RenamePlan(root=root)
+            batches = iter_plan(plan, quiet, file_renamer.LOG_SUMMARY, keep_mtimes=False)
+            stats = apply_stream(batches, root, log_callback=quiet, workers=4, window=1)
+            self.assertEqual(listing(root), expected_tree)
+            self.assertEqual(stats.actions, expected_stats.actions)
+
+    def test_wide_directory_is_chunked(self):
+        files = [f"wide/item {i} (1).TXT" for i in range(25)] + ["wide/Item 3.TXT", "wide/sub (1)/a.txt"]
+        with tempfile.TemporaryDirectory() as tmp:
+            expected = Path(tmp) / "expected"
+            make_tree(expected, files)
+            rename_tree(expected, dry_run=False, log_callback=quiet)
+            root = Path(tmp) / "root"
+            make_tree(root, files)
+            batches = list(iter_plan(RenamePlan(root=root), quiet, file_renamer.LOG_SUMMARY, keep_mtimes=False,
+                                     chunk=10))
+            # File renames go out in chunks before the subfolder is walked; the folder rename waits for it
+            self.assertEqual([(b.path.relative_to(root).as_posix(), len(b)) for b in batches],
+                             [("wide", 10), ("wide", 10), ("wide", 5), ("wide/sub (1)", 1), ("wide", 1), (".", 1)])
+            # Each chunk only carries the listing entries its own operations look at
+            self.assertEqual(sum(len(b.names) for b in batches[:3]), 26)
+            stats = apply_stream(iter(batches), root, log_callback=quiet, workers=4, window=5)
+            self.assertEqual(listing(root), listing(expected))
+            self.assertEqual((stats.actions, stats.overwrites), (28, 1))
+
+    def test_stream_rejects_journal(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(ValueError):
+                rename_tree(Path(tmp), dry_run=False, log_callback=quiet, stream=True, journal=object())
+
+
+if __name__ == '__main__':
+    unittest.main()
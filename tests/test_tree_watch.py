@@ -0,0 +1,76 @@
+import unittest
+import tempfile
+import threading
+import time
+from pathlib import Path
+import sys
+import os
+
+# Add parent directory to path to import file_renamer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from path_filter import PathFilter
+from run_control import RunControl
+from helpers import listing, quiet
+
+if sys.platform.startswith("linux"):
+    from tree_watch import TreeWatcher
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "watch mode needs inotify")
+class TestTreeWatcher(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        (self.root / "old (1)").mkdir()
+        (self.root / "old (1)" / "a (1).txt").write_text("a")
+        (self.root / ".git").mkdir()
+        self.control = RunControl()
+        self.watcher = TreeWatcher(self.root, log_callback=quiet, control=self.control, settle=0.2,
+                                   path_filter=PathFilter(exclude=[".git"]))
+        self.thread = threading.Thread(target=self.watcher.run)
+        self.thread.start()
+        self.assertTrue(wait_for(lambda: "OLD/A.txt" in listing(self.root)))
+
+    def tearDown(self):
+        self.control.cancel()
+        self.thread.join(5)
+        self._tmp.cleanup()
+
+    def test_new_and_moved_entries(self):
+        (self.root / "new dir" / "sub (2)").mkdir(parents=True)
+        (self.root / "new dir" / "sub (2)" / "file (3).TXT").write_text("x")
+        (self.root / ".git" / "head (1)").write_text("x")
+        os.rename(self.root / "OLD", self.root / "moved (1)")
+        expected = ["MOVED", "MOVED/A.txt", "NEW DIR", "NEW DIR/SUB", "NEW DIR/SUB/File.TXT"]
+        self.assertTrue(wait_for(lambda: [p for p in listing(self.root) if not p.startswith(".git")] == expected),
+                        listing(self.root))
+        self.assertIn(".git/head (1)", listing(self.root))
+        stats = self.watcher.stats
+        self.assertEqual(stats.run.renames, 2 + 4)
+        self.assertGreater(stats.events, 0)
+        self.assertNotIn(".git", [os.path.basename(p) for p in self.watcher.paths.values()])
+
+    def test_file_still_being_written_waits(self):
+        path = self.root / "growing (1).log"
+        with open(path, "w") as f:
+            for _ in range(6):
+                f.write("x")
+                f.flush()
+                time.sleep(0.1)
+            # Still written to well past the settle time: not renamed yet
+            self.assertTrue(path.exists())
+        self.assertTrue(wait_for(lambda: (self.root / "Growing.log").exists()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,381 @@
+"""
+Long-running watch mode (Linux): after one full pass, only entries that are
+created in or moved into the tree are normalized, once they have been quiet
+for a while so files that are still being copied are left alone.
+
+Built on inotify through ctypes, so no extra package is needed. The loop
+sleeps in select() until the next event or the next settle deadline.
+"""
+import ctypes
+import errno
+import os
+import selectors
+import stat
+import struct
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import file_renamer
+from content_dedupe import ContentDedupe
+from file_renamer import (LOG_CHANGES, LOG_SUMMARY, LOG_VERBOSE, DirBatch, DirListing, RunStats, apply_batch,
+                          count_planned, default_logger, list_dir, plan_entry, rename_tree)
+from path_filter import PathFilter
+from rename_journal import TMP_NAME_RE
+from run_control import RunControl
+
+# Seconds an entry must see no events (and no mtime change) before it is renamed
+SETTLE_SECONDS = 2.0
+# Longest sleep without events, so a cancel (Ctrl+C) is noticed
+WATCH_POLL_SECONDS = 1.0
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CREATE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_MODIFY | IN_CLOSE_WRITE
+              | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+
+class Inotify:
+    """Minimal inotify wrapper: add/remove watches and read (wd, mask, cookie, name) events."""
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "watch mode needs Linux inotify")
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1: {os.strerror(err)}")
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self) -> List[Tuple[int, int, int, str]]:
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = os.fsdecode(data[offset:offset + length].split(b"\0", 1)[0])
+                offset += length
+                events.append((wd, mask, cookie, name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+@dataclass
+class WatchStats:
+    """Counters of a watch run; run holds the renames of the initial pass and of every event since."""
+    events: int = 0           # inotify events read
+    entries_checked: int = 0  # settled new/moved entries the rules were applied to
+    deferred: int = 0         # entries put back because they were still being written
+    watched_dirs: int = 0
+    unwatched_dirs: int = 0   # folders that could not be watched (e.g. fs.inotify.max_user_watches reached)
+    overflows: int = 0        # event queue overflows, each followed by a full pass
+    run: RunStats = field(default_factory=RunStats)
+
+    def to_dict(self) -> dict:
+        return {"events": self.events, "entries_checked": self.entries_checked, "deferred": self.deferred,
+                "watched_dirs": self.watched_dirs, "unwatched_dirs": self.unwatched_dirs,
+                "overflows": self.overflows, "run": self.run.to_dict()}
+
+    def summary_line(self) -> str:
+        return (f"Watch: {self.events} events, {self.entries_checked} new entries checked, "
+                f"{self.run.actions} changes ({self.run.renames} renamed, {self.run.overwrites} overwritten, "
+                f"{self.run.merges} merged), {self.run.errors} errors, {self.watched_dirs} folders watched")
+
+
+class TreeWatcher:
+    """
+    Watches root and renames new entries. Pending entries are keyed by
+    (watch descriptor of their folder, name) so they stay valid when a folder
+    above them is renamed; any event inside a folder also holds back the
+    pending folders above it, so a folder is never renamed mid-copy.
+    """
+
+    def __init__(self, root: Path, dry_run: bool = False, log_callback=default_logger, log_level: int = LOG_CHANGES,
+                 always_temp: bool = False, path_filter: Optional[PathFilter] = None,
+                 control: Optional[RunControl] = None, settle: float = SETTLE_SECONDS, workers: int = 1,
+                 dedupe: Optional[ContentDedupe] = None):
+        self.root = str(root)
+        self.dry_run = dry_run
+        self.log_callback = log_callback
+        self.log_level = log_level
+        self.always_temp = always_temp
+        self.path_filter = path_filter
+        self.control = control or RunControl()
+        self.settle = settle
+        self.workers = workers
+        self.dedupe = dedupe
+        self.stats = WatchStats()
+        self.inotify = Inotify()
+        self.paths: Dict[int, str] = {}   # wd -> current folder path
+        self.wds: Dict[str, int] = {}     # folder path -> wd
+        self.pending: Dict[Tuple[int, str], float] = {}  # (wd, name) -> time it may be renamed
+        self.need_pass = False  # events were lost: run a full pass
+
+    # --- watches ---
+
+    def _rel(self, path: str) -> str:
+        return "" if path == self.root else os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def _walkable(self, path: str) -> bool:
+        """Whether entries inside the folder at path should be handled (filters and max depth)."""
+        return self.path_filter is None or self.path_filter.walks(self._rel(path))
+
+    def _watch(self, path: str) -> Optional[int]:
+        try:
+            wd = self.inotify.add_watch(path)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                self.stats.unwatched_dirs += 1
+                self.log_callback(f"WARNING: can't watch {path} (raise fs.inotify.max_user_watches)")
+            return None
+        old = self.paths.get(wd)
+        if old is not None and old != path:
+            self.wds.pop(old, None)
+        self.paths[wd] = path
+        self.wds[path] = wd
+        self.stats.watched_dirs = len(self.paths)
+        return wd
+
+    def watch_tree(self, top: str, queue: bool = False):
+        """Watch top and every walkable folder below it; queue=True also queues every entry found."""
+        stack = [top]
+        while stack:
+            path = stack.pop()
+            if not self._walkable(path):
+                continue
+            wd = self._watch(path)
+            listing = list_dir(path)
+            if wd is None or listing is None:
+                continue
+            files, dirs, descend = listing
+            if queue:
+                deadline = time.monotonic() + self.settle
+                for name in files + dirs:
+                    self.pending[(wd, name)] = deadline
+            stack.extend(os.path.join(path, name) for name in descend)
+
+    def _moved(self, old: str, new: str):
+        """A watched folder moved from old to new: rewrite the paths of its watches."""
+        prefix = old + os.sep
+        for wd, path in list(self.paths.items()):
+            if path == old or path.startswith(prefix):
+                moved = new + path[len(old):]
+                self.wds.pop(path, None)
+                self.paths[wd] = moved
+                self.wds[moved] = wd
+
+    def _unwatch(self, old: str):
+        """A watched folder left the tree: stop watching it and everything below."""
+        prefix = old + os.sep
+        for wd, path in list(self.paths.items()):
+            if path == old or path.startswith(prefix):
+                self.inotify.rm_watch(wd)
+                del self.paths[wd]
+                self.wds.pop(path, None)
+        self.stats.watched_dirs = len(self.paths)
+
+    # --- events ---
+
+    def _hold_ancestors(self, path: str, deadline: float):
+        """Keep pending folders above path waiting while something changes inside them."""
+        while path != self.root and path.startswith(self.root):
+            parent = os.path.dirname(path)
+            key = (self.wds.get(parent), os.path.basename(path))
+            if key in self.pending:
+                self.pending[key] = deadline
+            path = parent
+
+    def handle_events(self, events):
+        now = time.monotonic()
+        deadline = now + self.settle
+        moved_from: Dict[int, str] = {}
+        for wd, mask, cookie, name in events:
+            self.stats.events += 1
+            if mask & IN_Q_OVERFLOW:
+                # The full pass covers whatever else is in this batch
+                self.stats.overflows += 1
+                self.log_callback("WARNING: inotify queue overflowed, running a full pass")
+                self.need_pass = True
+                return
+            if mask & IN_IGNORED:
+                path = self.paths.pop(wd, None)
+                if path is not None and self.wds.get(path) == wd:
+                    del self.wds[path]
+                self.stats.watched_dirs = len(self.paths)
+                continue
+            parent = self.paths.get(wd)
+            if parent is None or not name:
+                continue
+            # Our own two-step renames pass through __tmp__ names: follow the folder, don't queue it
+            tmp = TMP_NAME_RE.match(name) is not None
+            path = os.path.join(parent, name)
+            key = (wd, name)
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self.pending.pop(key, None)
+                if mask & IN_MOVED_FROM and mask & IN_ISDIR:
+                    moved_from[cookie] = path
+                continue
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                if not tmp:
+                    self.pending[key] = deadline
+                if mask & IN_ISDIR:
+                    old = moved_from.pop(cookie, None) if mask & IN_MOVED_TO else None
+                    if old is not None:
+                        # Moved within the tree (a no-op if we renamed it and already followed it)
+                        self._moved(old, path)
+                    elif not tmp:
+                        # New (or moved in from outside): watch it and check everything already inside
+                        self.watch_tree(path, queue=True)
+            elif key in self.pending:
+                self.pending[key] = deadline
+            self._hold_ancestors(parent, deadline)
+        for old in moved_from.values():
+            self._unwatch(old)
+
+    def process_due(self):
+        """Apply the rules to every pending entry whose settle time has passed, deepest first."""
+        now = time.monotonic()
+        due = [key for key, deadline in self.pending.items() if deadline <= now]
+        if not due:
+            return
+        for key in due:
+            del self.pending[key]
+        due.sort(key=lambda key: -self.paths.get(key[0], "").count(os.sep))
+        for wd, name in due:
+            if not self.control.proceed():
+                return
+            parent = self.paths.get(wd)
+            if parent is not None:
+                self._check_entry(wd, parent, name)
+
+    def _check_entry(self, wd: int, parent: str, name: str):
+        path = os.path.join(parent, name)
+        try:
+            st = os.lstat(path)
+        except OSError:
+            return
+        # Written without us seeing an event (e.g. by another NFS client): wait some more
+        age = time.time() - st.st_mtime
+        if 0 <= age < self.settle:
+            self.stats.deferred += 1
+            self.pending[(wd, name)] = time.monotonic() + self.settle - age
+            return
+        self.stats.entries_checked += 1
+        # Symlinked folders count as folders, like in scan_tree()
+        is_dir = stat.S_ISDIR(st.st_mode) or (stat.S_ISLNK(st.st_mode) and os.path.isdir(path))
+        prefix = self._rel(parent)
+        prefix = prefix + "/" if prefix else ""
+        if self.path_filter is not None and self.path_filter.left_alone(name, prefix + name):
+            self.stats.run.filtered += 1
+            return
+        rules = file_renamer.active_rules()
+        new_name = rules.folder(name) if is_dir else rules.file(name)
+        if new_name == name:
+            return
+
+        listing = list_dir(parent)
+        if listing is None:
+            return
+        files, dirs, _ = listing
+        batch = DirBatch(Path(parent), listing=(files, dirs), dev=st.st_dev)
+        names = DirListing(Path(parent), files, dirs, dev=st.st_dev).names()
+        protected = None
+        if self.path_filter is not None:
+            protected = {names.key(n) for n in files + dirs if self.path_filter.left_alone(n, prefix + n)}
+        # When applying, the change is reported once by apply_batch()
+        plan_level = self.log_level if self.dry_run or self.log_level >= LOG_VERBOSE else LOG_SUMMARY
+        if not plan_entry(batch, names, name, new_name, "FOLDER" if is_dir else "FILE", self.log_callback,
+                          plan_level, protected):
+            self.stats.run.filtered += 1
+            return
+        if self.dry_run:
+            count_planned(self.stats.run, batch.records())
+            return
+        stats = apply_batch(batch, self.log_callback, self.log_level, always_temp=self.always_temp,
+                            control=self.control, dedupe=self.dedupe)
+        self.stats.run.add(stats)
+        if is_dir and stats.actions:
+            new_path = os.path.join(parent, new_name)
+            if stats.merges:
+                # Merged into an existing folder: whatever moved there gets fresh watch paths
+                self.watch_tree(new_path)
+            else:
+                self._moved(path, new_path)
+
+    # --- main loop ---
+
+    def full_pass(self):
+        """
+        Watch the whole tree, then run rename_tree() over it. Watching first
+        means nothing created during the pass is missed; the pass's own
+        renames only move watches.
+        """
+        self.need_pass = False
+        self.pending.clear()
+        self.watch_tree(self.root)
+        stats = rename_tree(Path(self.root), self.dry_run, self.log_callback, workers=self.workers,
+                            log_level=self.log_level, always_temp=self.always_temp, control=self.control,
+                            path_filter=self.path_filter, dedupe=self.dedupe)
+        self.stats.run.add(stats)
+        self.handle_events(self.inotify.read_events())
+
+    def run(self) -> WatchStats:
+        """Full pass, then handle events until control is cancelled. Returns the counters."""
+        selector = selectors.DefaultSelector()
+        selector.register(self.inotify.fd, selectors.EVENT_READ)
+        try:
+            self.full_pass()
+            self.log_callback(f"Watching {self.root} ({self.stats.watched_dirs} folders); Ctrl+C to stop")
+            while not self.control.cancelled:
+                if self.need_pass:
+                    self.full_pass()
+                    continue
+                timeout = WATCH_POLL_SECONDS
+                if self.pending:
+                    timeout = max(0.0, min(timeout, min(self.pending.values()) - time.monotonic()))
+                if selector.select(timeout):
+                    self.handle_events(self.inotify.read_events())
+                self.process_due()
+        finally:
+            selector.close()
+            self.inotify.close()
+        self.log_callback(self.stats.summary_line())
+        return self.stats
+
+
+def watch_tree(root: Path, dry_run: bool = False, log_callback=default_logger, **kwargs) -> WatchStats:
+    """Run TreeWatcher(root, ...) until its control is cancelled."""
+    return TreeWatcher(root, dry_run, log_callback, **kwargs).run()